@@ -0,0 +1,163 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+SCOPE_KEY = 'access_scope:{user_id}:v{version}'
+VERSION_KEY = 'access_scope_version:{user_id}'
+
+# Формат ключа области видимости объекта (поле scope_key финансовых моделей)
+PERSONAL_SCOPE_KEY = 'u:{}'
+FAMILY_SCOPE_KEY = 'f:{}'
+
+
+def make_scope_key(owner_id=None, family_id=None, is_family=False):
+    """Ключ области видимости по тройке owner/family/is_family"""
+    if is_family and family_id:
+        return FAMILY_SCOPE_KEY.format(family_id)
+    if owner_id:
+        return PERSONAL_SCOPE_KEY.format(owner_id)
+    return ''
+
+
+class AccessScope:
+    """
+    Область доступа пользователя: активные семьи, права в них и круги этих семей.
+    Строится двумя запросами и кэшируется под версионированным ключом,
+    версия пользователя увеличивается сигналами при изменении членства.
+    Кэш должен быть общим для всех процессов (REDIS_URL, проверка common.E001),
+    иначе отзыв членства виден только процессу, обработавшему изменение.
+    """
+    def __init__(self, user_id, families=None, circles=None):
+        self.user_id = user_id
+        # {family_id: {'role': ..., 'can_join_circles': ..., ...}}
+        self.families = families or {}
+        # {circle_id: роль семьи пользователя в круге}
+        self.circles = circles or {}
+
+    @property
+    def family_ids(self):
+        return sorted(self.families)
+
+    @property
+    def circle_ids(self):
+        return sorted(self.circles)
+
+    @property
+    def primary_family_id(self):
+        """Семья, от имени которой пользователь действует в кругах"""
+        family_ids = self.family_ids
+        return family_ids[0] if family_ids else None
+
+    def is_member(self, family_id):
+        return self._to_id(family_id) in self.families
+
+    def get_permissions(self, family_id):
+        return self.families.get(self._to_id(family_id))
+
+    def get_role(self, family_id):
+        permissions = self.get_permissions(family_id)
+        return permissions['role'] if permissions else None
+
+    def has_permission(self, family_id, permission):
+        permissions = self.get_permissions(family_id)
+        return bool(permissions and permissions.get(permission))
+
+    def is_family_admin(self, family_id):
+        return self.get_role(family_id) == 'admin'
+
+    def get_circle_role(self, circle_id):
+        return self.circles.get(self._to_id(circle_id))
+
+    def is_circle_admin(self, circle_id):
+        return self.get_circle_role(circle_id) == 'admin'
+
+    @property
+    def scope_keys(self):
+        """Все ключи областей видимости, доступные пользователю"""
+        return [PERSONAL_SCOPE_KEY.format(self.user_id)] + [
+            FAMILY_SCOPE_KEY.format(family_id) for family_id in self.family_ids
+        ]
+
+    def resolve_scope_keys(self, requested=None):
+        """
+        Ключи для параметра ?scope=: personal | family:<id>.
+        Без параметра — все доступные области. ValueError, если область
+        указана неверно или недоступна пользователю.
+        """
+        if not requested:
+            return self.scope_keys
+        if requested == 'personal':
+            return [PERSONAL_SCOPE_KEY.format(self.user_id)]
+        kind, _, family_id = requested.partition(':')
+        if kind == 'family' and self.is_member(family_id):
+            return [FAMILY_SCOPE_KEY.format(int(family_id))]
+        raise ValueError(requested)
+
+    def _to_id(self, value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    def to_dict(self):
+        return {'user_id': self.user_id, 'families': self.families, 'circles': self.circles}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['user_id'], data['families'], data['circles'])
+
+    @classmethod
+    def build(cls, user_id):
+        from nucfamily.models import FamilyMembership
+        from famcircle.models import CircleFamilyMembership
+
+        families = {
+            row['family_id']: {
+                'role': row['role'],
+                'can_join_circles': row['can_join_circles'],
+                'can_share_to_circles': row['can_share_to_circles'],
+                'can_manage_circle_access': row['can_manage_circle_access'],
+            }
+            for row in FamilyMembership.objects.filter(user_id=user_id, status='active').values(
+                'family_id', 'role', 'can_join_circles', 'can_share_to_circles', 'can_manage_circle_access'
+            )
+        }
+        circles = {}
+        if families:
+            memberships = CircleFamilyMembership.objects.filter(
+                family_id__in=list(families), status='active'
+            ).values_list('circle_id', 'role')
+            for circle_id, role in memberships:
+                # Если в круге несколько семей пользователя, роль админа важнее
+                if circles.get(circle_id) != 'admin':
+                    circles[circle_id] = role
+        return cls(user_id, families, circles)
+
+
+def get_scope_version(user_id):
+    # Начальная версия уникальна, чтобы после вытеснения ключа версии
+    # не прочитать устаревшую область доступа под старым номером
+    return cache.get_or_set(VERSION_KEY.format(user_id=user_id), time.time_ns, timeout=None)
+
+
+def get_access_scope(user):
+    """Получить область доступа пользователя (из кэша или построить заново)"""
+    user_id = user.pk
+    key = SCOPE_KEY.format(user_id=user_id, version=get_scope_version(user_id))
+    data = cache.get(key)
+    if data is not None:
+        return AccessScope.from_dict(data)
+    scope = AccessScope.build(user_id)
+    cache.set(key, scope.to_dict(), timeout=getattr(settings, 'ACCESS_SCOPE_CACHE_TIMEOUT', 3600))
+    return scope
+
+
+def invalidate_access_scope(*user_ids):
+    """Сбросить кэш области доступа, увеличив версию ключа пользователей"""
+    for user_id in set(user_ids):
+        key = VERSION_KEY.format(user_id=user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Кэши в памяти процесса: сброс, сделанный одним процессом, не виден остальным
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Область доступа (common.access) и версии курсов валют (finance.currency)
+    сбрасываются сигналами через кэш: при нескольких процессах он должен быть общим
+    """
+    if settings.CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHES:
+        return [Error(
+            'Кэш по умолчанию хранится в памяти процесса: изменения членства в семьях '
+            'и курсов валют не будут видны другим процессам.',
+            hint='Укажите REDIS_URL (общий кэш Redis).',
+            id='common.E001',
+        )]
+    return []
@@ -0,0 +1,137 @@
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from rest_framework import serializers
+
+
+class ConditionalGetMixin:
+    """
+    Условный GET для list/retrieve. ETag строится только из состояния БД:
+    - список целиком — count и max(updated_at) по отфильтрованному запросу
+      (один агрегат по индексу);
+    - страница (?limit=, ?cursor=) — count/next страницы и пары (id, updated_at) её строк;
+    - объект — его id и updated_at.
+    Всё, что меняет ответ, сдвигает updated_at: изменения вложенных объектов
+    и SET_NULL при удалении связанных трогают родителя. Удаление меняет count
+    (а на странице — состав строк). Last-Modified не отдаётся: удаление
+    не сдвигает max(updated_at).
+
+    Без If-None-Match ответ строится как обычно, а ETag считается по его же
+    данным, без отдельного запроса (кроме потокового списка: строки не
+    собираются в памяти, валидатор — агрегатом). С If-None-Match сначала читается только
+    состояние (агрегат или id и updated_at страницы). При совпадении — 304
+    без чтения и сериализации объектов. Cache-Control: no-cache — браузер
+    хранит ответ, но каждый раз переспрашивает сервер. С ?expand= валидатор
+    не считается: вложенные объекты меняются независимо.
+    """
+    conditional_field = 'updated_at'
+
+    def list(self, request, *args, **kwargs):
+        if self.is_conditional_request():
+            response = self.not_modified(self.get_list_state(self.filter_queryset(self.get_queryset())))
+            if response is not None:
+                return response
+        return self.add_validator(super().list(request, *args, **kwargs), detail=False)
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.is_conditional_request():
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            queryset = self.filter_queryset(self.get_queryset())
+            try:
+                row = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]}).values_list(
+                    'id', self.conditional_field
+                ).first()
+            except (TypeError, ValueError, ValidationError):
+                # Неверный id — 404 обычным путём
+                row = None
+            if row is not None:
+                response = self.not_modified(('object', row[0], self.format_modified(row[1])))
+                if response is not None:
+                    return response
+        return self.add_validator(super().retrieve(request, *args, **kwargs), detail=True)
+
+    def supports_conditional(self):
+        model = self.queryset.model
+        if not any(field.name == self.conditional_field for field in model._meta.concrete_fields):
+            return False
+        get_field_selection = getattr(self, 'get_field_selection', None)
+        return not (get_field_selection and 'expand' in get_field_selection())
+
+    def is_conditional_request(self):
+        return 'HTTP_IF_NONE_MATCH' in self.request.META and self.supports_conditional()
+
+    def get_validator_parts(self):
+        """Всё, от чего зависит представление кроме данных: пользователь, параметры, формат"""
+        return [self.request.user.pk, self.request.get_full_path(), self.request.accepted_media_type]
+
+    def format_modified(self, value):
+        """updated_at так же, как его отдаёт сериализатор"""
+        return None if value is None else serializers.DateTimeField().to_representation(value)
+
+    def parse_modified(self, value):
+        return serializers.DateTimeField().to_internal_value(value)
+
+    def get_list_state(self, queryset):
+        """Состояние списка из БД: агрегат для списка целиком, id и updated_at для страницы"""
+        ordering = [field.lstrip('-') for field in getattr(self, 'pagination_ordering', None) or ()]
+        # Поля упорядочивания нужны keyset-пагинации для курсора
+        rows = queryset.prefetch_related(None).values(*dict.fromkeys(['id', self.conditional_field, *ordering]))
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return self.get_aggregate_state(queryset)
+        return self.get_page_state(
+            self.get_paginated_response([]).data,
+            [(row['id'], self.format_modified(row[self.conditional_field])) for row in page],
+        )
+
+    def get_aggregate_state(self, queryset):
+        row = queryset.order_by().aggregate(count=Count('pk'), modified=Max(self.conditional_field))
+        return 'list', row['count'], self.format_modified(row['modified'])
+
+    def get_page_state(self, envelope, rows):
+        return 'page', sorted((key, value) for key, value in envelope.items() if key != 'results'), rows
+
+    def get_response_state(self, data, detail):
+        """То же состояние по данным готового ответа; KeyError/TypeError — в ответе нет id или updated_at"""
+        field = self.conditional_field
+        if detail:
+            return 'object', data['id'], data[field]
+        if isinstance(data, list):
+            modified = max((item[field] for item in data), key=self.parse_modified, default=None)
+            return 'list', len(data), modified
+        return self.get_page_state(data, [(item['id'], item[field]) for item in data['results']])
+
+    def make_etag(self, state):
+        parts = [state, *self.get_validator_parts()]
+        return 'W/"%s"' % hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+
+    def not_modified(self, state):
+        """Ответ 304 (или 412), если If-None-Match совпал, иначе None"""
+        etag = self.make_etag(state)
+        response = get_conditional_response(self.request, etag=etag)
+        if response is not None:
+            self.set_validator_headers(response, etag)
+        return response
+
+    def add_validator(self, response, detail):
+        if response.status_code != 200 or not self.supports_conditional():
+            return response
+        data = getattr(response, 'data', None)
+        try:
+            if data is None:
+                if detail or not response.streaming:
+                    return response
+                state = self.get_aggregate_state(self.filter_queryset(self.get_queryset()))
+            else:
+                state = self.get_response_state(data, detail)
+        except (KeyError, TypeError, serializers.ValidationError):
+            # ?fields= без id или updated_at — без валидатора
+            return response
+        self.set_validator_headers(response, self.make_etag(state))
+        return response
+
+    def set_validator_headers(self, response, etag):
+        response.headers['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
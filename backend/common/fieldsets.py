@@ -0,0 +1,158 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+SELECTION_PARAMS = ('fields', 'expand')
+
+
+def parse_paths(paths):
+    """
+    Пути полей в дерево: ('id', 'memberships.role') ->
+    {'id': None, 'memberships': {'role': None}}; None — поле целиком
+    """
+    tree = {}
+    for path in paths:
+        node = tree
+        *parents, leaf = path.split('.')
+        for name in parents:
+            if name in node and node[name] is None:
+                break
+            node = node.setdefault(name, {})
+        else:
+            node[leaf] = None
+    return tree
+
+
+class SparseFieldsMixin:
+    """
+    Выбор полей сериализатора:
+    - fields — пути полей ('id', 'memberships.role'); невыбранные поля,
+      в том числе SerializerMethodField, не вычисляются вовсе;
+    - expand — связи из Meta.expandable_fields ({поле: класс сериализатора
+      или путь к нему}), которые отдаются вложенным объектом вместо id.
+    Без параметров сериализатор отдаёт то же, что и раньше.
+    """
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.selected_fields = parse_paths(fields) if fields else None
+        self.expanded_fields = parse_paths(expand) if expand else {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        for name in self.expanded_fields:
+            if name in expandable:
+                serializer_class = expandable[name]
+                if isinstance(serializer_class, str):
+                    serializer_class = import_string(serializer_class)
+                fields[name] = serializer_class(read_only=True)
+        if self.selected_fields is not None:
+            fields = {name: field for name, field in fields.items() if name in self.selected_fields}
+        # Выбор вложенных сериализаторов — по их ветке дерева
+        for name, field in fields.items():
+            child = field.child if isinstance(field, serializers.ListSerializer) else field
+            if isinstance(child, SparseFieldsMixin):
+                if self.selected_fields is not None:
+                    child.selected_fields = self.selected_fields[name]
+                child.expanded_fields = self.expanded_fields.get(name) or {}
+        return fields
+
+
+def get_related_lookups(serializer, prefix=''):
+    """Связи, которые читают вложенные сериализаторы и поля через точку (для prefetch_related)"""
+    model = serializer.Meta.model
+    lookups = []
+    for field in serializer._readable_fields:
+        child = field.child if isinstance(field, serializers.ListSerializer) else field
+        parts = field.source.split('.')
+        if isinstance(child, serializers.ModelSerializer) and len(parts) == 1:
+            lookups.append(prefix + field.source)
+            lookups.extend(get_related_lookups(child, f'{prefix}{field.source}__'))
+            continue
+        # family.name — связь family; последний элемент — поле или метод объекта
+        current, path = model, []
+        for part in parts[:-1]:
+            try:
+                relation = current._meta.get_field(part)
+            except FieldDoesNotExist:
+                break
+            if not relation.is_relation:
+                break
+            path.append(part)
+            current = relation.related_model
+        if path:
+            lookups.append(prefix + '__'.join(path))
+    return lookups
+
+
+def get_only_fields(serializer, annotations=()):
+    """
+    Колонки для .only() по выбранным полям или None, если какое-то поле
+    читает объект целиком (SerializerMethodField, свойство модели)
+    """
+    model = serializer.Meta.model
+    only = [model._meta.pk.name]
+    for field in serializer._readable_fields:
+        source = field.source.split('.')[0]
+        if source in annotations:
+            continue
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            return None
+        if model_field.concrete:
+            only.append(source)
+        elif not model_field.is_relation:
+            return None
+    return only
+
+
+def select_for_serializer(queryset, serializer):
+    """
+    Опустить выбор полей в запрос: связи вложенных сериализаторов —
+    в prefetch_related (уже заданные не дублируются), при ?fields= —
+    только нужные колонки через .only()
+    """
+    seen = {
+        lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup
+        for lookup in queryset._prefetch_related_lookups
+    }
+    lookups = [lookup for lookup in dict.fromkeys(get_related_lookups(serializer)) if lookup not in seen]
+    if lookups:
+        queryset = queryset.prefetch_related(*lookups)
+    if getattr(serializer, 'selected_fields', None) is not None:
+        only = get_only_fields(serializer, queryset.query.annotations)
+        if only is not None:
+            queryset = queryset.only(*only)
+    return queryset
+
+
+class SparseFieldsViewMixin:
+    """
+    ?fields=id,name,memberships.role и ?expand=currency для чтения (GET):
+    выбор передаётся сериализатору (SparseFieldsMixin) и опускается в запрос
+    list/retrieve. На запись сериализатор всегда полный, чтобы поля не терялись.
+    """
+    def get_field_selection(self):
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return {}
+        selection = {}
+        for name in SELECTION_PARAMS:
+            paths = {path.strip() for path in self.request.query_params.get(name, '').split(',')}
+            paths.discard('')
+            if paths:
+                selection[name] = tuple(sorted(paths))
+        return selection
+
+    def get_serializer(self, *args, **kwargs):
+        if issubclass(self.get_serializer_class(), SparseFieldsMixin):
+            kwargs = {**self.get_field_selection(), **kwargs}
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action in ('list', 'retrieve') and issubclass(self.get_serializer_class(), SparseFieldsMixin):
+            queryset = select_for_serializer(queryset, self.get_serializer())
+        return queryset
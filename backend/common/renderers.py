@@ -0,0 +1,112 @@
+import decimal
+import json
+
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Символы-разделители строк, недопустимые в строках JavaScript (как в JSONRenderer)
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+class DecimalStringEncoder(JSONEncoder):
+    """
+    Кодировщик DRF, но Decimal — точной строкой, как у сериализаторов
+    (COERCE_DECIMAL_TO_STRING), а не float с потерей точности
+    """
+    def default(self, obj):
+        if isinstance(obj, decimal.Decimal):
+            return format(obj, 'f')
+        return super().default(obj)
+
+
+encode_default = DecimalStringEncoder().default
+
+
+def dumps(data):
+    """Компактный JSON в UTF-8: orjson, если установлен, иначе стандартный json"""
+    if orjson is not None:
+        try:
+            # Дата и время — через кодировщик DRF ('Z' вместо +00:00)
+            return orjson.dumps(
+                data, default=encode_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            )
+        except orjson.JSONEncodeError:
+            # Целые больше 64 бит и прочее, что orjson не кодирует
+            pass
+    return json.dumps(
+        data, cls=DecimalStringEncoder, ensure_ascii=False, allow_nan=False, separators=(',', ':')
+    ).encode('utf-8')
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    application/json через orjson. Вывод совпадает с JSONRenderer, кроме
+    Decimal вне сериализаторов (сводки дашборда): он отдаётся точной строкой.
+    Отступы (Accept: application/json; indent=4) — стандартным json.
+    """
+    encoder_class = DecimalStringEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = dumps(data)
+        for raw, escaped in LINE_SEPARATORS:
+            if raw in ret:
+                ret = ret.replace(raw, escaped)
+        return ret
+
+
+class MessagePackRenderer(BaseRenderer):
+    """application/msgpack (?format=msgpack); доступен, если установлен msgpack"""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    available = msgpack is not None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True, datetime=False)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    JSON-строки (application/x-ndjson, ?format=ndjson): элемент списка на строку,
+    прочие ответы — одной строкой. Списки, которые умеют читаться пачками
+    (ValuesReadMixin), отдаются потоком через stream() без сборки ответа в памяти.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+    streaming = True
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return b''.join(self.stream([data if isinstance(data, list) else [data]]))
+
+    def stream(self, chunks):
+        """Пачки элементов -> куски ответа (по одному на пачку)"""
+        for rows in chunks:
+            yield b''.join(dumps(row) + b'\n' for row in rows)
+
+
+class AvailableRenderersNegotiation(DefaultContentNegotiation):
+    """Выбор рендерера по Accept/?format= только среди тех, чьи библиотеки установлены"""
+    def select_renderer(self, request, renderers, format_suffix=None):
+        renderers = [renderer for renderer in renderers if getattr(renderer, 'available', True)]
+        return super().select_renderer(request, renderers, format_suffix)
@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from nucfamily.models import FamilyMembership
+from famcircle.models import CircleFamilyMembership
+from .access import invalidate_access_scope
+
+
+@receiver([post_save, post_delete], sender=FamilyMembership)
+def family_membership_changed(sender, instance, **kwargs):
+    """Изменение членства в семье меняет область доступа пользователя"""
+    _invalidate(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=CircleFamilyMembership)
+def circle_membership_changed(sender, instance, **kwargs):
+    """Изменение членства семьи в круге меняет область доступа всех её членов"""
+    user_ids = list(FamilyMembership.objects.filter(family_id=instance.family_id).values_list('user_id', flat=True))
+    _invalidate(*user_ids)
+
+
+def _invalidate(*user_ids):
+    # Повторный сброс после коммита: параллельный запрос мог успеть
+    # закэшировать область доступа по ещё не закоммиченным данным
+    invalidate_access_scope(*user_ids)
+    transaction.on_commit(lambda: invalidate_access_scope(*user_ids))
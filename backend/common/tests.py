@@ -1,3 +1,163 @@
-from django.test import TestCase
+import json
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from nucfamily.models import NuclearFamily, FamilyMembership
+from famcircle.models import FamilyCircle, CircleFamilyMembership
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from . import access
+from .access import get_access_scope
+from .checks import check_shared_cache
+from .fieldsets import parse_paths
+from .renderers import FastJSONRenderer, MessagePackRenderer, NDJSONRenderer
+
+User = get_user_model()
+
+
+class AccessScopeTestCase(TestCase):
+    """Тесты кэшируемой области доступа пользователя"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User',
+            middle_name='Test',
+            birth_date='1990-01-01',
+            phone='+79991234567'
+        )
+        self.family = NuclearFamily.objects.create(name='Семья', join_code='FAMILY01', join_password='hashed')
+        self.circle = FamilyCircle.objects.create(name='Круг', join_code='CIRCLE01', join_password='hashed')
+        self.membership = FamilyMembership.objects.create(
+            user=self.user,
+            family=self.family,
+            role='admin',
+            status='active',
+            can_join_circles=True
+        )
+
+    def test_scope_contents(self):
+        """Тест состава области доступа"""
+        CircleFamilyMembership.objects.create(family=self.family, circle=self.circle, role='admin')
+        scope = get_access_scope(self.user)
+        self.assertEqual(scope.family_ids, [self.family.id])
+        self.assertEqual(scope.circle_ids, [self.circle.id])
+        self.assertTrue(scope.is_family_admin(self.family.id))
+        self.assertTrue(scope.has_permission(str(self.family.id), 'can_join_circles'))
+        self.assertFalse(scope.has_permission(self.family.id, 'can_share_to_circles'))
+        self.assertTrue(scope.is_circle_admin(self.circle.id))
+
+    def test_scope_is_cached(self):
+        """Повторное получение области доступа не обращается к БД"""
+        get_access_scope(self.user)
+        with self.assertNumQueries(0):
+            get_access_scope(self.user)
+
+    def test_family_membership_change_invalidates(self):
+        """Выход из семьи сбрасывает кэш"""
+        self.assertTrue(get_access_scope(self.user).is_member(self.family.id))
+        self.membership.status = 'left'
+        self.membership.save()
+        self.assertFalse(get_access_scope(self.user).is_member(self.family.id))
+
+    def test_circle_membership_change_invalidates(self):
+        """Присоединение семьи к кругу и выход из него сбрасывают кэш членов семьи"""
+        self.assertEqual(get_access_scope(self.user).circle_ids, [])
+        circle_membership = CircleFamilyMembership.objects.create(family=self.family, circle=self.circle)
+        self.assertEqual(get_access_scope(self.user).circle_ids, [self.circle.id])
+        circle_membership.delete()
+        self.assertEqual(get_access_scope(self.user).circle_ids, [])
+
+    def test_revocation_seen_by_other_process(self):
+        """Выход из семьи в одном процессе виден другому процессу с тем же общим кэшем"""
+        # Другой процесс — свой экземпляр клиента кэша над тем же хранилищем
+        worker_cache = LocMemCache('', {})
+
+        def in_worker():
+            default = access.cache
+            setattr(access, 'cache', worker_cache)
+            try:
+                return get_access_scope(self.user)
+            finally:
+                setattr(access, 'cache', default)
+
+        self.assertTrue(in_worker().is_member(self.family.id))
+        with self.assertNumQueries(0):
+            in_worker()
+        self.membership.status = 'left'
+        self.membership.save()
+        self.assertFalse(in_worker().is_member(self.family.id))
+
+    def test_shared_cache_required(self):
+        """Кэш в памяти процесса в продакшене — ошибка проверки common.E001"""
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ['common.E001'])
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379/0'
+        }}):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class RenderersTestCase(TestCase):
+    """Тесты быстрых рендереров ответа"""
+
+    def setUp(self):
+        self.data = [{
+            'name': 'Строка\u2028с разделителем',
+            'amount': '100.50',
+            'date': date(2024, 6, 1),
+            'created_at': datetime(2024, 6, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+            'count': 3,
+            'nested': {1: None, 'flag': True},
+        }]
+
+    def test_fast_json_matches_stock(self):
+        """Вывод без Decimal совпадает с JSONRenderer байт в байт"""
+        self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+        self.assertEqual(
+            FastJSONRenderer().render(self.data, 'application/json; indent=2'),
+            JSONRenderer().render(self.data, 'application/json; indent=2')
+        )
+
+    def test_decimal_as_string(self):
+        """Decimal вне сериализатора — точная строка, без float"""
+        data = {'total': Decimal('12345678901234567.89'), 'rate': Decimal('1E+2'), 'big': 2 ** 70}
+        self.assertEqual(
+            json.loads(FastJSONRenderer().render(data)),
+            {'total': '12345678901234567.89', 'rate': '100', 'big': 2 ** 70}
+        )
+
+    def test_ndjson(self):
+        """Элемент списка на строку, прочие ответы — одной строкой"""
+        lines = NDJSONRenderer().render(self.data * 2).splitlines()
+        self.assertEqual([json.loads(line) for line in lines], json.loads(JSONRenderer().render(self.data * 2)))
+        self.assertEqual(NDJSONRenderer().render({'detail': 'x'}), b'{"detail":"x"}\n')
+
+    def test_msgpack(self):
+        """Включённый в DEFAULT_RENDERER_CLASSES MessagePack должен работать, а не пропускаться"""
+        if MessagePackRenderer not in api_settings.DEFAULT_RENDERER_CLASSES:
+            self.skipTest('MessagePackRenderer не включён')
+        self.assertTrue(MessagePackRenderer.available, 'msgpack не установлен (requirements.txt)')
+        import msgpack
+        data = msgpack.unpackb(MessagePackRenderer().render(self.data), strict_map_key=False)
+        self.assertEqual(data[0]['created_at'], '2024-06-01T12:30:15.123456Z')
+        self.assertEqual(data[0]['amount'], '100.50')
+
+
+class FieldSelectionTestCase(TestCase):
+    """Тесты разбора путей ?fields=/?expand="""
+
+    def test_parse_paths(self):
+        self.assertEqual(
+            parse_paths(['id', 'memberships.role', 'memberships.user.id', 'circles', 'circles.name']),
+            {'id': None, 'memberships': {'role': None, 'user': {'id': None}}, 'circles': None}
+        )
+        self.assertEqual(parse_paths(['user', 'user.id']), {'user': None})
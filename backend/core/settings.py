@@ -157,9 +157,13 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Формат ответа выбирается по Accept или ?format=json|msgpack|ndjson
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'common.renderers.FastJSONRenderer',
+        'common.renderers.MessagePackRenderer',
+        'common.renderers.NDJSONRenderer',
     ],
+    'DEFAULT_CONTENT_NEGOTIATION_CLASS': 'common.renderers.AvailableRenderersNegotiation',
 }
 
 # CORS settings
@@ -182,3 +186,47 @@ CORS_ALLOW_HEADERS = [
     'x-csrftoken',
     'x-requested-with',
 ]
+
+# Общий кэш процессов: область доступа пользователя (common.access) и версии
+# курсов валют (finance.currency) сбрасываются сигналами через кэш, поэтому
+# при нескольких процессах (gunicorn, uwsgi) нужен Redis: REDIS_URL=redis://host:6379/0.
+# Без него — кэш в памяти процесса, годится только для одного процесса
+# (runserver, тесты); manage.py check --deploy сообщает об этом ошибкой
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+
+# Время жизни кэша области доступа пользователя (семьи, круги, права), секунды.
+# Кэш сбрасывается сигналами при изменении членства, таймаут — страховка
+ACCESS_SCOPE_CACHE_TIMEOUT = config('ACCESS_SCOPE_CACHE_TIMEOUT', default=3600, cast=int)
+
+# Код встроенной базовой валюты: к ней приведены курсы CurrencyRate.rate_to_base,
+# в ней по умолчанию считаются итоги дашборда
+BASE_CURRENCY_CODE = config('BASE_CURRENCY_CODE', default='RUB')
+
+# Сколько историй курсов валют держать в памяти процесса (LRU)
+CURRENCY_RATES_CACHE_SIZE = config('CURRENCY_RATES_CACHE_SIZE', default=256, cast=int)
+
+# Не дольше этого (секунды) процесс держит историю курсов и id базовой валюты.
+# Изменения сбрасывают их сразу через общий кэш, таймаут — страховка
+CURRENCY_CACHE_TIMEOUT = config('CURRENCY_CACHE_TIMEOUT', default=300, cast=int)
+
+# Журнал FinanceLog (finance.logwriter) по умолчанию пишется синхронно, в транзакции
+# запроса. FINANCE_LOG_BUFFER_SIZE > 1 включает буфер процесса: записи пишутся пачкой
+# по стольку штук или раз в FINANCE_LOG_FLUSH_INTERVAL секунд. Записи в буфере
+# теряются, если процесс убит (SIGKILL, OOM) до сброса — не более интервала и размера буфера
+FINANCE_LOG_BUFFER_SIZE = config('FINANCE_LOG_BUFFER_SIZE', default=0, cast=int)
+FINANCE_LOG_FLUSH_INTERVAL = config('FINANCE_LOG_FLUSH_INTERVAL', default=2.0, cast=float)
+
+# Хранение FinanceLog: full — полные data_before/data_after (по умолчанию),
+# diff — только изменённые поля и сжатые снимки при создании/удалении
+# (finance.auditlog). В режиме diff /logs/ отдаёт changes и state вместо
+# data_before/data_after — включать только вместе с клиентами, читающими их.
+# Каталог помесячных архивов команды archive_finance_logs
+FINANCE_LOG_STORAGE = config('FINANCE_LOG_STORAGE', default='full')
+FINANCE_LOG_ARCHIVE_DIR = config('FINANCE_LOG_ARCHIVE_DIR', default=str(BASE_DIR / 'archive' / 'finance_logs'))
@@ -3,12 +3,14 @@ from django.contrib.auth import get_user_model
 from .models import FamilyCircle, CircleFamilyMembership
 from nucfamily.models import NuclearFamily, FamilyMembership
 from django.contrib.auth.hashers import make_password, check_password
+from common.access import get_access_scope
+from common.fieldsets import SparseFieldsMixin
 import secrets
 import string
 
 User = get_user_model()
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для отображения данных пользователя"""
     full_name = serializers.SerializerMethodField()
     
@@ -23,7 +25,7 @@ class UserSerializer(serializers.ModelSerializer):
         return obj.get_full_name()
 
 
-class CircleFamilyMembershipSerializer(serializers.ModelSerializer):
+class CircleFamilyMembershipSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для членства семьи в круге"""
     family_name = serializers.CharField(source='family.name', read_only=True)
     added_by_name = serializers.CharField(source='added_by.get_full_name', read_only=True)
@@ -35,9 +37,10 @@ class CircleFamilyMembershipSerializer(serializers.ModelSerializer):
             'joined_at', 'left_at', 'added_by', 'added_by_name'
         ]
         read_only_fields = ['id', 'joined_at', 'left_at']
+        expandable_fields = {'circle': 'famcircle.serializers.FamilyCircleSerializer'}
 
 
-class FamilyCircleSerializer(serializers.ModelSerializer):
+class FamilyCircleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для семейного круга"""
     family_memberships = CircleFamilyMembershipSerializer(many=True, read_only=True)
     families_count = serializers.SerializerMethodField()
@@ -57,46 +60,26 @@ class FamilyCircleSerializer(serializers.ModelSerializer):
     def get_families_count(self, obj):
         return obj.family_memberships.filter(status='active').count()
     
-    def get_is_admin(self, obj):
+    def get_user_scope(self):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            # Проверяем, является ли пользователь админом через свою семью
-            user_families = NuclearFamily.objects.filter(
-                memberships__user=request.user,
-                memberships__status='active'
-            )
-            return obj.family_memberships.filter(
-                family__in=user_families,
-                role='admin',
-                status='active'
-            ).exists()
-        return False
+            return get_access_scope(request.user)
+        return None
+    
+    def get_is_admin(self, obj):
+        # Проверяем, является ли пользователь админом через свою семью
+        scope = self.get_user_scope()
+        return scope.is_circle_admin(obj.id) if scope else False
     
     def get_user_role(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            # Получаем роль пользователя через его семью
-            user_families = NuclearFamily.objects.filter(
-                memberships__user=request.user,
-                memberships__status='active'
-            )
-            membership = obj.family_memberships.filter(
-                family__in=user_families,
-                status='active'
-            ).first()
-            return membership.role if membership else None
-        return None
+        # Получаем роль пользователя через его семью
+        scope = self.get_user_scope()
+        return scope.get_circle_role(obj.id) if scope else None
     
     def get_user_family_role(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            # Получаем роль пользователя в его семье
-            family_membership = FamilyMembership.objects.filter(
-                user=request.user,
-                status='active'
-            ).first()
-            return family_membership.role if family_membership else None
-        return None
+        # Получаем роль пользователя в его семье
+        scope = self.get_user_scope()
+        return scope.get_role(scope.primary_family_id) if scope else None
 
 
 class FamilyCircleCreateSerializer(serializers.ModelSerializer):
@@ -123,14 +106,11 @@ class FamilyCircleCreateSerializer(serializers.ModelSerializer):
         
         # Создатель становится админом через свою семью
         user = self.context['request'].user
-        user_family = NuclearFamily.objects.filter(
-            memberships__user=user,
-            memberships__status='active'
-        ).first()
+        user_family_id = get_access_scope(user).primary_family_id
         
-        if user_family:
+        if user_family_id:
             CircleFamilyMembership.objects.create(
-                family=user_family,
+                family_id=user_family_id,
                 circle=circle,
                 role='admin',
                 status='active',
@@ -152,24 +132,16 @@ class CircleJoinByIdSerializer(serializers.Serializer):
         user = self.context['request'].user
         
         # Проверяем, что пользователь состоит в семье
-        user_family = NuclearFamily.objects.filter(
-            memberships__user=user,
-            memberships__status='active'
-        ).first()
+        scope = get_access_scope(user)
+        user_family_id = scope.primary_family_id
         
-        if not user_family:
+        if not user_family_id:
             raise serializers.ValidationError(
                 'Для присоединения к кругу необходимо сначала присоединиться к семье или создать свою'
             )
         
         # Проверяем права пользователя в семье
-        family_membership = FamilyMembership.objects.get(
-            user=user,
-            family=user_family,
-            status='active'
-        )
-        
-        if not family_membership.can_join_circles:
+        if not scope.has_permission(user_family_id, 'can_join_circles'):
             raise serializers.ValidationError(
                 'У вас нет прав для присоединения семьи к кругам'
             )
@@ -183,11 +155,11 @@ class CircleJoinByIdSerializer(serializers.Serializer):
             raise serializers.ValidationError('Неверный пароль')
         
         # Проверяем, не является ли семья уже участником
-        if CircleFamilyMembership.objects.filter(family=user_family, circle=circle).exists():
+        if CircleFamilyMembership.objects.filter(family_id=user_family_id, circle=circle).exists():
             raise serializers.ValidationError('Ваша семья уже является участником этого круга')
         
         attrs['circle'] = circle
-        attrs['family'] = user_family
+        attrs['family'] = NuclearFamily.objects.get(id=user_family_id)
         return attrs
     
     def create(self, validated_data):
@@ -218,24 +190,16 @@ class CircleJoinSerializer(serializers.Serializer):
         user = self.context['request'].user
         
         # Проверяем, что пользователь состоит в семье
-        user_family = NuclearFamily.objects.filter(
-            memberships__user=user,
-            memberships__status='active'
-        ).first()
+        scope = get_access_scope(user)
+        user_family_id = scope.primary_family_id
         
-        if not user_family:
+        if not user_family_id:
             raise serializers.ValidationError(
                 'Для присоединения к кругу необходимо сначала присоединиться к семье или создать свою'
             )
         
         # Проверяем права пользователя в семье
-        family_membership = FamilyMembership.objects.get(
-            user=user,
-            family=user_family,
-            status='active'
-        )
-        
-        if not family_membership.can_join_circles:
+        if not scope.has_permission(user_family_id, 'can_join_circles'):
             raise serializers.ValidationError(
                 'У вас нет прав для присоединения семьи к кругам'
             )
@@ -249,11 +213,11 @@ class CircleJoinSerializer(serializers.Serializer):
             raise serializers.ValidationError('Неверный пароль')
         
         # Проверяем, не является ли семья уже участником
-        if CircleFamilyMembership.objects.filter(family=user_family, circle=circle).exists():
+        if CircleFamilyMembership.objects.filter(family_id=user_family_id, circle=circle).exists():
             raise serializers.ValidationError('Ваша семья уже является участником этого круга')
         
         attrs['circle'] = circle
-        attrs['family'] = user_family
+        attrs['family'] = NuclearFamily.objects.get(id=user_family_id)
         return attrs
     
     def create(self, validated_data):
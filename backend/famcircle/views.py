@@ -5,6 +5,8 @@ from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from .models import FamilyCircle, CircleFamilyMembership
 from nucfamily.models import NuclearFamily, FamilyMembership
+from common.access import get_access_scope
+from common.fieldsets import SparseFieldsViewMixin, select_for_serializer
 from .serializers import (
     FamilyCircleSerializer,
     FamilyCircleCreateSerializer,
@@ -14,7 +16,7 @@ from .serializers import (
 )
 
 
-class FamilyCircleViewSet(viewsets.ModelViewSet):
+class FamilyCircleViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     """ViewSet для управления семейными кругами"""
     permission_classes = [permissions.IsAuthenticated]
     
@@ -25,15 +27,7 @@ class FamilyCircleViewSet(viewsets.ModelViewSet):
             return FamilyCircle.objects.all()
         
         # Для остальных действий возвращаем только круги семьи пользователя
-        user = self.request.user
-        user_families = NuclearFamily.objects.filter(
-            memberships__user=user,
-            memberships__status='active'
-        )
-        return FamilyCircle.objects.filter(
-            family_memberships__family__in=user_families,
-            family_memberships__status='active'
-        ).distinct()
+        return FamilyCircle.objects.filter(id__in=get_access_scope(self.request.user).circle_ids)
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -98,8 +92,11 @@ class FamilyCircleViewSet(viewsets.ModelViewSet):
     def families(self, request, pk=None):
         """Получение списка семей в круге"""
         circle = self.get_object()
-        memberships = circle.family_memberships.filter(status='active')
-        serializer = CircleFamilyMembershipSerializer(memberships, many=True)
+        selection = self.get_field_selection()
+        memberships = select_for_serializer(
+            circle.family_memberships.filter(status='active'), CircleFamilyMembershipSerializer(**selection)
+        )
+        serializer = CircleFamilyMembershipSerializer(memberships, many=True, **selection)
         return Response(serializer.data)
     
     @action(detail=True, methods=['post'])
@@ -109,15 +106,7 @@ class FamilyCircleViewSet(viewsets.ModelViewSet):
         user = request.user
         
         # Проверяем, является ли пользователь админом через свою семью
-        user_families = NuclearFamily.objects.filter(
-            memberships__user=user,
-            memberships__status='active'
-        )
-        if not circle.family_memberships.filter(
-            family__in=user_families,
-            role='admin',
-            status='active'
-        ).exists():
+        if not get_access_scope(user).is_circle_admin(circle.id):
             return Response(
                 {'error': 'Только администраторы могут регенерировать учетные данные'},
                 status=status.HTTP_403_FORBIDDEN
@@ -143,19 +132,14 @@ class FamilyCircleViewSet(viewsets.ModelViewSet):
         })
 
 
-class CircleFamilyMembershipViewSet(viewsets.ModelViewSet):
+class CircleFamilyMembershipViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     """ViewSet для управления членством семей в кругах"""
     serializer_class = CircleFamilyMembershipSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
         """Возвращаем членства семей текущего пользователя"""
-        user = self.request.user
-        user_families = NuclearFamily.objects.filter(
-            memberships__user=user,
-            memberships__status='active'
-        )
-        return CircleFamilyMembership.objects.filter(family__in=user_families)
+        return CircleFamilyMembership.objects.filter(family_id__in=get_access_scope(self.request.user).family_ids)
     
     def get_serializer_class(self):
         if self.action in ['update', 'partial_update']:
@@ -169,13 +153,7 @@ class CircleFamilyMembershipViewSet(viewsets.ModelViewSet):
         user = request.user
         
         # Проверяем права пользователя в семье
-        family_membership = FamilyMembership.objects.get(
-            user=user,
-            family=membership.family,
-            status='active'
-        )
-        
-        if not family_membership.can_manage_circle_access:
+        if not get_access_scope(user).has_permission(membership.family_id, 'can_manage_circle_access'):
             return Response(
                 {'error': 'У вас нет прав для выхода семьи из круга'},
                 status=status.HTTP_403_FORBIDDEN
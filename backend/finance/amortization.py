@@ -0,0 +1,190 @@
+from collections import namedtuple
+from decimal import Decimal
+
+import numpy as np
+from django.utils import timezone
+
+from .recurrence import add_months
+
+# Условия графика: сумма, ставка % годовых, число месяцев, способ погашения, дата первого платежа
+LoanTerms = namedtuple('LoanTerms', ['principal', 'annual_rate', 'months', 'payment_type', 'first_date'])
+
+# Графики пачки кредитов: матрицы (кредит x номер платежа), лишние ячейки — нули
+ScheduleBatch = namedtuple('ScheduleBatch', ['months', 'payment', 'principal', 'interest', 'balance'])
+
+PAYMENT_TYPES = ('annuity', 'diff')
+
+
+def get_loan_terms(liability):
+    """
+    Условия графика пассива или строка с причиной, почему график не построить.
+    Срок — полные месяцы от open_date до close_date, первый платёж —
+    payment_date или через месяц после открытия.
+    """
+    if not liability.close_date:
+        return 'Не указана дата окончания'
+    if liability.payment_type not in PAYMENT_TYPES:
+        return 'Не указан способ погашения'
+    months = (liability.close_date.year - liability.open_date.year) * 12 + (
+        liability.close_date.month - liability.open_date.month
+    )
+    if months < 1:
+        return 'Срок меньше месяца'
+    return LoanTerms(
+        principal=liability.initial_amount,
+        annual_rate=liability.interest_rate or Decimal('0'),
+        months=months,
+        payment_type=liability.payment_type,
+        first_date=liability.payment_date or add_months(liability.open_date, 1),
+    )
+
+
+def build_schedules(terms):
+    """
+    Графики платежей сразу для пачки кредитов матричными операциями NumPy.
+
+    Остаток перед k-м платежом считается по замкнутой формуле, без цикла
+    по месяцам: для аннуитета B(k-1) = P*q^(k-1) - A*(q^(k-1) - 1)/r, q = 1 + r,
+    для дифференцированного B(k-1) = P - (k-1)*P/n. Проценты — B(k-1)*r.
+    Суммы округляются до копеек, последний платёж закрывает остаток целиком.
+    """
+    count = len(terms)
+    months = np.array([term.months for term in terms], dtype=np.int64)
+    if not count:
+        empty = np.zeros((0, 0))
+        return ScheduleBatch(months, empty, empty, empty, empty)
+    principal = np.array([float(term.principal) for term in terms])
+    rate = np.array([float(term.annual_rate) for term in terms]) / 1200
+    annuity = np.array([term.payment_type == 'annuity' for term in terms])
+
+    number = np.arange(1, months.max() + 1)
+    valid = number[None, :] <= months[:, None]
+    elapsed = (number - 1)[None, :].astype(float)
+    P, r, n = principal[:, None], rate[:, None], months[:, None].astype(float)
+    has_rate = r > 0
+    safe_rate = np.where(has_rate, r, 1.0)
+
+    growth = (1 + r) ** elapsed
+    payment = np.where(has_rate, P * safe_rate / (1 - (1 + safe_rate) ** -n), P / n)
+    opening = np.where(
+        annuity[:, None],
+        np.where(has_rate, P * growth - payment * (growth - 1) / safe_rate, P - payment * elapsed),
+        P - P / n * elapsed,
+    )
+    interest = np.round(np.where(valid, opening * r, 0.0), 2)
+    principal_part = np.round(np.where(valid, np.where(annuity[:, None], payment - opening * r, P / n), 0.0), 2)
+
+    # Остаток от округлений уходит в последний платёж
+    rows = np.arange(count)
+    last = months - 1
+    paid_before_last = principal_part.sum(axis=1) - principal_part[rows, last]
+    principal_part[rows, last] = np.round(principal - paid_before_last, 2)
+
+    balance = np.where(valid, np.round(P - np.cumsum(principal_part, axis=1), 2), 0.0)
+    return ScheduleBatch(months, np.round(principal_part + interest, 2), principal_part, interest, balance)
+
+
+def get_due_dates(first_date, months):
+    """Даты платежей: ежемесячно в день первого платежа (с обрезкой до конца месяца)"""
+    return [add_months(first_date, k, anchor_day=first_date.day) for k in range(months)]
+
+
+def reconcile(due_dates, scheduled, payments, today=None):
+    """
+    Сверить график одного кредита с внесёнными платежами.
+    Платёж относится к ближайшей дате графика не раньше его даты (после
+    последней даты — к последнему платежу). scheduled — суммы платежей
+    по графику, payments — [(дата, сумма, основной долг, проценты)].
+    Возвращает (оплачено, основной долг, проценты, статусы) по строкам графика.
+    """
+    today = today or timezone.localdate()
+    size = len(due_dates)
+    due = np.array([day.toordinal() for day in due_dates], dtype=np.int64)
+    if payments:
+        paid_on = np.array([payment[0].toordinal() for payment in payments], dtype=np.int64)
+        period = np.minimum(np.searchsorted(due, paid_on, side='left'), size - 1)
+        sums = [
+            np.bincount(period, weights=[float(payment[column]) for payment in payments], minlength=size)
+            for column in (1, 2, 3)
+        ]
+    else:
+        sums = [np.zeros(size)] * 3
+    paid = np.round(sums[0], 2)
+    status = np.where(
+        paid >= scheduled - 0.005, 'paid',
+        np.where(paid > 0, 'partial', np.where(due < today.toordinal(), 'overdue', 'upcoming'))
+    )
+    return paid, np.round(sums[1], 2), np.round(sums[2], 2), status
+
+
+def to_decimal(value):
+    return Decimal(f'{value:.2f}')
+
+
+def build_liability_schedules(liabilities, payments_by_liability, include_rows=True, today=None):
+    """
+    Графики пассивов со сверкой по платежам. Возвращает (графики, пропущенные),
+    где пропущенные — [{'id', 'reason'}] для пассивов без нужных условий.
+    """
+    today = today or timezone.localdate()
+    loans, skipped = [], []
+    for liability in liabilities:
+        terms = get_loan_terms(liability)
+        if isinstance(terms, str):
+            skipped.append({'id': liability.id, 'reason': terms})
+        else:
+            loans.append((liability, terms))
+    batch = build_schedules([terms for _, terms in loans])
+
+    schedules = []
+    for index, (liability, terms) in enumerate(loans):
+        size = terms.months
+        due_dates = get_due_dates(terms.first_date, size)
+        scheduled = batch.payment[index, :size]
+        paid, paid_principal, paid_interest, status = reconcile(
+            due_dates, scheduled, payments_by_liability.get(liability.id, []), today
+        )
+        principal = batch.principal[index, :size]
+        is_due = np.array([day <= today for day in due_dates])
+        scheduled_principal = principal[is_due].sum()
+        actual_principal = paid_principal.sum()
+        item = {
+            'liability': liability.id,
+            'currency': liability.currency_id,
+            'payment_type': terms.payment_type,
+            'months': size,
+            'total_payment': to_decimal(scheduled.sum()),
+            'total_interest': to_decimal(batch.interest[index, :size].sum()),
+            'scheduled_principal_to_date': to_decimal(scheduled_principal),
+            'paid_principal': to_decimal(actual_principal),
+            'paid_interest': to_decimal(paid_interest.sum()),
+            'expected_debt': to_decimal(float(terms.principal) - scheduled_principal),
+            'current_debt': liability.current_debt,
+            # Плюс — погашено больше графика, минус — отставание
+            'principal_ahead': to_decimal(actual_principal - scheduled_principal),
+            'overdue': int((status == 'overdue').sum() + ((status == 'partial') & is_due).sum()),
+            'next_payment': next(
+                ({'date': day, 'amount': to_decimal(amount)}
+                 for day, amount, state in zip(due_dates, scheduled, status)
+                 if day >= today and state != 'paid'),
+                None
+            ),
+        }
+        if include_rows:
+            item['rows'] = [
+                {
+                    'number': k + 1,
+                    'date': due_dates[k],
+                    'payment': to_decimal(scheduled[k]),
+                    'principal': to_decimal(principal[k]),
+                    'interest': to_decimal(batch.interest[index, k]),
+                    'balance': to_decimal(batch.balance[index, k]),
+                    'paid': to_decimal(paid[k]),
+                    'paid_principal': to_decimal(paid_principal[k]),
+                    'paid_interest': to_decimal(paid_interest[k]),
+                    'status': str(status[k]),
+                }
+                for k in range(size)
+            ]
+        schedules.append(item)
+    return schedules, skipped
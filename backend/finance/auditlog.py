@@ -0,0 +1,227 @@
+import gzip
+import json
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+from .models import FinanceLog
+
+STORAGE_MODES = ('full', 'diff')
+ARCHIVE_PATTERN = 'finance_logs-*.jsonl.gz'
+# Служебная запись архивации: полное состояние объекта на границу архива
+SNAPSHOT_ACTION = 'snapshot'
+
+
+def get_storage_mode():
+    mode = getattr(settings, 'FINANCE_LOG_STORAGE', 'full')
+    return mode if mode in STORAGE_MODES else 'full'
+
+
+def dump_json(data):
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def pack_snapshot(data):
+    """Полное состояние объекта в сжатом виде (JSON + zlib)"""
+    return zlib.compress(dump_json(data).encode('utf-8'))
+
+
+def unpack_snapshot(value):
+    if value is None:
+        return None
+    return json.loads(zlib.decompress(bytes(value)).decode('utf-8'))
+
+
+def compute_changes(before, after):
+    """Изменённые поля {поле: [до, после]} двух состояний объекта"""
+    before, after = before or {}, after or {}
+    return {
+        name: [before.get(name), after.get(name)]
+        for name in sorted(set(before) | set(after))
+        if before.get(name) != after.get(name)
+    }
+
+
+def compact_fields(fields):
+    """
+    Поля записи журнала в режиме diff: изменение объекта хранит только
+    изменённые поля, создание и удаление — сжатое полное состояние
+    (после создания и перед удалением). Пакетные записи (entity_id = 0)
+    и режим full хранят data_before/data_after как есть; изменённые поля
+    в режиме full пишутся рядом с ними (фильтр журнала по полю)
+    """
+    if not fields.get('entity_id'):
+        return fields
+    if get_storage_mode() != 'diff':
+        before, after = fields.get('data_before'), fields.get('data_after')
+        if before is not None and after is not None:
+            fields = {**fields, 'changes': compute_changes(before, after)}
+        return fields
+    fields = dict(fields)
+    before, after = fields.pop('data_before', None), fields.pop('data_after', None)
+    if before is None or after is None:
+        fields['snapshot'] = pack_snapshot(after if before is None else before)
+    else:
+        fields['changes'] = compute_changes(before, after)
+    return fields
+
+
+def entry_to_dict(entry):
+    """Запись журнала (модель или строка архива) в едином виде"""
+    if isinstance(entry, dict):
+        return {**entry, 'date': datetime.fromisoformat(entry['date'])}
+    return {
+        'id': entry.id,
+        'entity_type': entry.entity_type,
+        'entity_id': entry.entity_id,
+        'action': entry.action,
+        'user': entry.user_id,
+        'date': entry.date,
+        'data_before': entry.data_before,
+        'data_after': entry.data_after,
+        'changes': entry.changes,
+        'snapshot': unpack_snapshot(entry.snapshot),
+        'scope_key': entry.scope_key,
+    }
+
+
+def replay(entries, keep_snapshots=False):
+    """
+    Восстановить состояния объекта по его записям (по возрастанию даты).
+    Возвращает версии [{'id', 'date', 'action', 'user', 'changes', 'state'}],
+    state — состояние после записи (None после удаления). Служебные
+    снимки архивации задают состояние, но версиями считаются только с keep_snapshots.
+    """
+    state = None
+    versions = []
+    for entry in entries:
+        action = entry['action']
+        if entry['snapshot'] is not None:
+            previous = entry['snapshot'] if action == 'delete' else state
+            state = entry['snapshot']
+        elif entry['changes'] is not None and entry['data_after'] is None:
+            previous = state
+            state = {**(state or {}), **{name: value[1] for name, value in entry['changes'].items()}}
+        else:
+            # Запись в режиме full (изменённые поля при ней — только для фильтра)
+            previous = entry['data_before']
+            state = entry['data_after']
+        if action == 'delete':
+            state = None
+        if action == SNAPSHOT_ACTION and not keep_snapshots:
+            continue
+        versions.append({
+            'id': entry['id'],
+            'date': entry['date'],
+            'action': action,
+            'user': entry['user'],
+            'changes': entry['changes'] if entry['changes'] is not None else compute_changes(previous, state),
+            'state': state,
+        })
+    return versions
+
+
+def iter_archive(directory, entity_type=None, entity_id=None):
+    """Записи из архивных файлов каталога (gzip JSON-строки), с фильтром по объекту"""
+    for path in sorted(Path(directory).glob(ARCHIVE_PATTERN)):
+        with gzip.open(path, 'rt', encoding='utf-8') as stream:
+            for line in stream:
+                row = json.loads(line)
+                if entity_type is not None and (row['entity_type'], row['entity_id']) != (entity_type, entity_id):
+                    continue
+                yield entry_to_dict(row)
+
+
+def get_entity_history(entity_type, entity_id, archive_dir=None):
+    """
+    История объекта: версии из архива (если указан каталог) и из таблицы.
+    Таблица начинается с контрольного снимка архивации, поэтому состояния
+    восстанавливаются и без архива, но версии до границы архива — только с ним.
+    """
+    entries = [
+        entry_to_dict(entry)
+        for entry in FinanceLog.objects.filter(entity_type=entity_type, entity_id=entity_id).order_by('date', 'id')
+    ]
+    if archive_dir:
+        # Запись, попавшая в архив дважды (повтор после сбоя), учитывается один раз
+        entries = list({
+            entry['id']: entry for entry in [*iter_archive(archive_dir, entity_type, entity_id), *entries]
+        }.values())
+        entries.sort(key=lambda entry: (entry['date'], entry['id']))
+    return replay(entries)
+
+
+def get_entity_state(entity_type, entity_id, at=None, archive_dir=None):
+    """Состояние объекта на момент at (по умолчанию последнее), None если его не было"""
+    state = None
+    for version in get_entity_history(entity_type, entity_id, archive_dir):
+        if at is not None and version['date'] > at:
+            break
+        state = version['state']
+    return state
+
+
+def archive_row(entry):
+    row = entry_to_dict(entry)
+    return dump_json({**row, 'date': row['date'].isoformat()})
+
+
+def archive_path(directory, day):
+    return Path(directory) / f'finance_logs-{day:%Y-%m}.jsonl.gz'
+
+
+def archive_entries(queryset, directory, batch_size=2000):
+    """
+    Дописать записи в помесячные файлы каталога и вернуть
+    ({(тип, id): (пользователь, дата, область) последней записи объекта}, число записей).
+    Файлы дописываются новыми gzip-блоками, поэтому повторный запуск безопасен.
+    """
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    files = {}
+    last = {}
+    count = 0
+    try:
+        for entry in queryset.order_by('date', 'id').iterator(chunk_size=batch_size):
+            key = (entry.date.year, entry.date.month)
+            if key not in files:
+                files[key] = gzip.open(archive_path(directory, entry.date), 'at', encoding='utf-8')
+            files[key].write(archive_row(entry) + '\n')
+            if entry.entity_id:
+                last[(entry.entity_type, entry.entity_id)] = (entry.user_id, entry.date, entry.scope_key)
+            count += 1
+    finally:
+        for stream in files.values():
+            stream.close()
+    return last, count
+
+
+def make_checkpoints(entities, archived, batch_size=500):
+    """
+    Контрольные снимки на границу архива: состояние каждого объекта из
+    entities по его записям, уходящим в архив (archived). Объекты, удалённые
+    до границы, снимка не получают
+    """
+    checkpoints = []
+    keys = list(entities)
+    for start in range(0, len(keys), batch_size):
+        chunk = keys[start:start + batch_size]
+        condition = Q()
+        for entity_type, entity_id in chunk:
+            condition |= Q(entity_type=entity_type, entity_id=entity_id)
+        entries = {}
+        for entry in archived.filter(condition).order_by('date', 'id'):
+            entries.setdefault((entry.entity_type, entry.entity_id), []).append(entry_to_dict(entry))
+        for key in chunk:
+            versions = replay(entries.get(key, []), keep_snapshots=True)
+            if not versions or versions[-1]['state'] is None:
+                continue
+            user_id, day, scope_key = entities[key]
+            checkpoints.append(FinanceLog(
+                entity_type=key[0], entity_id=key[1], action=SNAPSHOT_ACTION, user_id=user_id,
+                date=day, scope_key=scope_key, snapshot=pack_snapshot(versions[-1]['state'])
+            ))
+    return checkpoints
@@ -0,0 +1,252 @@
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict, defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from .models import AssetValueHistory, Currency, CurrencyRate, Expense, Income, LiabilityPayment
+
+RATES_VERSION_KEY = 'currency_rates_version:{currency_id}'
+BASE_CURRENCY_KEY = 'base_currency_id'
+CENT = Decimal('0.01')
+
+# Модели с суммой в базовой валюте (BaseAmountMixin)
+BASE_AMOUNT_MODELS = [Income, Expense, LiabilityPayment, AssetValueHistory]
+
+
+class RateIndex:
+    """
+    История курсов одной валюты: отсортированные даты (ordinal) и курсы.
+    Курс на дату — последний известный на эту дату (бинарный поиск).
+    """
+    __slots__ = ('dates', 'rates', 'version', 'loaded_at')
+
+    def __init__(self, rows, version=None):
+        self.dates = [day.toordinal() for day, _ in rows]
+        self.rates = [rate for _, rate in rows]
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+    def rate_on(self, on):
+        position = bisect_right(self.dates, on.toordinal()) - 1
+        if position < 0:
+            return None
+        return self.rates[position]
+
+
+class CurrencyConverter:
+    """
+    Пересчёт сумм между валютами по курсам rate_to_base на дату.
+
+    Истории курсов держатся в памяти процесса (LRU на max_currencies валют)
+    и загружаются одним запросом на все недостающие валюты. Изменение курса
+    увеличивает версию валюты в кэше Django: остальные процессы видят её,
+    только если кэш общий (REDIS_URL, проверка common.E001). Поэтому история
+    в любом случае перечитывается не реже раза в max_age секунд.
+    """
+    def __init__(self, max_currencies=256, max_age=300):
+        self.max_currencies = max_currencies
+        self.max_age = max_age
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_indexes(self, currency_ids):
+        """Индексы курсов валют {currency_id: RateIndex}"""
+        currency_ids = {currency_id for currency_id in currency_ids if currency_id is not None}
+        if not currency_ids:
+            return {}
+        keys = {currency_id: RATES_VERSION_KEY.format(currency_id=currency_id) for currency_id in currency_ids}
+        versions = cache.get_many(keys.values())
+        indexes = {}
+        stale = []
+        expired = time.monotonic() - self.max_age
+        with self._lock:
+            for currency_id in currency_ids:
+                index = self._indexes.get(currency_id)
+                if index is not None and index.version == versions.get(keys[currency_id]) and index.loaded_at > expired:
+                    self._indexes.move_to_end(currency_id)
+                    indexes[currency_id] = index
+                else:
+                    stale.append(currency_id)
+        if stale:
+            indexes.update(self.load(stale, {currency_id: versions.get(keys[currency_id]) for currency_id in stale}))
+        return indexes
+
+    def load(self, currency_ids, versions):
+        rows = defaultdict(list)
+        for currency_id, day, rate in CurrencyRate.objects.filter(currency_id__in=currency_ids).order_by(
+            'currency_id', 'date'
+        ).values_list('currency_id', 'date', 'rate_to_base'):
+            rows[currency_id].append((day, rate))
+        loaded = {currency_id: RateIndex(rows[currency_id], versions[currency_id]) for currency_id in currency_ids}
+        with self._lock:
+            for currency_id, index in loaded.items():
+                self._indexes[currency_id] = index
+                self._indexes.move_to_end(currency_id)
+            while len(self._indexes) > self.max_currencies:
+                self._indexes.popitem(last=False)
+        return loaded
+
+    def invalidate(self, currency_id):
+        with self._lock:
+            self._indexes.pop(currency_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+    def convert_many(self, items, to_currency_id, on=None, keep_missing=True):
+        """
+        Пересчитать суммы [(сумма, валюта) или (сумма, валюта, дата)] в валюту
+        to_currency_id. Возвращает (список сумм, множество валют без курса);
+        суммы без курса остаются непересчитанными (None при keep_missing=False).
+        """
+        items = list(items)
+        on = on or timezone.localdate()
+        sources = {item[1] for item in items if item[1] != to_currency_id}
+        if not sources:
+            return [item[0] for item in items], set()
+        indexes = self.get_indexes(sources | {to_currency_id})
+        base_id = get_base_currency_id()
+        factors = {}
+        missing = set()
+        result = []
+        for item in items:
+            amount, currency_id = item[0], item[1]
+            day = item[2] if len(item) > 2 else on
+            if amount is None:
+                result.append(None)
+                continue
+            if currency_id == to_currency_id:
+                result.append(amount)
+                continue
+            key = (currency_id, day)
+            if key not in factors:
+                factors[key] = self.get_factor(indexes, base_id, currency_id, to_currency_id, day)
+            factor = factors[key]
+            if factor is None:
+                missing.add(currency_id)
+                result.append(amount if keep_missing else None)
+            else:
+                # Как Round() в recompute_base_amounts: половина — от нуля
+                result.append((amount * factor).quantize(CENT, rounding=ROUND_HALF_UP))
+        return result, missing
+
+    def convert(self, amount, from_currency_id, to_currency_id, on=None):
+        """Пересчитать одну сумму, None если курса нет"""
+        converted, missing = self.convert_many([(amount, from_currency_id)], to_currency_id, on)
+        return None if missing else converted[0]
+
+    def get_factor(self, indexes, base_id, from_currency_id, to_currency_id, day):
+        source_rate = self.get_rate(indexes, base_id, from_currency_id, day)
+        target_rate = self.get_rate(indexes, base_id, to_currency_id, day)
+        if not source_rate or not target_rate:
+            return None
+        return source_rate / target_rate
+
+    def get_rate(self, indexes, base_id, currency_id, day):
+        index = indexes.get(currency_id)
+        rate = index.rate_on(day) if index else None
+        if rate is None and currency_id == base_id:
+            # Для базовой валюты курсы можно не заводить
+            return Decimal('1')
+        return rate
+
+
+converter = CurrencyConverter(
+    getattr(settings, 'CURRENCY_RATES_CACHE_SIZE', 256), getattr(settings, 'CURRENCY_CACHE_TIMEOUT', 300)
+)
+
+
+def get_base_currency_id():
+    """Id встроенной базовой валюты (код settings.BASE_CURRENCY_CODE), в кэше не дольше CURRENCY_CACHE_TIMEOUT"""
+    def lookup():
+        # В кэш нельзя положить None, поэтому отсутствие валюты храним как 0
+        return Currency.objects.filter(
+            code=getattr(settings, 'BASE_CURRENCY_CODE', 'RUB'), is_default=True
+        ).values_list('id', flat=True).order_by('id').first() or 0
+    timeout = getattr(settings, 'CURRENCY_CACHE_TIMEOUT', 300)
+    return cache.get_or_set(BASE_CURRENCY_KEY, lookup, timeout=timeout) or None
+
+
+def fill_base_amounts(instances):
+    """
+    Суммы в базовой валюте для пачки объектов BaseAmountMixin одним пересчётом
+    (bulk_create и bulk_update не вызывают save()). Без курса — None
+    """
+    instances = list(instances)
+    base_id = get_base_currency_id()
+    if base_id is None:
+        amounts = [None] * len(instances)
+    else:
+        amounts, _ = converter.convert_many([
+            (getattr(item, item.amount_field), item.get_amount_currency_id(), item._meta.get_field('date').to_python(item.date))
+            for item in instances
+        ], base_id, keep_missing=False)
+    for item, amount in zip(instances, amounts):
+        item.amount_base = amount
+
+
+def invalidate_currency_rates(currency_id):
+    """Сбросить историю курсов валюты во всех процессах (при общем кэше)"""
+    converter.invalidate(currency_id)
+    key = RATES_VERSION_KEY.format(currency_id=currency_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Уникальная начальная версия, как и у области доступа
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def invalidate_base_currency():
+    cache.delete(BASE_CURRENCY_KEY)
+
+
+def recompute_base_amounts(currency_id, date_from=None, date_to=None, models=None):
+    """
+    Пересчитать amount_base операций в валюте currency_id с датами
+    в [date_from, date_to) одним UPDATE на таблицу: курс на дату каждой строки
+    берётся коррелированным подзапросом по индексу (currency, date).
+    Возвращает количество обновлённых строк.
+    """
+    base_id = get_base_currency_id()
+    updated = 0
+    for model in models or BASE_AMOUNT_MODELS:
+        rows = model.objects.filter(**{model.amount_currency_path: currency_id})
+        if date_from:
+            rows = rows.filter(date__gte=date_from)
+        if date_to:
+            rows = rows.filter(date__lt=date_to)
+        amount = F(model.amount_field)
+        # UPDATE не вызывает auto_now: сдвигаем updated_at сами (валидаторы условного GET)
+        touch = {'updated_at': timezone.now()} if any(
+            field.name == 'updated_at' for field in model._meta.concrete_fields
+        ) else {}
+        if base_id is None:
+            updated += rows.update(amount_base=None, **touch)
+        elif currency_id == base_id:
+            updated += rows.update(amount_base=amount, **touch)
+        else:
+            rate = CurrencyRate.objects.filter(
+                currency_id=currency_id, date__lte=OuterRef('date')
+            ).order_by('-date').values('rate_to_base')[:1]
+            updated += rows.update(amount_base=Round(amount * Subquery(rate), 2), **touch)
+    return updated
+
+
+def recompute_after_rate_change(currency_id, *dates):
+    """
+    Курс, введённый с даты D, действует до следующего курса этой валюты,
+    поэтому пересчитываются только строки от min(dates) до следующей даты курса
+    """
+    dates = [CurrencyRate._meta.get_field('date').to_python(value) for value in dates]
+    date_to = CurrencyRate.objects.filter(currency_id=currency_id, date__gt=max(dates)).order_by(
+        'date'
+    ).values_list('date', flat=True).first()
+    return recompute_base_amounts(currency_id, min(dates), date_to)
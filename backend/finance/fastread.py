@@ -0,0 +1,186 @@
+import decimal
+import threading
+from collections import OrderedDict
+from datetime import date
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from rest_framework import fields, relations, serializers
+from rest_framework.settings import api_settings
+
+INTEGER_TYPES = {
+    'AutoField', 'BigAutoField', 'SmallAutoField', 'IntegerField', 'BigIntegerField', 'SmallIntegerField',
+    'PositiveIntegerField', 'PositiveBigIntegerField', 'PositiveSmallIntegerField',
+}
+TEXT_TYPES = {'CharField', 'TextField', 'SlugField', 'EmailField', 'URLField'}
+
+# Ключ содержит пути из ?fields=/?expand= как есть (неизвестные имена
+# сериализатор молча пропускает), поэтому кэш — LRU ограниченного размера
+MAX_PLANS = 256
+_plans = OrderedDict()
+_plans_lock = threading.Lock()
+
+
+def decimal_converter(field):
+    """Повтор DecimalField.to_representation с заранее посчитанными шагом и контекстом"""
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def convert(value):
+        return '{:f}'.format(value.quantize(exponent, rounding=rounding, context=context))
+    return convert
+
+
+def datetime_converter(field):
+    """DateTimeField.to_representation для значений из БД при USE_TZ (они всегда aware)"""
+    def convert(value):
+        value = value.astimezone(timezone.get_current_timezone()).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+def get_converter(field, db_field):
+    """
+    Преобразование значения из .values() в значение ответа: None — значение
+    отдаётся как есть, иначе функция. Для типов без быстрого пути — сам
+    field.to_representation (значение из .values() то же, что атрибут модели).
+    """
+    db_type = db_field.get_internal_type()
+    if isinstance(field, fields.DecimalField):
+        coerce = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+        if (db_type == 'DecimalField' and coerce and not field.localize and not field.normalize_output
+                and field.decimal_places is not None):
+            return decimal_converter(field)
+    elif isinstance(field, fields.DateTimeField):
+        if (db_type == 'DateTimeField' and settings.USE_TZ and not hasattr(field, 'timezone')
+                and getattr(field, 'format', api_settings.DATETIME_FORMAT) == fields.ISO_8601):
+            return datetime_converter(field)
+    elif isinstance(field, fields.DateField):
+        if db_type == 'DateField' and getattr(field, 'format', api_settings.DATE_FORMAT) == fields.ISO_8601:
+            return date.isoformat
+    elif isinstance(field, fields.ChoiceField):
+        if db_type in TEXT_TYPES and all(isinstance(key, str) for key in field.choices):
+            return None
+    elif isinstance(field, fields.CharField):
+        if db_type in TEXT_TYPES:
+            return None
+    elif isinstance(field, fields.IntegerField):
+        if db_type in INTEGER_TYPES:
+            return None
+    elif isinstance(field, fields.BooleanField):
+        if db_type == 'BooleanField':
+            return None
+    elif isinstance(field, fields.JSONField):
+        if db_type == 'JSONField' and not field.binary:
+            return None
+    return field.to_representation
+
+
+class ValuesPlan:
+    """
+    План чтения ModelSerializer из строк .values(): для каждого поля ответа —
+    колонка и преобразование (Decimal — строка с фиксированной точностью,
+    дата и время — ISO, внешний ключ — колонка <поле>_id). Вложенный список
+    (обратная связь, many=True) читается одним запросом на страницу
+    в порядке Meta.ordering модели или по pk.
+    """
+    def __init__(self, model, columns, steps, nested):
+        self.model = model
+        self.columns = columns
+        self.steps = steps
+        self.nested = nested
+
+    def values(self, queryset, extra=()):
+        # prefetch_related обычного пути не нужен: вложенные списки читает render()
+        return queryset.prefetch_related(None).values(*dict.fromkeys([*self.columns, *extra]))
+
+    def render(self, rows):
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, convert in self.steps:
+                value = row[column]
+                if value is not None and convert is not None:
+                    value = convert(value)
+                item[name] = value
+            data.append(item)
+        for name, plan, fk, ordering in self.nested:
+            # На месте вложенного поля пока стоит pk объекта (см. build_plan)
+            ids = [item[name] for item in data]
+            children = {pk: [] for pk in ids}
+            if ids:
+                queryset = plan.model._default_manager.filter(**{f'{fk.name}__in': ids}).order_by(*ordering)
+                for row in plan.values(queryset, extra=[fk.attname]):
+                    children[row[fk.attname]].append(row)
+            for item in data:
+                item[name] = plan.render(children[item[name]])
+        return data
+
+
+def build_plan(serializer, annotations=None):
+    """План для экземпляра ModelSerializer или None, если поле не сводится к колонке"""
+    model = serializer.Meta.model
+    annotations = annotations or {}
+    columns, steps, nested = [], [], []
+    pk_name = model._meta.pk.attname
+    for field in serializer._readable_fields:
+        source = field.source
+        if source in annotations:
+            column, db_field = source, annotations[source].output_field
+        else:
+            try:
+                db_field = model._meta.get_field(source)
+            except FieldDoesNotExist:
+                return None
+            column = getattr(db_field, 'attname', None)
+
+        if isinstance(field, serializers.ListSerializer):
+            child = field.child
+            if not (isinstance(child, serializers.ModelSerializer) and db_field.one_to_many and db_field.auto_created):
+                return None
+            child_plan = build_plan(child)
+            if child_plan is None or child_plan.model is not db_field.related_model:
+                return None
+            ordering = db_field.related_model._meta.ordering or ('pk',)
+            nested.append((field.field_name, child_plan, db_field.field, ordering))
+            column, convert = pk_name, None
+        elif isinstance(field, relations.PrimaryKeyRelatedField):
+            # Внешний ключ — значение колонки <поле>_id, объект не загружается
+            if field.pk_field is not None or not db_field.concrete or not db_field.many_to_one:
+                return None
+            convert = None
+        elif isinstance(field, (serializers.BaseSerializer, relations.RelatedField, relations.ManyRelatedField,
+                                fields.SerializerMethodField, fields.HiddenField)):
+            return None
+        elif source in annotations or (db_field.concrete and not db_field.is_relation):
+            convert = get_converter(field, db_field)
+        else:
+            return None
+        columns.append(column)
+        steps.append((field.field_name, column, convert))
+    return ValuesPlan(model, columns, steps, nested)
+
+
+def get_values_plan(serializer_class, queryset, selection=None):
+    """
+    План для класса сериализатора, аннотаций выборки и выбора полей
+    ({'fields': пути, 'expand': пути}, см. common.fieldsets) — кэшируется
+    (LRU на MAX_PLANS планов). None — сериализатор читается только обычным путём.
+    """
+    annotations = queryset.query.annotations
+    selection = selection or {}
+    key = (serializer_class, tuple(annotations), tuple(sorted(selection.items())))
+    with _plans_lock:
+        if key in _plans:
+            _plans.move_to_end(key)
+            return _plans[key]
+    plan = build_plan(serializer_class(**selection), annotations)
+    with _plans_lock:
+        _plans[key] = plan
+        while len(_plans) > MAX_PLANS:
+            _plans.popitem(last=False)
+    return plan
@@ -0,0 +1,232 @@
+import codecs
+import csv
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import models
+
+from common.access import get_access_scope, make_scope_key
+from .currency import fill_base_amounts
+from .models import Category, Currency, Expense, Income
+
+FORMATS = ('csv', 'jsonl')
+# Кодировки файлов: cp1251 — выгрузки российских банков и Excel
+ENCODINGS = ('utf-8', 'cp1251')
+ENCODING_SNIFF_SIZE = 64 * 1024
+DATE_FORMATS = ('%Y-%m-%d', '%d.%m.%Y')
+MAX_ERRORS = 1000
+
+# Модель -> (тип категории, тип по умолчанию)
+IMPORT_MODELS = {
+    Expense: ('expense', 'optional'),
+    Income: ('income', 'occasional'),
+}
+
+
+def guess_format(filename):
+    """Формат по расширению файла: .jsonl/.ndjson/.json — JSON-строки, иначе CSV"""
+    if filename and filename.lower().rsplit('.', 1)[-1] in ('jsonl', 'ndjson', 'json'):
+        return 'jsonl'
+    return 'csv'
+
+
+def guess_encoding(stream):
+    """UTF-8, если им читается начало потока, иначе cp1251; поток возвращается в начало"""
+    head = stream.read(ENCODING_SNIFF_SIZE)
+    stream.seek(0)
+    try:
+        # Без final: символ, обрезанный на границе, ошибкой не считается
+        codecs.getincrementaldecoder('utf-8')().decode(head)
+    except UnicodeDecodeError:
+        return 'cp1251'
+    return 'utf-8'
+
+
+def decode_lines(stream, encoding=None):
+    """
+    Строки бинарного потока в кодировке encoding (None — guess_encoding).
+    Декодирование строгое: UnicodeDecodeError при чтении означает неверную кодировку
+    """
+    encoding = encoding or guess_encoding(stream)
+    return codecs.iterdecode(stream, 'utf-8-sig' if encoding == 'utf-8' else encoding)
+
+
+def iter_rows(stream, fmt, encoding=None):
+    """
+    Построчное чтение бинарного потока: CSV (с заголовком, разделитель , или ;)
+    или JSON-строки. Файл целиком в память не загружается.
+    Ошибки разбора строки JSON возвращаются как строка с ключом '__error__'.
+    """
+    lines = decode_lines(stream, encoding)
+    if fmt == 'csv':
+        header = next(lines, '')
+        delimiter = ';' if header.count(';') > header.count(',') else ','
+        fields = next(csv.reader([header], delimiter=delimiter), [])
+        yield from csv.DictReader(lines, fieldnames=[field.strip().lower() for field in fields], delimiter=delimiter)
+        return
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = {'__error__': 'Строка не является JSON'}
+        yield row if isinstance(row, dict) else {'__error__': 'Ожидается JSON-объект'}
+
+
+def load_currencies(user):
+    """Коды валют пользователя {КОД: id}; своя валюта перекрывает встроенную с тем же кодом"""
+    return {
+        code.upper(): currency_id
+        for currency_id, code in Currency.objects.filter(
+            models.Q(owner__isnull=True) | models.Q(owner=user)
+        ).order_by(models.F('owner_id').asc(nulls_first=True), 'id').values_list('id', 'code')
+    }
+
+
+class OperationImporter:
+    """
+    Импорт расходов или доходов пользователя из потока строк.
+
+    Коды валют и названия категорий разрешаются по словарям, загруженным
+    один раз; строки вставляются пачками bulk_create по chunk_size.
+    Ошибочные строки пропускаются и возвращаются списком
+    [{'row': номер, 'errors': {поле: сообщение}}] (не больше MAX_ERRORS).
+    С deduplicate=True строки с отпечатком (fingerprint), уже записанным
+    в области, пропускаются: по одному запросу на пачку.
+    """
+    def __init__(self, model, user, family_id=None, chunk_size=1000, dry_run=False, deduplicate=False,
+                 currencies=None):
+        if model not in IMPORT_MODELS:
+            raise ValueError(model)
+        self.model = model
+        self.user = user
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.deduplicate = deduplicate
+        self.created = 0
+        self.skipped = 0
+        self.errors = []
+        self.pending = []
+        self.category_type, self.default_type = IMPORT_MODELS[model]
+        self.types = {value for value, _ in model._meta.get_field('type').choices}
+        self.recurrence_types = {value for value, _ in model._meta.get_field('recurrence_type').choices}
+
+        scope = get_access_scope(user)
+        if family_id and not scope.is_member(family_id):
+            raise ValueError('Вы не являетесь членом выбранной семьи')
+        self.owner_fields = (
+            {'owner_id': None, 'family_id': family_id, 'is_family': True} if family_id
+            else {'owner_id': user.pk, 'family_id': None, 'is_family': False}
+        )
+        self.scope_key = make_scope_key(**self.owner_fields)
+
+        self.currencies = load_currencies(user) if currencies is None else currencies
+        self.currency_ids = set(self.currencies.values())
+        self.categories = {}
+        for category_id, name in Category.objects.filter(
+            scope_key__in=scope.scope_keys, type=self.category_type
+        ).order_by('-id').values_list('id', 'name'):
+            self.categories[name.strip().lower()] = category_id
+        self.category_ids = set(self.categories.values())
+
+    def run(self, rows):
+        """Импортировать строки; возвращает (создано, ошибки)"""
+        for number, row in enumerate(rows, start=1):
+            self.add(number, row)
+        self.flush()
+        return self.created, self.errors
+
+    def add(self, number, row):
+        """Добавить строку в текущую пачку; полная пачка записывается"""
+        instance, row_errors = self.build(row)
+        if row_errors:
+            if len(self.errors) < MAX_ERRORS:
+                self.errors.append({'row': number, 'errors': row_errors})
+            return
+        self.pending.append(instance)
+        if len(self.pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        chunk, self.pending = self.pending, []
+        if self.deduplicate and chunk:
+            known = set(self.model.objects.filter(
+                scope_key=self.scope_key, fingerprint__in=[item.fingerprint for item in chunk]
+            ).exclude(fingerprint='').values_list('fingerprint', flat=True))
+            fresh = [item for item in chunk if item.fingerprint not in known]
+            self.skipped += len(chunk) - len(fresh)
+            chunk = fresh
+        self.created += self.save_chunk(chunk)
+
+    def save_chunk(self, chunk):
+        if not chunk:
+            return 0
+        fill_base_amounts(chunk)
+        if not self.dry_run:
+            self.model.objects.bulk_create(chunk)
+        return len(chunk)
+
+    def build(self, row):
+        """Объект модели из строки или (None, ошибки)"""
+        if '__error__' in row:
+            return None, {'row': row['__error__']}
+        errors = {}
+        values = {}
+        name = str(row.get('name') or '').strip()
+        if not name:
+            errors['name'] = 'Обязательное поле'
+        elif len(name) > 150:
+            errors['name'] = 'Не длиннее 150 символов'
+        values['name'] = name
+
+        try:
+            values['amount'] = Decimal(str(row.get('amount', '')).replace(' ', '').replace(',', '.')).quantize(Decimal('0.01'))
+            if not values['amount'].is_finite() or abs(values['amount']) >= Decimal('1e18'):
+                raise InvalidOperation
+        except InvalidOperation:
+            errors['amount'] = 'Некорректная сумма'
+
+        values['date'] = self.parse_date(row.get('date'))
+        if values['date'] is None:
+            errors['date'] = 'Ожидается дата ГГГГ-ММ-ДД или ДД.ММ.ГГГГ'
+
+        currency = str(row.get('currency') or '').strip()
+        values['currency_id'] = self.resolve(currency, self.currencies, self.currency_ids, upper=True)
+        if values['currency_id'] is None:
+            errors['currency'] = f'Валюта не найдена: {currency}' if currency else 'Обязательное поле'
+
+        category = str(row.get('category') or '').strip()
+        values['category_id'] = self.resolve(category, self.categories, self.category_ids) if category else None
+        if category and values['category_id'] is None:
+            errors['category'] = f'Категория не найдена: {category}'
+
+        values['type'] = str(row.get('type') or self.default_type).strip()
+        if values['type'] not in self.types:
+            errors['type'] = f'Допустимо: {", ".join(sorted(self.types))}'
+        values['recurrence_type'] = str(row.get('recurrence_type') or 'none').strip()
+        if values['recurrence_type'] not in self.recurrence_types:
+            errors['recurrence_type'] = f'Допустимо: {", ".join(sorted(self.recurrence_types))}'
+
+        if errors:
+            return None, errors
+        return self.model(
+            scope_key=self.scope_key, fingerprint=row.get('fingerprint', '') if self.deduplicate else '',
+            **self.owner_fields, **values
+        ), None
+
+    def resolve(self, value, by_name, ids, upper=False):
+        """Id по коду/названию из словаря или по числовому id"""
+        if value.isdigit() and int(value) in ids:
+            return int(value)
+        return by_name.get(value.upper() if upper else value.lower())
+
+    def parse_date(self, value):
+        value = str(value or '').strip()
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(value, fmt).date()
+            except ValueError:
+                continue
+        return None
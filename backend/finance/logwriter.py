@@ -0,0 +1,113 @@
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.utils import timezone
+
+from .auditlog import compact_fields
+from .models import FinanceLog
+
+logger = logging.getLogger(__name__)
+
+
+class FinanceLogWriter:
+    """
+    Запись FinanceLog.
+
+    По умолчанию (FINANCE_LOG_BUFFER_SIZE <= 1) запись сохраняется сразу,
+    в транзакции запроса, и фиксируется вместе с изменением.
+
+    Буфер включается явно (FINANCE_LOG_BUFFER_SIZE > 1): запись попадает
+    в память процесса после фиксации транзакции (transaction.on_commit),
+    поэтому откаченные изменения не логируются. Буфер пишется одним
+    bulk_create, когда в нём набирается FINANCE_LOG_BUFFER_SIZE записей
+    (в потоке, добавившем последнюю), раз в FINANCE_LOG_FLUSH_INTERVAL секунд
+    (фоновым потоком) и при штатном выходе из процесса. При аварийном
+    завершении (SIGKILL, OOM) несброшенные записи теряются. Если пакет
+    не записался, записи сохраняются по одной, чтобы ошибка одной строки
+    не теряла остальные.
+    """
+    def __init__(self):
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    @property
+    def buffer_size(self):
+        return getattr(settings, 'FINANCE_LOG_BUFFER_SIZE', 0)
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'FINANCE_LOG_FLUSH_INTERVAL', 2.0)
+
+    def write(self, **fields):
+        # Дата — момент действия, а не момент записи буфера
+        entry = FinanceLog(date=timezone.now(), **compact_fields(fields))
+        if self.buffer_size <= 1:
+            entry.save()
+        else:
+            transaction.on_commit(lambda: self.add(entry))
+        return entry
+
+    def add(self, entry):
+        self.ensure_thread()
+        with self._lock:
+            self._buffer.append(entry)
+            full = len(self._buffer) >= self.buffer_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Записать буфер; возвращает число сохранённых записей"""
+        with self._flush_lock:
+            with self._lock:
+                entries, self._buffer = self._buffer, []
+            if not entries:
+                return 0
+            try:
+                with transaction.atomic():
+                    FinanceLog.objects.bulk_create(entries)
+                return len(entries)
+            except DatabaseError:
+                logger.exception('Не удалось записать пакет FinanceLog, запись по одной')
+            saved = 0
+            for entry in entries:
+                try:
+                    entry.pk = None
+                    with transaction.atomic():
+                        entry.save()
+                    saved += 1
+                except DatabaseError:
+                    logger.exception('Запись FinanceLog потеряна: %s %s', entry.entity_type, entry.action)
+            return saved
+
+    def ensure_thread(self):
+        """Фоновый поток сброса по времени (заново после fork рабочего процесса)"""
+        if self.flush_interval <= 0 or (self._thread is not None and self._pid == os.getpid()):
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self.run, name='finance-log-writer', daemon=True)
+            self._thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Сбой записи буфера FinanceLog')
+            finally:
+                close_old_connections()
+
+
+log_writer = FinanceLogWriter()
+atexit.register(log_writer.flush)
@@ -0,0 +1,58 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from finance.auditlog import archive_entries, make_checkpoints
+from finance.models import FinanceLog
+
+
+class Command(BaseCommand):
+    help = (
+        'Перенести записи FinanceLog старше границы в помесячные архивы '
+        'finance_logs-ГГГГ-ММ.jsonl.gz. Для объектов, чьи записи ушли в архив, '
+        'в таблице остаётся контрольный снимок состояния на границу.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', help='Граница ГГГГ-ММ-ДД (по умолчанию сегодня минус --days)')
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--dir', default=None, help='Каталог архива (по умолчанию FINANCE_LOG_ARCHIVE_DIR)')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать записи')
+
+    def handle(self, *args, **options):
+        if options['before']:
+            try:
+                day = datetime.strptime(options['before'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Ожидается дата ГГГГ-ММ-ДД')
+        else:
+            day = timezone.localdate() - timedelta(days=options['days'])
+        cutoff = timezone.make_aware(datetime.combine(day, time.min))
+        directory = options['dir'] or settings.FINANCE_LOG_ARCHIVE_DIR
+
+        archived = FinanceLog.objects.filter(date__lt=cutoff)
+        # Записи, добавленные во время архивации, в неё не попадают
+        last_id = archived.aggregate(last=Max('id'))['last']
+        if last_id is None:
+            self.stdout.write(self.style.SUCCESS('Нет записей для архивации'))
+            return
+        archived = archived.filter(id__lte=last_id)
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Записей до {day}: {archived.count()}'))
+            return
+
+        # Сначала файлы, потом удаление: сбой между шагами оставляет записи в таблице,
+        # а повтор в архиве читатель учитывает один раз
+        entities, count = archive_entries(archived, directory, options['batch_size'])
+        with transaction.atomic():
+            checkpoints = make_checkpoints(entities, archived)
+            FinanceLog.objects.bulk_create(checkpoints, batch_size=options['batch_size'])
+            archived.delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Заархивировано записей: {count}, контрольных снимков: {len(checkpoints)}, каталог: {directory}'
+        ))
@@ -0,0 +1,76 @@
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.db import models, transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from common.access import make_scope_key
+from common.renderers import FastJSONRenderer, MessagePackRenderer, NDJSONRenderer
+from finance.fastread import get_values_plan
+from finance.models import Expense, ExpensePayment
+from finance.serializers import ExpenseSerializer
+from finance.views import DashboardViewSet
+
+from .bench_serializers import Command as SerializersCommand
+
+
+class Command(SerializersCommand):
+    help = (
+        'Сравнить рендереры ответа (JSONRenderer, orjson, MessagePack, NDJSON потоком) '
+        'на ответах дашборда и списке расходов: время и размер. '
+        'Данные генерируются внутри транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000, help='Количество расходов')
+        parser.add_argument('--repeat', type=int, default=5, help='Повторов рендера списка')
+        parser.add_argument('--dashboard-repeat', type=int, default=500, help='Повторов рендера ответа дашборда')
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = self.seed(options['rows'], options['batch_size'])
+            for title, data in self.get_dashboard_payloads(user):
+                self.compare(title, data, options['dashboard_repeat'])
+            self.compare('список расходов', self.get_expenses_payload(user), options['repeat'])
+            transaction.set_rollback(True)
+
+    def get_dashboard_payloads(self, user):
+        factory = APIRequestFactory()
+        params = {'date_from': (date.today() - timedelta(days=3650)).isoformat(), 'date_to': date.today().isoformat()}
+        for name in ('summary', 'cash_flow', 'net_worth_history'):
+            request = factory.get(f'/api/finance/dashboard/{name}/', params)
+            force_authenticate(request, user=user)
+            yield f'дашборд: {name}', DashboardViewSet.as_view({'get': name})(request).data
+
+    def get_expenses_payload(self, user):
+        queryset = Expense.objects.filter(scope_key=make_scope_key(owner_id=user.pk)).order_by('-date', '-id')
+        queryset = queryset.prefetch_related(models.Prefetch('payments', queryset=ExpensePayment.objects.order_by('pk')))
+        plan = get_values_plan(ExpenseSerializer, queryset)
+        return plan.render(plan.values(queryset))
+
+    def compare(self, title, data, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n{title}'))
+        renderers = [
+            ('JSONRenderer', JSONRenderer().render),
+            ('orjson', FastJSONRenderer().render),
+            ('NDJSON потоком', lambda data: b''.join(NDJSONRenderer().stream([data if isinstance(data, list) else [data]]))),
+        ]
+        if MessagePackRenderer.available:
+            renderers.insert(2, ('MessagePack', MessagePackRenderer().render))
+        else:
+            self.stdout.write('MessagePack: пропущен, msgpack не установлен')
+        baseline = None
+        for label, render in renderers:
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                content = render(data)
+                timings.append((time.perf_counter() - started) * 1000)
+            median = statistics.median(timings)
+            baseline = baseline or median
+            self.stdout.write(
+                f'{label}: медиана {median:.3f} мс, {len(content)} байт, ускорение {baseline / median:.1f}x'
+            )
@@ -0,0 +1,117 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction
+
+from common.access import get_access_scope
+from finance.models import Currency, Expense
+from nucfamily.models import NuclearFamily, FamilyMembership
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнить план и время выборки расходов пользователя: старое условие '
+        'OR + подзапрос + DISTINCT и выборку по денормализованному scope_key. '
+        'Данные генерируются внутри транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Количество расходов')
+        parser.add_argument('--users', type=int, default=2000, help='Количество пользователей')
+        parser.add_argument('--families', type=int, default=500, help='Количество семей')
+        parser.add_argument('--repeat', type=int, default=20, help='Повторов каждого запроса')
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            # EXPLAIN (ANALYZE, BUFFERS) есть только в PostgreSQL
+            raise CommandError('Бенчмарк рассчитан на PostgreSQL')
+        with transaction.atomic():
+            user = self.seed(options)
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE expenses')
+            self.compare(user, options['repeat'])
+            transaction.set_rollback(True)
+
+    def seed(self, options):
+        rnd = random.Random(42)
+        self.stdout.write(f"Генерация {options['rows']} расходов...")
+        users = User.objects.bulk_create([
+            User(
+                username=f'bench{i}', email=f'bench{i}@bench.local', phone=f'+7{9000000000 + i}',
+                first_name='Bench', last_name='User', middle_name='-', birth_date=date(1990, 1, 1),
+                password='!'
+            )
+            for i in range(options['users'])
+        ])
+        families = NuclearFamily.objects.bulk_create([
+            NuclearFamily(name=f'Семья {i}', join_code=f'BENCH{i:06d}', join_password='!')
+            for i in range(options['families'])
+        ])
+        user = users[0]
+        FamilyMembership.objects.bulk_create([
+            FamilyMembership(user=user, family=family, role='parent', status='active')
+            for family in families[:2]
+        ])
+        currency = Currency.objects.create(code='BNC', name='Bench')
+
+        start = date.today() - timedelta(days=3650)
+        created = 0
+        while created < options['rows']:
+            size = min(options['batch_size'], options['rows'] - created)
+            batch = []
+            for _ in range(size):
+                personal = rnd.random() < 0.5
+                batch.append(Expense(
+                    name='Расход',
+                    amount=Decimal(rnd.randint(100, 100000)),
+                    currency=currency,
+                    date=start + timedelta(days=rnd.randint(0, 3650)),
+                    type='mandatory',
+                    owner=rnd.choice(users) if personal else None,
+                    family=None if personal else rnd.choice(families),
+                    is_family=not personal,
+                ))
+            for expense in batch:
+                expense.refresh_scope_key()
+            Expense.objects.bulk_create(batch)
+            created += size
+        return user
+
+    def compare(self, user, repeat):
+        family_ids = FamilyMembership.objects.filter(user=user, status='active').values_list('family_id', flat=True)
+        legacy = Expense.objects.filter(
+            models.Q(owner=user) | models.Q(family__in=family_ids, is_family=True)
+        ).distinct()
+        keyed = Expense.objects.filter(scope_key__in=get_access_scope(user).scope_keys)
+
+        shapes = [
+            ('страница (limit 50)', lambda qs: qs.order_by('-date', '-id')[:50]),
+            ('весь список', lambda qs: qs.order_by('-date', '-id')),
+        ]
+        for title, shape in shapes:
+            for label, qs in [('OR + DISTINCT', legacy), ('scope_key', keyed)]:
+                query = shape(qs)
+                self.stdout.write(self.style.MIGRATE_HEADING(f'\n{title}: {label}'))
+                self.stdout.write(query.explain(analyze=True, buffers=True))
+                timings = self.measure(query, repeat)
+                self.stdout.write(self.style.SUCCESS(
+                    f'строк: {len(list(query))}, медиана {statistics.median(timings):.2f} мс, '
+                    f'p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:.2f} мс'
+                ))
+
+    def measure(self, query, repeat):
+        sql, params = query.query.sql_with_params()
+        timings = []
+        with connection.cursor() as cursor:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                cursor.execute(sql, params)
+                cursor.fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+        return timings
@@ -0,0 +1,99 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+from rest_framework.renderers import JSONRenderer
+
+from common.access import make_scope_key
+from finance.fastread import get_values_plan
+from finance.models import Currency, Expense, ExpensePayment, Income
+from finance.serializers import ExpenseSerializer, ExpenseSummarySerializer, IncomeSerializer
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнить время ответа списков: ModelSerializer по объектам модели '
+        'и быстрое чтение из .values() (finance.fastread), включая рендер JSON. '
+        'Ответы сверяются байт в байт. Данные генерируются внутри транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000], help='Размеры списков')
+        parser.add_argument('--repeat', type=int, default=3, help='Повторов каждого замера')
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = self.seed(max(options['rows']), options['batch_size'])
+            for rows in sorted(options['rows']):
+                self.compare(user, rows, options['repeat'])
+            transaction.set_rollback(True)
+
+    def seed(self, rows, batch_size):
+        rnd = random.Random(42)
+        self.stdout.write(f'Генерация {rows} расходов и доходов...')
+        user = User.objects.create(
+            username='bench', email='bench@bench.local', phone='+79000000000', first_name='Bench',
+            last_name='User', middle_name='-', birth_date=date(1990, 1, 1), password='!'
+        )
+        currency = Currency.objects.create(code='BNC', name='Bench')
+        scope_key = make_scope_key(owner_id=user.pk)
+        start = date.today() - timedelta(days=3650)
+        for model in (Expense, Income):
+            for offset in range(0, rows, batch_size):
+                amounts = [Decimal(rnd.randint(100, 10_000_000)) / 100 for _ in range(min(batch_size, rows - offset))]
+                model.objects.bulk_create([
+                    model(
+                        name='Операция', amount=amount, amount_base=amount, currency=currency,
+                        date=start + timedelta(days=rnd.randint(0, 3650)),
+                        recurrence_type='monthly', owner=user, scope_key=scope_key,
+                    )
+                    for amount in amounts
+                ])
+        # Оплата у каждого второго расхода
+        expense_ids = Expense.objects.filter(scope_key=scope_key).values_list('id', flat=True)[:rows:2]
+        ExpensePayment.objects.bulk_create(
+            [ExpensePayment(expense_id=pk, amount=Decimal('10.00')) for pk in expense_ids], batch_size=batch_size
+        )
+        return user
+
+    def compare(self, user, rows, repeat):
+        scope_key = make_scope_key(owner_id=user.pk)
+        expenses = Expense.objects.filter(scope_key=scope_key).order_by('-date', '-id')
+        cases = [
+            ('доходы', IncomeSerializer, Income.objects.filter(scope_key=scope_key).order_by('-date', '-id')),
+            ('расходы с оплатами', ExpenseSerializer, expenses.prefetch_related(
+                models.Prefetch('payments', queryset=ExpensePayment.objects.order_by('pk'))
+            )),
+            ('расходы со сводкой оплат', ExpenseSummarySerializer, expenses.with_payment_summary()),
+        ]
+        renderer = JSONRenderer()
+        for title, serializer_class, queryset in cases:
+            queryset = queryset[:rows]
+            plan = get_values_plan(serializer_class, queryset)
+            if plan is None:
+                raise CommandError(f'{serializer_class.__name__} не сводится к плану .values()')
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n{title}: {rows} строк'))
+            results = {}
+            for label, render in [
+                ('ModelSerializer', lambda: renderer.render(serializer_class(queryset.all(), many=True).data)),
+                ('.values() + план', lambda: renderer.render(plan.render(plan.values(queryset)))),
+            ]:
+                timings = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    results[label] = render()
+                    timings.append((time.perf_counter() - started) * 1000)
+                results[label, 'median'] = statistics.median(timings)
+                self.stdout.write(f'{label}: медиана {results[label, "median"]:.0f} мс')
+            if results['ModelSerializer'] != results['.values() + план']:
+                raise CommandError('Ответы быстрого чтения и ModelSerializer различаются')
+            self.stdout.write(self.style.SUCCESS(
+                f'ответы совпадают ({len(results["ModelSerializer"])} байт), ускорение '
+                f'{results["ModelSerializer", "median"] / results[".values() + план", "median"]:.1f}x'
+            ))
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from finance.importer import ENCODINGS, FORMATS, OperationImporter, guess_format, iter_rows
+from finance.models import Expense, FinanceLog, Income
+from users.models import User
+
+MODELS = {'expense': Expense, 'income': Income}
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортировать расходы или доходы пользователя из CSV или JSON-строк. '
+        'Файл читается построчно, записи вставляются пачками; ошибочные строки выводятся и пропускаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу')
+        parser.add_argument('--model', choices=sorted(MODELS), default='expense')
+        parser.add_argument('--user', required=True, help='Имя пользователя или id')
+        parser.add_argument('--family', type=int, help='Импортировать как семейные записи семьи')
+        parser.add_argument('--format', choices=FORMATS, help='По умолчанию по расширению файла')
+        parser.add_argument('--encoding', choices=ENCODINGS, help='По умолчанию по началу файла')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true', help='Только проверить строки')
+
+    def handle(self, *args, **options):
+        lookup = {'pk': options['user']} if options['user'].isdigit() else {'username': options['user']}
+        user = User.objects.filter(**lookup).first()
+        if user is None:
+            raise CommandError(f"Пользователь не найден: {options['user']}")
+        try:
+            importer = OperationImporter(
+                MODELS[options['model']], user, options['family'],
+                chunk_size=options['chunk_size'], dry_run=options['dry_run']
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        fmt = options['format'] or guess_format(options['path'])
+        try:
+            with open(options['path'], 'rb') as stream, transaction.atomic():
+                created, errors = importer.run(iter_rows(stream, fmt, options['encoding']))
+                if created and not options['dry_run']:
+                    FinanceLog.objects.create(
+                        entity_type=importer.model.__name__, entity_id=0, action='import', user=user,
+                        data_after={'file': options['path'], 'created': created, 'errors': len(errors),
+                                    'scope_key': importer.scope_key}
+                    )
+        except UnicodeDecodeError:
+            raise CommandError('Не удалось прочитать файл: неверная кодировка, укажите --encoding')
+
+        for error in errors:
+            self.stderr.write(f"Строка {error['row']}: " + '; '.join(
+                f'{field}: {message}' for field, message in error['errors'].items()
+            ))
+        verb = 'Проверено' if options['dry_run'] else 'Импортировано'
+        self.stdout.write(self.style.SUCCESS(f'{verb} записей: {created}, ошибок: {len(errors)}'))
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from finance.importer import ENCODINGS
+from finance.models import Expense, FinanceLog, Income
+from finance.statements import CSV_PROFILES, STATEMENT_FORMATS, StatementImporter, guess_statement_format, parse_statement
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортировать банковскую выписку (OFX, QIF, CSV-профиль) пользователя. '
+        'Операции, уже загруженные ранее (по отпечатку), пропускаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу выписки')
+        parser.add_argument('--user', required=True, help='Имя пользователя или id')
+        parser.add_argument('--family', type=int, help='Импортировать как семейные записи семьи')
+        parser.add_argument('--format', choices=STATEMENT_FORMATS, help='По умолчанию по расширению файла')
+        parser.add_argument('--profile', choices=sorted(CSV_PROFILES), default='generic', help='Профиль CSV-выписки')
+        parser.add_argument('--currency', help='Код валюты для операций без валюты')
+        parser.add_argument('--encoding', choices=ENCODINGS, help='По умолчанию по началу файла')
+        parser.add_argument('--dry-run', action='store_true', help='Только проверить операции')
+
+    def handle(self, *args, **options):
+        lookup = {'pk': options['user']} if options['user'].isdigit() else {'username': options['user']}
+        user = User.objects.filter(**lookup).first()
+        if user is None:
+            raise CommandError(f"Пользователь не найден: {options['user']}")
+        try:
+            importer = StatementImporter(user, options['family'], options['currency'], dry_run=options['dry_run'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        fmt = options['format'] or guess_statement_format(options['path'])
+        try:
+            with open(options['path'], 'rb') as stream, transaction.atomic():
+                result = importer.run(parse_statement(stream, fmt, options['profile'], options['encoding']))
+                for model, key in ((Expense, 'expenses'), (Income, 'incomes')):
+                    if result[key]['created'] and not options['dry_run']:
+                        FinanceLog.objects.create(
+                            entity_type=model.__name__, entity_id=0, action='import_statement', user=user,
+                            data_after={'file': options['path'], 'format': fmt, **result[key]}
+                        )
+        except UnicodeDecodeError:
+            raise CommandError('Не удалось прочитать файл: неверная кодировка, укажите --encoding')
+
+        for error in result['errors']:
+            self.stderr.write(f"Операция {error['row']}: " + '; '.join(
+                f'{field}: {message}' for field, message in error['errors'].items()
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f"Расходов: {result['expenses']['created']} (пропущено {result['expenses']['skipped']}), "
+            f"доходов: {result['incomes']['created']} (пропущено {result['incomes']['skipped']}), "
+            f"ошибок: {len(result['errors'])}"
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from finance.networth import rebuild_net_worth_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитать снимки чистого капитала с нуля по текущим активам, фондам и пассивам. '
+        'По умолчанию история удаляется; с --keep-history заменяются только сегодняшние снимки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-history', action='store_true', help='Сохранить снимки за прошлые даты')
+
+    def handle(self, *args, **options):
+        count = rebuild_net_worth_snapshots(keep_history=options['keep_history'])
+        self.stdout.write(self.style.SUCCESS(f'Записано снимков: {count}'))
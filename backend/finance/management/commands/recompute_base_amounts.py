@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from finance.currency import invalidate_base_currency, recompute_base_amounts
+from finance.models import Currency
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитать суммы в базовой валюте (amount_base) доходов, расходов, платежей '
+        'и истории стоимости активов по курсам на дату операции. Нужен после смены '
+        'BASE_CURRENCY_CODE или загрузки курсов в обход моделей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--currency', action='append', help='Код валюты (можно несколько), по умолчанию все')
+
+    def handle(self, *args, **options):
+        invalidate_base_currency()
+        currencies = Currency.objects.all()
+        if options['currency']:
+            currencies = currencies.filter(code__in=options['currency'])
+        updated = 0
+        with transaction.atomic():
+            for currency_id in currencies.values_list('id', flat=True):
+                updated += recompute_base_amounts(currency_id)
+        self.stdout.write(self.style.SUCCESS(f'Обновлено строк: {updated}'))
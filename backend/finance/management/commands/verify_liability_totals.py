@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from django.utils import timezone
+
+from finance.models import Liability
+
+# Сохранённый итог -> аннотация with_payment_totals
+TOTALS = {
+    'paid_total': 'payments_total',
+    'paid_principal': 'principal_paid_total',
+    'paid_interest': 'interest_paid_total',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверить сохранённые итоги платежей пассивов (paid_total, paid_principal, paid_interest) '
+        'с агрегатами по платежам. Пассивы проверяются пачками; с --fix расхождения исправляются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--fix', action='store_true', help='Исправить расхождения')
+
+    def handle(self, *args, **options):
+        checked = mismatched = 0
+        last_id = 0
+        while True:
+            batch = list(
+                Liability.objects.filter(id__gt=last_id).order_by('id').with_payment_totals().values(
+                    'id', *TOTALS, *TOTALS.values()
+                )[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_id = batch[-1]['id']
+            checked += len(batch)
+            for row in batch:
+                diff = {stored: row[actual] - row[stored] for stored, actual in TOTALS.items() if row[stored] != row[actual]}
+                if not diff:
+                    continue
+                mismatched += 1
+                self.stdout.write(self.style.WARNING(
+                    f"Пассив {row['id']}: " + ', '.join(f'{name} {row[name]} != {row[TOTALS[name]]}' for name in diff)
+                ))
+                if options['fix']:
+                    self.fix(row['id'], diff)
+        self.stdout.write(self.style.SUCCESS(f'Проверено пассивов: {checked}, расхождений: {mismatched}'))
+
+    def fix(self, liability_id, diff):
+        # Поправка разницей, а не записью агрегата — не затирает платёж, сохранённый параллельно
+        Liability.objects.filter(pk=liability_id).update(
+            updated_at=timezone.now(), **{name: F(name) + delta for name, delta in diff.items()}
+        )
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.23 on 2026-10-16 23:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0004_expense_recurrence_type_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['date', 'id'], name='expenses_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(fields=['date', 'id'], name='incomes_date_id_idx'),
+        ),
+    ]
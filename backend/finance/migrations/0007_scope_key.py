@@ -0,0 +1,61 @@
+# Generated by Django 4.2.23 on 2026-10-16 23:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0005_income_expense_date_id_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='scope_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=32, verbose_name='Область видимости'),
+        ),
+        migrations.AddField(
+            model_name='budgetplan',
+            name='scope_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=32, verbose_name='Область видимости'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='scope_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=32, verbose_name='Область видимости'),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='scope_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32, verbose_name='Область видимости'),
+        ),
+        migrations.AddField(
+            model_name='financialgoal',
+            name='scope_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=32, verbose_name='Область видимости'),
+        ),
+        migrations.AddField(
+            model_name='fund',
+            name='scope_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=32, verbose_name='Область видимости'),
+        ),
+        migrations.AddField(
+            model_name='income',
+            name='scope_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32, verbose_name='Область видимости'),
+        ),
+        migrations.AddField(
+            model_name='liability',
+            name='scope_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=32, verbose_name='Область видимости'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['scope_key', 'date'], name='expenses_scope_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(fields=['scope_key', 'date'], name='incomes_scope_date_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+from django.db.models.functions import Cast, Concat
+
+SCOPED_MODELS = ['Category', 'Asset', 'Fund', 'Liability', 'Income', 'Expense', 'FinancialGoal', 'BudgetPlan']
+
+
+def backfill_scope_key(apps, schema_editor):
+    """Заполнить scope_key существующих записей (по два UPDATE на таблицу)"""
+    for model_name in SCOPED_MODELS:
+        model = apps.get_model('finance', model_name)
+        model.objects.filter(is_family=True, family__isnull=False).update(
+            scope_key=Concat(models.Value('f:'), Cast('family_id', models.CharField()))
+        )
+        model.objects.exclude(is_family=True, family__isnull=False).filter(owner__isnull=False).update(
+            scope_key=Concat(models.Value('u:'), Cast('owner_id', models.CharField()))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0007_scope_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_scope_key, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.23 on 2026-10-17 00:02
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0008_backfill_scope_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NetWorthSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope_key', models.CharField(max_length=32, verbose_name='Область видимости')),
+                ('currency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='net_worth_snapshots', to='finance.currency')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('total_assets', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=20, verbose_name='Активы')),
+                ('total_funds', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=20, verbose_name='Фонды')),
+                ('total_liabilities', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=20, verbose_name='Пассивы')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Снимок чистого капитала',
+                'verbose_name_plural': 'Снимки чистого капитала',
+                'db_table': 'net_worth_snapshots',
+                'unique_together': {('scope_key', 'currency', 'date')},
+            },
+        ),
+    ]
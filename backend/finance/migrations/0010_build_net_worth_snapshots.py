@@ -0,0 +1,45 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Sum
+from django.utils import timezone
+
+SOURCES = [
+    ('Asset', 'current_value', 'current_currency_id', 'total_assets'),
+    ('Fund', 'current_value', 'currency_id', 'total_funds'),
+    ('Liability', 'current_debt', 'currency_id', 'total_liabilities'),
+]
+
+
+def build_snapshots(apps, schema_editor):
+    """Начальные снимки чистого капитала по текущим данным (GROUP BY scope_key, валюта)"""
+    snapshot_model = apps.get_model('finance', 'NetWorthSnapshot')
+    totals = defaultdict(dict)
+    for model_name, value_field, currency_field, total_field in SOURCES:
+        model = apps.get_model('finance', model_name)
+        rows = model.objects.exclude(scope_key='').values_list('scope_key', currency_field).annotate(
+            total=Sum(value_field)
+        )
+        for scope_key, currency_id, total in rows:
+            totals[scope_key, currency_id][total_field] = total or Decimal('0.00')
+    today = timezone.localdate()
+    snapshot_model.objects.bulk_create([
+        snapshot_model(scope_key=scope_key, currency_id=currency_id, date=today, **values)
+        for (scope_key, currency_id), values in totals.items()
+    ], batch_size=1000)
+
+
+def remove_snapshots(apps, schema_editor):
+    apps.get_model('finance', 'NetWorthSnapshot').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0009_net_worth_snapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_snapshots, remove_snapshots),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.23 on 2026-10-17 00:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0010_build_net_worth_snapshots'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='expense',
+            name='expenses_scope_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='income',
+            name='incomes_scope_date_idx',
+        ),
+        migrations.AddField(
+            model_name='assetvaluehistory',
+            name='amount_base',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=20, null=True, verbose_name='Сумма в базовой валюте'),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='amount_base',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=20, null=True, verbose_name='Сумма в базовой валюте'),
+        ),
+        migrations.AddField(
+            model_name='income',
+            name='amount_base',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=20, null=True, verbose_name='Сумма в базовой валюте'),
+        ),
+        migrations.AddField(
+            model_name='liabilitypayment',
+            name='amount_base',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=20, null=True, verbose_name='Сумма в базовой валюте'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['scope_key', 'date'], include=('amount_base',), name='expenses_scope_date_base_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(fields=['scope_key', 'date'], include=('amount_base',), name='incomes_scope_date_base_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Round
+
+# (модель, поле суммы, путь к валюте)
+SOURCES = [
+    ('Income', 'amount', 'currency_id'),
+    ('Expense', 'amount', 'currency_id'),
+    ('LiabilityPayment', 'amount', 'liability__currency_id'),
+    ('AssetValueHistory', 'value', 'currency_id'),
+]
+
+
+def backfill_amount_base(apps, schema_editor):
+    """Суммы в базовой валюте по курсу на дату: по одному UPDATE на валюту и таблицу"""
+    currency_model = apps.get_model('finance', 'Currency')
+    rate_model = apps.get_model('finance', 'CurrencyRate')
+    base_id = currency_model.objects.filter(
+        code=getattr(settings, 'BASE_CURRENCY_CODE', 'RUB'), is_default=True
+    ).order_by('id').values_list('id', flat=True).first()
+    if base_id is None:
+        return
+    for currency_id in currency_model.objects.values_list('id', flat=True):
+        for model_name, amount_field, currency_path in SOURCES:
+            rows = apps.get_model('finance', model_name).objects.filter(**{currency_path: currency_id})
+            if currency_id == base_id:
+                rows.update(amount_base=F(amount_field))
+                continue
+            rate = rate_model.objects.filter(
+                currency_id=currency_id, date__lte=OuterRef('date')
+            ).order_by('-date').values('rate_to_base')[:1]
+            rows.update(amount_base=Round(F(amount_field) * Subquery(rate), 2))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0012_amount_base'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_amount_base, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.23 on 2026-10-17 00:16
+
+from django.db import migrations, models
+
+# Ключевые слова свободного текста periodicity -> recurrence_type
+PERIODICITY_KEYWORDS = [
+    ('weekly', ('недел', 'week')),
+    ('monthly', ('месяч', 'месяц', 'month')),
+    ('quarterly', ('квартал', 'quarter')),
+    ('yearly', ('год', 'year', 'annual')),
+]
+
+
+def parse_periodicity(apps, schema_editor):
+    """Разобрать существующий текст periodicity в recurrence_type"""
+    income_model = apps.get_model('finance', 'Income')
+    for recurrence_type, keywords in PERIODICITY_KEYWORDS:
+        condition = models.Q()
+        for keyword in keywords:
+            condition |= models.Q(periodicity__icontains=keyword)
+        income_model.objects.filter(condition, recurrence_type='none').update(recurrence_type=recurrence_type)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0013_backfill_amount_base'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='income',
+            name='recurrence_type',
+            field=models.CharField(choices=[('none', 'Разовый'), ('weekly', 'Еженедельно'), ('monthly', 'Ежемесячно'), ('quarterly', 'Ежеквартально'), ('yearly', 'Ежегодно')], default='none', help_text='Структурированная периодичность дохода (повторы до end_date)', max_length=20, verbose_name='Повторение'),
+        ),
+        migrations.RunPython(parse_periodicity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.23 on 2026-10-17 00:23
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_payment_totals(apps, schema_editor):
+    """Итоги платежей по пассивам одним UPDATE с подзапросами"""
+    liability_model = apps.get_model('finance', 'Liability')
+    payment_model = apps.get_model('finance', 'LiabilityPayment')
+
+    def payments_sum(field):
+        totals = payment_model.objects.filter(liability=OuterRef('pk')).order_by().values('liability').annotate(
+            total=Sum(field)
+        ).values('total')
+        return Coalesce(Subquery(totals), Decimal('0.00'), output_field=models.DecimalField(max_digits=20, decimal_places=2))
+
+    liability_model.objects.update(
+        paid_total=payments_sum('amount'),
+        paid_principal=payments_sum('principal'),
+        paid_interest=payments_sum('interest'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0014_income_recurrence_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='liability',
+            name='paid_interest',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=20, verbose_name='Выплачено процентов'),
+        ),
+        migrations.AddField(
+            model_name='liability',
+            name='paid_principal',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=20, verbose_name='Выплачено основного долга'),
+        ),
+        migrations.AddField(
+            model_name='liability',
+            name='paid_total',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=20, verbose_name='Всего выплачено'),
+        ),
+        migrations.RunPython(backfill_payment_totals, migrations.RunPython.noop),
+    ]
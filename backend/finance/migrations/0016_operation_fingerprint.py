@@ -0,0 +1,31 @@
+# Generated by Django 4.2.23 on 2026-10-17 00:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0015_liability_payment_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64, verbose_name='Отпечаток операции выписки'),
+        ),
+        migrations.AddField(
+            model_name='income',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64, verbose_name='Отпечаток операции выписки'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(condition=models.Q(('fingerprint', ''), _negated=True), fields=['scope_key', 'fingerprint'], name='expenses_scope_fingerprint_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(condition=models.Q(('fingerprint', ''), _negated=True), fields=['scope_key', 'fingerprint'], name='incomes_scope_fingerprint_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.23 on 2026-10-17 00:43
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0016_operation_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='financelog',
+            name='date',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата операции'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.23 on 2026-10-17 00:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0017_financelog_date_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='financelog',
+            name='changes',
+            field=models.JSONField(blank=True, null=True, verbose_name='Изменения'),
+        ),
+        migrations.AddField(
+            model_name='financelog',
+            name='snapshot',
+            field=models.BinaryField(blank=True, null=True, verbose_name='Снимок'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.23 on 2026-10-17 00:48
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+# Тип сущности в журнале -> модель с scope_key
+SCOPED_MODELS = ('Category', 'Asset', 'Fund', 'Liability', 'Income', 'Expense')
+
+
+def backfill_scope_key(apps, schema_editor):
+    """Область записей по текущей области объекта: один UPDATE на модель (удалённые остаются без области)"""
+    log_model = apps.get_model('finance', 'FinanceLog')
+    for name in SCOPED_MODELS:
+        model = apps.get_model('finance', name)
+        scope = model.objects.filter(pk=OuterRef('entity_id')).values('scope_key')[:1]
+        log_model.objects.filter(entity_type=name, scope_key='').update(
+            scope_key=Coalesce(Subquery(scope), Value(''))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0018_financelog_changes_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='financelog',
+            name='scope_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32, verbose_name='Область видимости'),
+        ),
+        migrations.AddIndex(
+            model_name='financelog',
+            index=models.Index(fields=['entity_type', 'entity_id', 'date'], name='finance_logs_entity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='financelog',
+            index=models.Index(fields=['user', 'date'], name='finance_logs_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='financelog',
+            index=models.Index(fields=['scope_key', 'date'], name='finance_logs_scope_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='financelog',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['changes'], name='finance_logs_changes_gin'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.23 on 2026-10-17 00:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0019_financelog_history_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expensepayment',
+            index=models.Index(fields=['expense', 'paid_date'], name='expense_payments_date_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.23 on 2026-10-17 01:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0020_expense_payments_date_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='asset',
+            index=models.Index(fields=['scope_key', 'updated_at'], name='assets_scope_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['scope_key', 'updated_at'], name='categories_scope_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['scope_key', 'updated_at'], name='expenses_scope_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fund',
+            index=models.Index(fields=['scope_key', 'updated_at'], name='funds_scope_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(fields=['scope_key', 'updated_at'], name='incomes_scope_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='liability',
+            index=models.Index(fields=['scope_key', 'updated_at'], name='liabilities_scope_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.23 on 2026-10-17 02:00
+
+from django.db import migrations, models
+import finance.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0021_scope_updated_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assettype',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='currency',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='liabilitytype',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterField(
+            model_name='asset',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=finance.models.SET_NULL_TOUCH, related_name='assets', to='finance.category'),
+        ),
+        migrations.AlterField(
+            model_name='expense',
+            name='asset',
+            field=models.ForeignKey(blank=True, null=True, on_delete=finance.models.SET_NULL_TOUCH, related_name='expenses', to='finance.asset'),
+        ),
+        migrations.AlterField(
+            model_name='expense',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=finance.models.SET_NULL_TOUCH, related_name='expenses', to='finance.category'),
+        ),
+        migrations.AlterField(
+            model_name='expense',
+            name='liability',
+            field=models.ForeignKey(blank=True, null=True, on_delete=finance.models.SET_NULL_TOUCH, related_name='expenses', to='finance.liability'),
+        ),
+        migrations.AlterField(
+            model_name='income',
+            name='asset',
+            field=models.ForeignKey(blank=True, null=True, on_delete=finance.models.SET_NULL_TOUCH, related_name='incomes', to='finance.asset'),
+        ),
+        migrations.AlterField(
+            model_name='income',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=finance.models.SET_NULL_TOUCH, related_name='incomes', to='finance.category'),
+        ),
+    ]
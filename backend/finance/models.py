@@ -1,11 +1,123 @@
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 from users.models import User
 from nucfamily.models import NuclearFamily
 from decimal import Decimal
-from django.db.models import Sum
+from django.db.models import Case, Exists, F, Max, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+from common.access import make_scope_key
 
-class Category(models.Model):
+
+def SET_NULL_TOUCH(collector, field, sub_objs, using):
+    """
+    SET_NULL, который сдвигает и updated_at ссылавшихся строк: их ответ
+    меняется, и валидаторы условного GET (common.conditional) должны смениться
+    """
+    collector.add_field_update(field, None, sub_objs)
+    collector.add_field_update(field.model._meta.get_field('updated_at'), timezone.now(), sub_objs)
+
+class ScopeKeyMixin:
+    """
+    Поддержка денормализованного ключа области видимости (scope_key):
+    'u:<owner_id>' для личных объектов и 'f:<family_id>' для семейных.
+    Выборка «всё видимое в области» сводится к равенству или IN по индексу.
+    """
+    def refresh_scope_key(self):
+        self.scope_key = make_scope_key(self.owner_id, self.family_id, self.is_family)
+
+    def save(self, *args, **kwargs):
+        self.refresh_scope_key()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'scope_key' not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['scope_key']
+        super().save(*args, **kwargs)
+
+class BaseAmountMixin:
+    """
+    Сумма в базовой валюте по курсу на дату операции (поле amount_base).
+    Считается при сохранении; при изменении курсов пересчитывается
+    массово (finance.currency.recompute_base_amounts). None, если курса нет
+    """
+    amount_field = 'amount'
+    # Путь к валюте суммы для фильтров массового пересчёта
+    amount_currency_path = 'currency_id'
+
+    def get_amount_currency_id(self):
+        return self.currency_id
+
+    def refresh_amount_base(self):
+        from .currency import converter, get_base_currency_id
+        amount = getattr(self, self.amount_field)
+        base_id = get_base_currency_id()
+        if amount is None or base_id is None:
+            self.amount_base = None
+            return
+        on = self._meta.get_field('date').to_python(self.date)
+        self.amount_base = converter.convert(amount, self.get_amount_currency_id(), base_id, on)
+
+    def save(self, *args, **kwargs):
+        self.refresh_amount_base()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'amount_base' not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['amount_base']
+        super().save(*args, **kwargs)
+
+class LoadedValuesMixin:
+    """
+    Запоминает значения полей tracked_fields в момент загрузки из БД,
+    чтобы при сохранении считать изменения без повторного запроса
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        instance._loaded_values = {name: loaded[name] for name in cls.tracked_fields if name in loaded}
+        return instance
+
+    def get_loaded_values(self):
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is not None and len(loaded) == len(self.tracked_fields):
+            return loaded
+        return None
+
+    def remember_loaded_values(self):
+        self._loaded_values = {name: getattr(self, name) for name in self.tracked_fields}
+
+class NetWorthMixin(LoadedValuesMixin):
+    """
+    Объект, входящий в чистый капитал: net_worth_field — сумма (или своя
+    get_net_worth_amount/get_net_worth_expression), net_worth_currency_field —
+    её валюта, net_worth_total — поле снимка NetWorthSnapshot, куда она идёт
+    """
+    net_worth_field = None
+    net_worth_currency_field = 'currency_id'
+    net_worth_total = None
+
+    @classmethod
+    def get_net_worth_expression(cls):
+        """Сумма объекта выражением — для агрегатов по строкам"""
+        return F(cls.net_worth_field)
+
+    def get_net_worth_amount(self, values):
+        """Сумма объекта по значениям полей tracked_fields"""
+        return values[self.net_worth_field] or Decimal('0.00')
+
+    def get_net_worth_state(self):
+        """(scope_key, валюта, сумма) текущего состояния объекта"""
+        values = {name: getattr(self, name) for name in self.tracked_fields}
+        return values['scope_key'], values[self.net_worth_currency_field], self.get_net_worth_amount(values)
+
+    def get_loaded_net_worth_state(self):
+        """(scope_key, валюта, сумма) на момент загрузки из БД, None если неизвестно"""
+        loaded = self.get_loaded_values()
+        if loaded is None:
+            return None
+        return loaded['scope_key'], loaded[self.net_worth_currency_field], self.get_net_worth_amount(loaded)
+
+class Category(ScopeKeyMixin, models.Model):
     """
     Категория для активов, доходов, расходов (иерархия, индивидуальные/семейные)
     """
@@ -14,6 +126,7 @@ class Category(models.Model):
     owner = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='categories')
     family = models.ForeignKey(NuclearFamily, null=True, blank=True, on_delete=models.SET_NULL, related_name='categories')
     is_family = models.BooleanField('Семейная категория', default=False)
+    scope_key = models.CharField('Область видимости', max_length=32, blank=True, default='', editable=False, db_index=True)
     type = models.CharField('Тип', max_length=20, choices=[('asset', 'Актив'), ('income', 'Доход'), ('expense', 'Расход')])
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -22,6 +135,10 @@ class Category(models.Model):
         verbose_name = 'Категория'
         verbose_name_plural = 'Категории'
         db_table = 'categories'
+        indexes = [
+            # Валидаторы условного GET (max(updated_at), count по области) — только из индекса
+            models.Index(fields=['scope_key', 'updated_at'], name='categories_scope_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -35,6 +152,7 @@ class Currency(models.Model):
     symbol = models.CharField('Символ', max_length=10, blank=True)
     owner = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='currencies')
     is_default = models.BooleanField('Встроенная валюта', default=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = 'Валюта'
@@ -45,10 +163,12 @@ class Currency(models.Model):
     def __str__(self):
         return f"{self.code} ({self.name})"
 
-class CurrencyRate(models.Model):
+class CurrencyRate(LoadedValuesMixin, models.Model):
     """
     История курсов валют
     """
+    tracked_fields = ('currency_id', 'date')
+
     currency = models.ForeignKey(Currency, on_delete=models.CASCADE, related_name='rates')
     date = models.DateField()
     rate_to_base = models.DecimalField('Курс к базовой валюте', max_digits=20, decimal_places=8)
@@ -69,6 +189,7 @@ class AssetType(models.Model):
     name = models.CharField('Название типа', max_length=50, unique=True)
     is_base = models.BooleanField('Базовый тип', default=False)
     family = models.ForeignKey(NuclearFamily, null=True, blank=True, on_delete=models.SET_NULL, related_name='asset_types')
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = 'Тип актива'
@@ -78,13 +199,18 @@ class AssetType(models.Model):
     def __str__(self):
         return self.name
 
-class Asset(models.Model):
+class Asset(NetWorthMixin, ScopeKeyMixin, models.Model):
     """
     Актив (основная сущность)
     """
+    tracked_fields = ('scope_key', 'current_value', 'current_currency_id')
+    net_worth_field = 'current_value'
+    net_worth_currency_field = 'current_currency_id'
+    net_worth_total = 'total_assets'
+
     name = models.CharField('Наименование', max_length=150)
     type = models.ForeignKey(AssetType, on_delete=models.PROTECT, related_name='assets')
-    category = models.ForeignKey(Category, null=True, blank=True, on_delete=models.SET_NULL, related_name='assets')
+    category = models.ForeignKey(Category, null=True, blank=True, on_delete=SET_NULL_TOUCH, related_name='assets')
     purchase_value = models.DecimalField('Стоимость покупки', max_digits=20, decimal_places=2)
     purchase_currency = models.ForeignKey(Currency, on_delete=models.PROTECT, related_name='assets_purchase')
     current_value = models.DecimalField('Текущая стоимость', max_digits=20, decimal_places=2)
@@ -93,6 +219,7 @@ class Asset(models.Model):
     owner = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='assets')
     family = models.ForeignKey(NuclearFamily, null=True, blank=True, on_delete=models.SET_NULL, related_name='assets')
     is_family = models.BooleanField('Семейный актив', default=False)
+    scope_key = models.CharField('Область видимости', max_length=32, blank=True, default='', editable=False, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -100,6 +227,10 @@ class Asset(models.Model):
         verbose_name = 'Актив'
         verbose_name_plural = 'Активы'
         db_table = 'assets'
+        indexes = [
+            # Валидаторы условного GET (max(updated_at), count по области) — только из индекса
+            models.Index(fields=['scope_key', 'updated_at'], name='assets_scope_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -122,14 +253,17 @@ class Asset(models.Model):
         """Получить чистый доход по активу"""
         return self.get_total_income() - self.get_total_expenses()
 
-class AssetValueHistory(models.Model):
+class AssetValueHistory(BaseAmountMixin, models.Model):
     """
     История изменения стоимости актива
     """
+    amount_field = 'value'
+
     asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='value_history')
     value = models.DecimalField('Оценочная стоимость', max_digits=20, decimal_places=2)
     currency = models.ForeignKey(Currency, on_delete=models.PROTECT)
     date = models.DateField('Дата оценки')
+    amount_base = models.DecimalField('Сумма в базовой валюте', max_digits=20, decimal_places=2, null=True, blank=True, editable=False)
 
     class Meta:
         verbose_name = 'История стоимости актива'
@@ -159,10 +293,14 @@ class AssetShare(models.Model):
     def __str__(self):
         return f"{self.asset.name}: {self.share} ({self.user or self.family})"
 
-class Fund(models.Model):
+class Fund(NetWorthMixin, ScopeKeyMixin, models.Model):
     """
     Фонд (отдельная сущность, но учитывается как денежный актив)
     """
+    tracked_fields = ('scope_key', 'current_value', 'currency_id')
+    net_worth_field = 'current_value'
+    net_worth_total = 'total_funds'
+
     name = models.CharField('Название фонда', max_length=150)
     goal = models.DecimalField('Цель накопления', max_digits=20, decimal_places=2)
     target_date = models.DateField('Целевая дата', null=True, blank=True)
@@ -171,6 +309,7 @@ class Fund(models.Model):
     owner = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='funds')
     family = models.ForeignKey(NuclearFamily, null=True, blank=True, on_delete=models.SET_NULL, related_name='funds')
     is_family = models.BooleanField('Семейный фонд', default=False)
+    scope_key = models.CharField('Область видимости', max_length=32, blank=True, default='', editable=False, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -178,6 +317,10 @@ class Fund(models.Model):
         verbose_name = 'Фонд'
         verbose_name_plural = 'Фонды'
         db_table = 'funds'
+        indexes = [
+            # Валидаторы условного GET (max(updated_at), count по области) — только из индекса
+            models.Index(fields=['scope_key', 'updated_at'], name='funds_scope_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -215,6 +358,7 @@ class LiabilityType(models.Model):
     name = models.CharField('Название типа', max_length=50, unique=True)
     is_base = models.BooleanField('Базовый тип', default=False)
     family = models.ForeignKey(NuclearFamily, null=True, blank=True, on_delete=models.SET_NULL, related_name='liability_types')
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = 'Тип пассива'
@@ -224,10 +368,47 @@ class LiabilityType(models.Model):
     def __str__(self):
         return self.name
 
-class Liability(models.Model):
+class LiabilityQuerySet(models.QuerySet):
+    def with_payment_totals(self):
+        """
+        Аннотировать суммы платежей агрегатами по LiabilityPayment.
+        Обычно достаточно сохранённых итогов (paid_total и др.), агрегаты
+        нужны для их проверки
+        """
+        def payments_sum(field):
+            totals = LiabilityPayment.objects.filter(liability=OuterRef('pk')).order_by().values('liability').annotate(
+                total=Sum(field)
+            ).values('total')
+            return Coalesce(
+                Subquery(totals, output_field=models.DecimalField(max_digits=20, decimal_places=2)),
+                Decimal('0.00'),
+                output_field=models.DecimalField(max_digits=20, decimal_places=2)
+            )
+
+        return self.annotate(
+            payments_total=payments_sum('amount'),
+            principal_paid_total=payments_sum('principal'),
+            interest_paid_total=payments_sum('interest'),
+        )
+
+    def with_unlinked_expenses(self):
+        """Аннотировать флаг непривязанных расходов подзапросом"""
+        unlinked_expenses = Expense.objects.filter(liability=OuterRef('pk')).exclude(
+            Exists(LiabilityPayment.objects.filter(liability=OuterRef('liability'), date=OuterRef('date')))
+        )
+        return self.annotate(unlinked_expenses_exist=Exists(unlinked_expenses))
+
+class Liability(NetWorthMixin, ScopeKeyMixin, models.Model):
     """
     Пассив/обязательство (кредит, займ)
     """
+    tracked_fields = ('scope_key', 'current_debt', 'currency_id')
+    # В чистый капитал идёт задолженность: её вводит пользователь, платежи уменьшают на основной долг
+    net_worth_field = 'current_debt'
+    net_worth_total = 'total_liabilities'
+    # Итоги платежей меняются только атомарными UPDATE при сохранении платежей
+    payment_total_fields = ('paid_total', 'paid_principal', 'paid_interest')
+
     name = models.CharField('Наименование', max_length=150)
     type = models.ForeignKey(LiabilityType, on_delete=models.PROTECT, related_name='liabilities')
     initial_amount = models.DecimalField('Первоначальная сумма', max_digits=20, decimal_places=2)
@@ -238,49 +419,84 @@ class Liability(models.Model):
     payment_type = models.CharField('Способ погашения', max_length=20, choices=[('annuity', 'Аннуитетный'), ('diff', 'Дифференцированный')], null=True, blank=True)
     payment_date = models.DateField('Дата платежа', null=True, blank=True)
     current_debt = models.DecimalField('Задолженность на сегодня', max_digits=20, decimal_places=2)
+    paid_total = models.DecimalField('Всего выплачено', max_digits=20, decimal_places=2, default=Decimal('0.00'), editable=False)
+    paid_principal = models.DecimalField('Выплачено основного долга', max_digits=20, decimal_places=2, default=Decimal('0.00'), editable=False)
+    paid_interest = models.DecimalField('Выплачено процентов', max_digits=20, decimal_places=2, default=Decimal('0.00'), editable=False)
     owner = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='liabilities')
     family = models.ForeignKey(NuclearFamily, null=True, blank=True, on_delete=models.SET_NULL, related_name='liabilities')
     is_family = models.BooleanField('Семейный пассив', default=False)
+    scope_key = models.CharField('Область видимости', max_length=32, blank=True, default='', editable=False, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = LiabilityQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Пассив/Обязательство'
         verbose_name_plural = 'Пассивы/Обязательства'
         db_table = 'liabilities'
+        indexes = [
+            # Валидаторы условного GET (max(updated_at), count по области) — только из индекса
+            models.Index(fields=['scope_key', 'updated_at'], name='liabilities_scope_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # Не перезаписывать итоги платежей устаревшими значениями из памяти
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.payment_total_fields
+            ]
+        super().save(*args, **kwargs)
+
     def get_total_payments(self):
         """Получить общую сумму платежей по пассиву"""
-        return self.payments.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+        if hasattr(self, 'payments_total'):
+            return self.payments_total
+        return self.paid_total
 
     def get_total_principal_paid(self):
         """Получить общую сумму погашенного основного долга"""
-        return self.payments.aggregate(total=Sum('principal'))['total'] or Decimal('0.00')
+        if hasattr(self, 'principal_paid_total'):
+            return self.principal_paid_total
+        return self.paid_principal
 
     def get_total_interest_paid(self):
         """Получить общую сумму выплаченных процентов"""
-        return self.payments.aggregate(total=Sum('interest'))['total'] or Decimal('0.00')
+        if hasattr(self, 'interest_paid_total'):
+            return self.interest_paid_total
+        return self.paid_interest
 
     def get_remaining_principal(self):
         """Получить оставшуюся сумму основного долга"""
         return max(Decimal('0.00'), self.initial_amount - self.get_total_principal_paid())
 
     def has_unlinked_expenses(self):
-        """Проверить наличие расходов, не привязанных к платежам по пассиву"""
-        return self.expenses.filter(liability_payment__isnull=True).exists()
+        """
+        Проверить наличие расходов, не привязанных к платежам по пассиву
+        (расход считается привязанным, если на его дату есть платеж по этому пассиву)
+        """
+        if hasattr(self, 'unlinked_expenses_exist'):
+            return self.unlinked_expenses_exist
+        paid_dates = self.payments.values('date')
+        return self.expenses.exclude(date__in=paid_dates).exists()
 
-class LiabilityPayment(models.Model):
+class LiabilityPayment(BaseAmountMixin, LoadedValuesMixin, models.Model):
     """
     Платеж по пассиву (кредиту/займу)
     """
+    tracked_fields = ('liability_id', 'amount', 'principal', 'interest')
+    amount_currency_path = 'liability__currency_id'
+
     liability = models.ForeignKey(Liability, on_delete=models.CASCADE, related_name='payments')
     amount = models.DecimalField('Сумма платежа', max_digits=20, decimal_places=2)
     date = models.DateField('Дата платежа')
     principal = models.DecimalField('Погашение основного долга', max_digits=20, decimal_places=2)
     interest = models.DecimalField('Погашение процентов', max_digits=20, decimal_places=2)
+    amount_base = models.DecimalField('Сумма в базовой валюте', max_digits=20, decimal_places=2, null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -293,22 +509,36 @@ class LiabilityPayment(models.Model):
     def __str__(self):
         return f"Платеж {self.amount} по {self.liability.name} на {self.date}"
 
-class Income(models.Model):
+    def get_amount_currency_id(self):
+        return self.liability.currency_id
+
+class Income(BaseAmountMixin, ScopeKeyMixin, models.Model):
     """
     Доход
     """
     name = models.CharField('Наименование', max_length=150)
     amount = models.DecimalField('Сумма', max_digits=20, decimal_places=2)
     currency = models.ForeignKey(Currency, on_delete=models.PROTECT, related_name='incomes')
+    amount_base = models.DecimalField('Сумма в базовой валюте', max_digits=20, decimal_places=2, null=True, blank=True, editable=False)
     date = models.DateField('Дата поступления')
-    asset = models.ForeignKey(Asset, null=True, blank=True, on_delete=models.SET_NULL, related_name='incomes')
-    category = models.ForeignKey(Category, null=True, blank=True, on_delete=models.SET_NULL, related_name='incomes')
+    asset = models.ForeignKey(Asset, null=True, blank=True, on_delete=SET_NULL_TOUCH, related_name='incomes')
+    category = models.ForeignKey(Category, null=True, blank=True, on_delete=SET_NULL_TOUCH, related_name='incomes')
     type = models.CharField('Вид', max_length=20, choices=[('regular', 'Постоянный'), ('temporary', 'Временный'), ('occasional', 'Случайный')])
     periodicity = models.CharField('Периодичность', max_length=30, blank=True)
+    recurrence_type = models.CharField(
+        'Повторение',
+        max_length=20,
+        choices=[('none', 'Разовый'), ('weekly', 'Еженедельно'), ('monthly', 'Ежемесячно'),
+                 ('quarterly', 'Ежеквартально'), ('yearly', 'Ежегодно')],
+        default='none',
+        help_text='Структурированная периодичность дохода (повторы до end_date)'
+    )
     end_date = models.DateField('Дата окончания', null=True, blank=True)
+    fingerprint = models.CharField('Отпечаток операции выписки', max_length=64, blank=True, default='', editable=False)
     owner = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='incomes')
     family = models.ForeignKey(NuclearFamily, null=True, blank=True, on_delete=models.SET_NULL, related_name='incomes')
     is_family = models.BooleanField('Семейный доход', default=False)
+    scope_key = models.CharField('Область видимости', max_length=32, blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -316,21 +546,58 @@ class Income(models.Model):
         verbose_name = 'Доход'
         verbose_name_plural = 'Доходы'
         db_table = 'incomes'
+        indexes = [
+            # Keyset-пагинация списка по (date, id)
+            models.Index(fields=['date', 'id'], name='incomes_date_id_idx'),
+            # Суммы за период по области читаются только из индекса
+            models.Index(fields=['scope_key', 'date'], include=['amount_base'], name='incomes_scope_date_base_idx'),
+            # Поиск уже импортированных операций выписки
+            models.Index(fields=['scope_key', 'fingerprint'], name='incomes_scope_fingerprint_idx',
+                         condition=~models.Q(fingerprint='')),
+            # Валидаторы условного GET (max(updated_at), count по области)
+            models.Index(fields=['scope_key', 'updated_at'], name='incomes_scope_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.amount} {self.currency.code})"
 
-class Expense(models.Model):
+class ExpenseQuerySet(models.QuerySet):
+    def with_payment_summary(self, on=None):
+        """
+        Аннотировать сводку оплат подзапросами: paid_total, last_paid_date
+        и paid_for_current_period — есть ли оплата в периоде повтора,
+        содержащем дату on (по умолчанию сегодня); для разовых — любая оплата
+        """
+        from .recurrence import period_bounds
+        on = on or timezone.localdate()
+        payments = ExpensePayment.objects.filter(expense=OuterRef('pk')).order_by().values('expense')
+        amount_field = models.DecimalField(max_digits=20, decimal_places=2)
+        periods = [When(recurrence_type='none', then=Exists(payments))]
+        for value, _ in self.model._meta.get_field('recurrence_type').choices:
+            bounds = period_bounds(on, value)
+            if bounds:
+                periods.append(When(recurrence_type=value, then=Exists(payments.filter(paid_date__range=bounds))))
+        return self.annotate(
+            paid_total=Coalesce(
+                Subquery(payments.annotate(total=Sum('amount')).values('total'), output_field=amount_field),
+                Decimal('0.00'), output_field=amount_field
+            ),
+            last_paid_date=Subquery(payments.annotate(last=Max('paid_date')).values('last')),
+            paid_for_current_period=Case(*periods, default=Value(False), output_field=models.BooleanField()),
+        )
+
+class Expense(BaseAmountMixin, ScopeKeyMixin, models.Model):
     """
     Расход
     """
     name = models.CharField('Наименование', max_length=150)
     amount = models.DecimalField('Сумма', max_digits=20, decimal_places=2)
     currency = models.ForeignKey(Currency, on_delete=models.PROTECT, related_name='expenses')
+    amount_base = models.DecimalField('Сумма в базовой валюте', max_digits=20, decimal_places=2, null=True, blank=True, editable=False)
     date = models.DateField('Дата расхода')
-    asset = models.ForeignKey(Asset, null=True, blank=True, on_delete=models.SET_NULL, related_name='expenses')
-    liability = models.ForeignKey(Liability, null=True, blank=True, on_delete=models.SET_NULL, related_name='expenses')
-    category = models.ForeignKey(Category, null=True, blank=True, on_delete=models.SET_NULL, related_name='expenses')
+    asset = models.ForeignKey(Asset, null=True, blank=True, on_delete=SET_NULL_TOUCH, related_name='expenses')
+    liability = models.ForeignKey(Liability, null=True, blank=True, on_delete=SET_NULL_TOUCH, related_name='expenses')
+    category = models.ForeignKey(Category, null=True, blank=True, on_delete=SET_NULL_TOUCH, related_name='expenses')
     type = models.CharField('Тип', max_length=20, choices=[('mandatory', 'Обязательный'), ('optional', 'Необязательный')])
     recurrence_type = models.CharField(
         max_length=20,
@@ -338,16 +605,31 @@ class Expense(models.Model):
         default='none',
         help_text='Тип повторения расхода'
     )
+    fingerprint = models.CharField('Отпечаток операции выписки', max_length=64, blank=True, default='', editable=False)
     owner = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='expenses')
     family = models.ForeignKey(NuclearFamily, null=True, blank=True, on_delete=models.SET_NULL, related_name='expenses')
     is_family = models.BooleanField('Семейный расход', default=False)
+    scope_key = models.CharField('Область видимости', max_length=32, blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ExpenseQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Расход'
         verbose_name_plural = 'Расходы'
         db_table = 'expenses'
+        indexes = [
+            # Keyset-пагинация списка по (date, id)
+            models.Index(fields=['date', 'id'], name='expenses_date_id_idx'),
+            # Суммы за период по области читаются только из индекса
+            models.Index(fields=['scope_key', 'date'], include=['amount_base'], name='expenses_scope_date_base_idx'),
+            # Поиск уже импортированных операций выписки
+            models.Index(fields=['scope_key', 'fingerprint'], name='expenses_scope_fingerprint_idx',
+                         condition=~models.Q(fingerprint='')),
+            # Валидаторы условного GET (max(updated_at), count по области)
+            models.Index(fields=['scope_key', 'updated_at'], name='expenses_scope_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.amount} {self.currency.code})"
@@ -362,6 +644,10 @@ class ExpensePayment(models.Model):
         verbose_name = 'Оплата расхода'
         verbose_name_plural = 'Оплаты расходов'
         db_table = 'expense_payments'
+        indexes = [
+            # Оплаты расхода за период (сводка оплат, отметка повторов)
+            models.Index(fields=['expense', 'paid_date'], name='expense_payments_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.expense.name}: {self.amount} оплачено"
@@ -374,9 +660,16 @@ class FinanceLog(models.Model):
     entity_id = models.PositiveIntegerField('ID сущности')
     action = models.CharField('Действие', max_length=50)
     user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='finance_logs')
-    date = models.DateTimeField('Дата операции', auto_now_add=True)
+    # Момент действия: записи могут сохраняться пачкой позже (finance.logwriter)
+    date = models.DateTimeField('Дата операции', default=timezone.now, editable=False)
     data_before = models.JSONField('Данные до', null=True, blank=True)
     data_after = models.JSONField('Данные после', null=True, blank=True)
+    # Изменённые поля {поле: [до, после]}; в режиме diff (FINANCE_LOG_STORAGE) — вместо data_before/data_after
+    changes = models.JSONField('Изменения', null=True, blank=True)
+    # Полное состояние объекта (JSON, сжатый zlib): при создании, удалении и в контрольных точках архивации
+    snapshot = models.BinaryField('Снимок', null=True, blank=True)
+    # Область видимости объекта на момент действия ('' — пакет из разных областей, виден автору)
+    scope_key = models.CharField('Область видимости', max_length=32, blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -384,11 +677,21 @@ class FinanceLog(models.Model):
         verbose_name = 'Лог финансового блока'
         verbose_name_plural = 'Логи финансового блока'
         db_table = 'finance_logs'
+        indexes = [
+            # История одного объекта
+            models.Index(fields=['entity_type', 'entity_id', 'date'], name='finance_logs_entity_idx'),
+            # Изменения пользователя за период
+            models.Index(fields=['user', 'date'], name='finance_logs_user_date_idx'),
+            # Журнал области (семьи) за период
+            models.Index(fields=['scope_key', 'date'], name='finance_logs_scope_date_idx'),
+            # Фильтр по изменённому полю: changes ? 'поле'
+            GinIndex(fields=['changes'], name='finance_logs_changes_gin'),
+        ]
 
     def __str__(self):
         return f"[{self.date.strftime('%Y-%m-%d %H:%M')}] {self.action} {self.entity_type} {self.entity_id}"
 
-class FinancialGoal(models.Model):
+class FinancialGoal(ScopeKeyMixin, models.Model):
     """
     Финансовая цель (накопить сумму к дате)
     """
@@ -398,6 +701,7 @@ class FinancialGoal(models.Model):
     owner = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='financial_goals')
     family = models.ForeignKey(NuclearFamily, null=True, blank=True, on_delete=models.SET_NULL, related_name='financial_goals')
     is_family = models.BooleanField('Семейная цель', default=False)
+    scope_key = models.CharField('Область видимости', max_length=32, blank=True, default='', editable=False, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -409,7 +713,7 @@ class FinancialGoal(models.Model):
     def __str__(self):
         return self.name
 
-class BudgetPlan(models.Model):
+class BudgetPlan(ScopeKeyMixin, models.Model):
     """
     Бюджетирование (план доходов/расходов на период)
     """
@@ -419,6 +723,7 @@ class BudgetPlan(models.Model):
     owner = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='budget_plans')
     family = models.ForeignKey(NuclearFamily, null=True, blank=True, on_delete=models.SET_NULL, related_name='budget_plans')
     is_family = models.BooleanField('Семейный бюджет', default=False)
+    scope_key = models.CharField('Область видимости', max_length=32, blank=True, default='', editable=False, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -429,3 +734,31 @@ class BudgetPlan(models.Model):
 
     def __str__(self):
         return f"{self.period} бюджет"
+
+class NetWorthSnapshot(models.Model):
+    """
+    Снимок чистого капитала области видимости (личной или семейной) в одной
+    валюте на дату. Поддерживается инкрементально при изменении активов,
+    фондов, пассивов и платежей; строка появляется на дату первого изменения
+    за день. Суммы хранятся в исходной валюте и пересчитываются при чтении.
+    """
+    scope_key = models.CharField('Область видимости', max_length=32)
+    currency = models.ForeignKey(Currency, on_delete=models.CASCADE, related_name='net_worth_snapshots')
+    date = models.DateField('Дата')
+    total_assets = models.DecimalField('Активы', max_digits=20, decimal_places=2, default=Decimal('0.00'))
+    total_funds = models.DecimalField('Фонды', max_digits=20, decimal_places=2, default=Decimal('0.00'))
+    total_liabilities = models.DecimalField('Пассивы', max_digits=20, decimal_places=2, default=Decimal('0.00'))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Снимок чистого капитала'
+        verbose_name_plural = 'Снимки чистого капитала'
+        db_table = 'net_worth_snapshots'
+        unique_together = ('scope_key', 'currency', 'date')
+
+    def __str__(self):
+        return f"{self.scope_key} на {self.date}: {self.net_worth} ({self.currency_id})"
+
+    @property
+    def net_worth(self):
+        return self.total_assets + self.total_funds - self.total_liabilities
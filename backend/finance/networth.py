@@ -0,0 +1,173 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .currency import converter
+from .models import Asset, Fund, Liability, NetWorthSnapshot
+
+TOTAL_FIELDS = ('total_assets', 'total_funds', 'total_liabilities')
+ZERO = Decimal('0.00')
+
+
+def apply_net_worth_delta(scope_key, currency_id, on=None, **deltas):
+    """
+    Прибавить изменения (total_assets=..., total_funds=..., total_liabilities=...)
+    к снимку области в валюте на дату (по умолчанию сегодня). Если снимка на дату
+    ещё нет, он создаётся от последнего предыдущего снимка.
+    """
+    deltas = {field: value for field, value in deltas.items() if value}
+    if not scope_key or not currency_id or not deltas:
+        return
+    on = on or timezone.localdate()
+    snapshots = NetWorthSnapshot.objects.filter(scope_key=scope_key, currency_id=currency_id, date=on)
+    increments = {field: F(field) + value for field, value in deltas.items()}
+    with transaction.atomic():
+        if snapshots.update(**increments):
+            return
+        previous = NetWorthSnapshot.objects.filter(
+            scope_key=scope_key, currency_id=currency_id, date__lt=on
+        ).order_by('-date').first()
+        values = {
+            field: (getattr(previous, field) if previous else ZERO) + deltas.get(field, ZERO)
+            for field in TOTAL_FIELDS
+        }
+        try:
+            with transaction.atomic():
+                NetWorthSnapshot.objects.create(scope_key=scope_key, currency_id=currency_id, date=on, **values)
+        except IntegrityError:
+            # Снимок успел создать параллельный запрос
+            snapshots.update(**increments)
+
+
+def apply_net_worth_changes(instances, deleted=False):
+    """
+    Применить к снимкам изменения объектов, сохранённых в обход save()
+    (bulk_create, bulk_update): разницы с загруженными значениями складываются
+    по (область, валюта), снимок каждой пары обновляется один раз.
+    С deleted=True объекты вычитаются целиком и помечаются, чтобы сигнал
+    post_delete при их удалении не вычел их повторно
+    """
+    deltas = defaultdict(lambda: defaultdict(Decimal))
+    for instance in instances:
+        previous = instance.get_loaded_net_worth_state()
+        if deleted:
+            scope_key, currency_id, value = previous or instance.get_net_worth_state()
+            deltas[(scope_key, currency_id)][instance.net_worth_total] -= value
+            instance._net_worth_applied = True
+            continue
+        scope_key, currency_id, value = instance.get_net_worth_state()
+        if previous is not None:
+            deltas[previous[:2]][instance.net_worth_total] -= previous[2]
+        deltas[(scope_key, currency_id)][instance.net_worth_total] += value
+        instance.remember_loaded_values()
+    for (scope_key, currency_id), totals in deltas.items():
+        apply_net_worth_delta(scope_key, currency_id, **totals)
+
+
+def latest_snapshots(snapshots):
+    """Последний снимок каждой пары (область, валюта) — DISTINCT ON"""
+    return snapshots.order_by('scope_key', 'currency_id', '-date').distinct('scope_key', 'currency_id')
+
+
+def sum_converted(snapshots, to_currency_id, on):
+    """
+    Итоги снимков в валюте to_currency_id по курсам на дату on.
+    Возвращает (итоги, валюты без курса). Без целевой валюты суммы складываются как есть.
+    """
+    # Все суммы всех снимков пересчитываются одним пакетом
+    items = [(getattr(snapshot, field), snapshot.currency_id, on) for field in TOTAL_FIELDS for snapshot in snapshots]
+    missing = set()
+    if to_currency_id:
+        amounts, missing = converter.convert_many(items, to_currency_id)
+    else:
+        amounts = [item[0] for item in items]
+    size = len(snapshots)
+    totals = {
+        field: sum(amounts[position * size:(position + 1) * size], ZERO)
+        for position, field in enumerate(TOTAL_FIELDS)
+    }
+    return totals, missing
+
+
+def get_net_worth_totals(scope_keys, to_currency_id=None, on=None):
+    """
+    Итоги по последним снимкам областей на дату одним запросом,
+    пересчитанные в валюту to_currency_id. Возвращает (итоги, валюты без курса).
+    """
+    on = on or timezone.localdate()
+    snapshots = list(latest_snapshots(NetWorthSnapshot.objects.filter(scope_key__in=scope_keys, date__lte=on)))
+    return sum_converted(snapshots, to_currency_id, on)
+
+
+def get_net_worth_history(scope_keys, to_currency_id=None, date_from=None, date_to=None):
+    """
+    История чистого капитала по датам изменений. Снимки разных областей
+    и валют разрежены, поэтому значения каждой пары переносятся вперёд до её
+    следующего снимка; пересчёт в валюту идёт по курсу на дату точки.
+    Возвращает (точки, валюты без курса).
+    """
+    snapshots = NetWorthSnapshot.objects.filter(scope_key__in=scope_keys)
+    current = {}
+    if date_from:
+        # Стартовые значения — последние снимки до начала периода
+        for snapshot in latest_snapshots(snapshots.filter(date__lt=date_from)):
+            current[snapshot.scope_key, snapshot.currency_id] = snapshot
+        snapshots = snapshots.filter(date__gte=date_from)
+    if date_to:
+        snapshots = snapshots.filter(date__lte=date_to)
+
+    by_date = defaultdict(list)
+    for snapshot in snapshots.order_by('date'):
+        by_date[snapshot.date].append(snapshot)
+
+    history = []
+    missing = set()
+    for date in sorted(by_date):
+        for snapshot in by_date[date]:
+            current[snapshot.scope_key, snapshot.currency_id] = snapshot
+        point, point_missing = sum_converted(list(current.values()), to_currency_id, date)
+        missing |= point_missing
+        point['net_worth'] = point['total_assets'] + point['total_funds'] - point['total_liabilities']
+        history.append({'date': date, **point})
+    return history, missing
+
+
+def calculate_net_worth_by_scope():
+    """
+    Итоги {(scope_key, currency_id): {...}}, посчитанные заново
+    по строкам активов, фондов и пассивов
+    """
+    totals = defaultdict(lambda: dict.fromkeys(TOTAL_FIELDS, ZERO))
+    for model in (Asset, Fund, Liability):
+        rows = model.objects.exclude(scope_key='').values_list('scope_key', model.net_worth_currency_field).annotate(
+            total=Sum(model.get_net_worth_expression())
+        )
+        for scope_key, currency_id, total in rows:
+            totals[scope_key, currency_id][model.net_worth_total] = total or ZERO
+    return totals
+
+
+@transaction.atomic
+def rebuild_net_worth_snapshots(keep_history=False, on=None):
+    """
+    Пересоздать снимки по текущим данным. Без keep_history история удаляется
+    целиком; с keep_history заменяются только снимки на дату.
+    Возвращает количество записанных снимков.
+    """
+    on = on or timezone.localdate()
+    totals = calculate_net_worth_by_scope()
+    if keep_history:
+        # Пары, у которых данных больше нет, обнуляются, чтобы не тянуть старый итог
+        for key in NetWorthSnapshot.objects.values_list('scope_key', 'currency_id').distinct():
+            totals.setdefault(key, dict.fromkeys(TOTAL_FIELDS, ZERO))
+        NetWorthSnapshot.objects.filter(date=on).delete()
+    else:
+        NetWorthSnapshot.objects.all().delete()
+    NetWorthSnapshot.objects.bulk_create([
+        NetWorthSnapshot(scope_key=scope_key, currency_id=currency_id, date=on, **values)
+        for (scope_key, currency_id), values in totals.items()
+    ], batch_size=1000)
+    return len(totals)
@@ -0,0 +1,159 @@
+import base64
+import json
+import operator
+from functools import reduce
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import models
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class FinancePagination(LimitOffsetPagination):
+    """
+    Пагинация для финансовых списков.
+
+    Включается только по запросу клиента, чтобы не ломать страницы,
+    которые ожидают обычный массив:
+    - ?limit=&offset= — классическая пагинация (count/next/previous/results);
+    - ?cursor= — keyset-пагинация по упорядочиванию `pagination_ordering`
+      вьюсета (по умолчанию (date, id)), не деградирует на глубоких страницах.
+    Без этих параметров список отдаётся целиком, как раньше.
+    """
+    default_limit = 50
+    max_limit = 500
+    cursor_query_param = 'cursor'
+    default_ordering = ('-date', '-id')
+    invalid_cursor_message = 'Некорректный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(view)
+        params = request.query_params
+        if self.cursor_query_param in params:
+            self.mode = 'cursor'
+            return self.paginate_keyset(queryset.order_by(*self.ordering), request)
+        if self.limit_query_param in params or self.offset_query_param in params:
+            self.mode = 'offset'
+            return super().paginate_queryset(queryset.order_by(*self.ordering), request, view)
+        self.mode = None
+        return None
+
+    def get_ordering(self, view):
+        return tuple(getattr(view, 'pagination_ordering', None) or self.default_ordering)
+
+    def paginate_keyset(self, queryset, request):
+        self.limit = self.get_limit(request) or self.default_limit
+        position = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+        if position is not None:
+            position = self.parse_position(queryset.model, position)
+            queryset = queryset.filter(self.build_keyset_filter(position, queryset.model))
+        # Берём на одну запись больше, чтобы понять, есть ли следующая страница
+        page = list(queryset[:self.limit + 1])
+        self.has_next = len(page) > self.limit
+        page = page[:self.limit]
+        self.next_position = self.get_position(page[-1]) if self.has_next else None
+        return page
+
+    def parse_position(self, model, position):
+        """
+        Значения курсора от клиента — через to_python полей упорядочивания:
+        подделанный курсор даёт 404, а не ошибку БД. NULL — только у полей с null=True
+        """
+        values = []
+        for field, value in zip(self.ordering, position):
+            try:
+                model_field = model._meta.get_field(field.lstrip('-'))
+                if value is None and not model_field.null:
+                    raise ValidationError('null')
+                values.append(model_field.to_python(value))
+            except (FieldDoesNotExist, ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def build_keyset_filter(self, position, model):
+        """
+        Условие «строго после позиции» для составного упорядочивания:
+        (a > x) OR (a = x AND b > y) OR ... — с учётом направления каждого поля.
+        NULL — как в PostgreSQL: последним по возрастанию, первым по убыванию.
+        """
+        conditions = []
+        equal = models.Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            descending = field.startswith('-')
+            if value is None:
+                # После NULL по убыванию — все значения, по возрастанию — ничего
+                after = models.Q(**{f'{name}__isnull': False}) if descending else None
+                same = models.Q(**{f'{name}__isnull': True})
+            else:
+                after = models.Q(**{f'{name}__{"lt" if descending else "gt"}': value})
+                if not descending and model._meta.get_field(name).null:
+                    after |= models.Q(**{f'{name}__isnull': True})
+                same = models.Q(**{name: value})
+            if after is not None:
+                conditions.append(equal & after)
+            equal &= same
+        return reduce(operator.or_, conditions)
+
+    def get_position(self, instance):
+        names = [field.lstrip('-') for field in self.ordering]
+        # Страница может состоять из строк .values() (быстрое чтение списков)
+        if isinstance(instance, dict):
+            return [self.serialize_value(instance[name]) for name in names]
+        return [self.serialize_value(getattr(instance, name)) for name in names]
+
+    def serialize_value(self, value):
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        if isinstance(value, (int, str)) or value is None:
+            return value
+        return str(value)
+
+    def encode_cursor(self, position):
+        raw = json.dumps(position, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii')
+
+    def decode_cursor(self, encoded):
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def get_next_link(self):
+        if self.mode != 'cursor':
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        url = remove_query_param(url, self.offset_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        if self.mode != 'cursor':
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+class HistoryPagination(FinancePagination):
+    """
+    Пагинация журнала изменений: всегда keyset по `pagination_ordering`
+    (первая страница — без ?cursor=). Журнал слишком велик, чтобы отдавать
+    его целиком или считать count для смещений.
+    """
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(view)
+        self.mode = 'cursor'
+        return self.paginate_keyset(queryset.order_by(*self.ordering), request)
@@ -0,0 +1,127 @@
+import calendar
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import timedelta
+
+from django.db.models import Q
+
+from .models import ExpensePayment
+
+# Шаг повторения в месяцах (недели считаются отдельно)
+MONTH_STEPS = {'monthly': 1, 'quarterly': 3, 'yearly': 12}
+
+Occurrence = namedtuple('Occurrence', ['item', 'due_date', 'period_start', 'period_end'])
+
+
+def add_months(day, months, anchor_day=None):
+    """Сдвиг даты на месяцы; день якоря обрезается до конца месяца (31 янв -> 29 фев)"""
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    last_day = calendar.monthrange(year, month)[1]
+    return day.replace(year=year, month=month, day=min(anchor_day or day.day, last_day))
+
+
+def period_bounds(due_date, recurrence_type):
+    """
+    Календарный период, в котором оплата закрывает повтор: неделя (пн–вс),
+    месяц, квартал или год даты повтора. Для разовых — None (подходит любая оплата)
+    """
+    if recurrence_type == 'weekly':
+        start = due_date - timedelta(days=due_date.weekday())
+        return start, start + timedelta(days=6)
+    if recurrence_type in MONTH_STEPS:
+        step = MONTH_STEPS[recurrence_type]
+        first_month = (due_date.month - 1) // step * step + 1
+        start = due_date.replace(month=first_month, day=1)
+        return start, add_months(start, step) - timedelta(days=1)
+    return None
+
+
+def iter_occurrences(start, recurrence_type, date_from, date_to, end=None):
+    """
+    Ленивый генератор дат повторов в окне [date_from, date_to] начиная со start.
+    Первый повтор в окне вычисляется арифметически, без перебора истории.
+    """
+    last = min(date_to, end) if end else date_to
+    if start > last:
+        return
+    if recurrence_type in ('none', '', None):
+        if start >= date_from:
+            yield start
+        return
+    if recurrence_type == 'weekly':
+        skip = max(0, (date_from - start).days + 6) // 7
+        day = start + timedelta(weeks=skip)
+        while day <= last:
+            if day >= date_from:
+                yield day
+            day += timedelta(weeks=1)
+        return
+    step = MONTH_STEPS.get(recurrence_type)
+    if step is None:
+        raise ValueError(recurrence_type)
+    months = max(0, (date_from.year - start.year) * 12 + date_from.month - start.month) // step * step
+    while True:
+        day = add_months(start, months, anchor_day=start.day)
+        if day > last:
+            return
+        if day >= date_from:
+            yield day
+        months += step
+
+
+def expand(items, date_from, date_to, end_field=None):
+    """Повторы объектов с полями date и recurrence_type в окне (лениво)"""
+    for item in items:
+        end = getattr(item, end_field) if end_field else None
+        for due_date in iter_occurrences(item.date, item.recurrence_type, date_from, date_to, end):
+            bounds = period_bounds(due_date, item.recurrence_type)
+            yield Occurrence(item, due_date, *(bounds or (None, None)))
+
+
+def recurring_in_window(queryset, date_from, date_to, end_field=None):
+    """
+    Объекты, у которых может быть повтор в окне: разовые с датой в окне
+    и повторяющиеся, начавшиеся не позже конца окна (и не закончившиеся до него)
+    """
+    recurring = Q(date__lte=date_to) & ~Q(recurrence_type='none')
+    if end_field:
+        recurring &= Q(**{f'{end_field}__isnull': True}) | Q(**{f'{end_field}__gte': date_from})
+    return queryset.filter(Q(recurrence_type='none', date__gte=date_from, date__lte=date_to) | recurring)
+
+
+def mark_expense_payments(occurrences):
+    """
+    Отметить оплату повторов расходов одним запросом к ExpensePayment:
+    оплаты за периоды окна и любые оплаты разовых расходов.
+    Возвращает список (повтор, оплата или None).
+    """
+    occurrences = list(occurrences)
+    if not occurrences:
+        return []
+    starts = [o.period_start for o in occurrences if o.period_start]
+    ends = [o.period_end for o in occurrences if o.period_end]
+    condition = Q(expense_id__in={o.item.pk for o in occurrences if o.period_start is None})
+    if starts:
+        condition |= Q(
+            expense_id__in={o.item.pk for o in occurrences if o.period_start},
+            paid_date__gte=min(starts), paid_date__lte=max(ends),
+        )
+    payments = {}
+    for payment in ExpensePayment.objects.filter(condition).order_by('expense_id', 'paid_date', 'id'):
+        payments.setdefault(payment.expense_id, []).append(payment)
+    paid_dates = {expense_id: [p.paid_date for p in items] for expense_id, items in payments.items()}
+
+    marked = []
+    for occurrence in occurrences:
+        found = None
+        expense_payments = payments.get(occurrence.item.pk, [])
+        if occurrence.period_start is None:
+            found = expense_payments[0] if expense_payments else None
+        elif expense_payments:
+            dates = paid_dates[occurrence.item.pk]
+            position = bisect_left(dates, occurrence.period_start)
+            if position < len(dates) and dates[position] <= occurrence.period_end:
+                found = expense_payments[position]
+        marked.append((occurrence, found))
+    return marked
@@ -4,31 +4,77 @@ from .models import (
     LiabilityType, Liability, LiabilityPayment, Income, Expense, FinanceLog, FinancialGoal, BudgetPlan, ExpensePayment
 )
 from datetime import date
-
-class CategorySerializer(serializers.ModelSerializer):
+from .auditlog import unpack_snapshot
+from .models import ScopeKeyMixin
+from common.access import get_access_scope
+from common.fieldsets import SparseFieldsMixin
+
+class ScopedRelationsMixin:
+    """
+    Связи на объекты с областью видимости (scope_key) — только в областях
+    пользователя запроса: чужой id не проходит валидацию при записи,
+    а чужой объект в ?expand= отдаётся id, как без expand
+    """
+    def get_request_scope_keys(self):
+        # Один раз на корневой сериализатор, а не на каждый вложенный объект
+        root = self.root
+        if not hasattr(root, '_request_scope_keys'):
+            request = self.context.get('request')
+            user = getattr(request, 'user', None)
+            root._request_scope_keys = get_access_scope(user).scope_keys if user and user.is_authenticated else None
+        return root._request_scope_keys
+
+    def get_fields(self):
+        fields = super().get_fields()
+        scope_keys = self.get_request_scope_keys()
+        if scope_keys is None:
+            return fields
+        for field in fields.values():
+            if (
+                isinstance(field, serializers.PrimaryKeyRelatedField) and field.queryset is not None
+                and issubclass(field.queryset.model, ScopeKeyMixin)
+            ):
+                field.queryset = field.queryset.filter(scope_key__in=scope_keys)
+        return fields
+
+    def to_representation(self, instance):
+        # Вложенный объект (?expand=): чужой отдаётся только id
+        if isinstance(self.parent, serializers.Serializer):
+            scope_keys = self.get_request_scope_keys()
+            if scope_keys is not None and instance.scope_key not in scope_keys:
+                return instance.pk
+        return super().to_representation(instance)
+
+class CategorySerializer(ScopedRelationsMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = '__all__'
+        expandable_fields = {'parent': 'finance.serializers.CategorySerializer'}
 
-class CurrencySerializer(serializers.ModelSerializer):
+class CurrencySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Currency
         fields = '__all__'
 
-class CurrencyRateSerializer(serializers.ModelSerializer):
+class CurrencyRateSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = CurrencyRate
         fields = '__all__'
+        expandable_fields = {'currency': CurrencySerializer}
 
-class AssetTypeSerializer(serializers.ModelSerializer):
+class AssetTypeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = AssetType
         fields = '__all__'
 
-class AssetSerializer(serializers.ModelSerializer):
+class AssetSerializer(ScopedRelationsMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Asset
         fields = '__all__'
+        expandable_fields = {
+            'type': AssetTypeSerializer, 'category': CategorySerializer,
+            'purchase_currency': CurrencySerializer, 'current_currency': CurrencySerializer,
+        }
 
     def validate_last_valuation_date(self, value):
         if value is not None and value > date.today():
@@ -59,64 +105,109 @@ class AssetSerializer(serializers.ModelSerializer):
         )
         return asset
 
-class AssetValueHistorySerializer(serializers.ModelSerializer):
+class AssetRevaluationItemSerializer(serializers.Serializer):
+    asset = serializers.IntegerField()
+    value = serializers.DecimalField(max_digits=20, decimal_places=2)
+    # По умолчанию — текущая валюта актива и сегодняшняя дата
+    currency = serializers.IntegerField(required=False)
+    date = serializers.DateField(required=False)
+
+    def validate_date(self, value):
+        if value > date.today():
+            raise serializers.ValidationError('Дата оценки не может быть в будущем (допустимо только сегодня или ранее).')
+        return value
+
+class AssetRevaluationSerializer(serializers.Serializer):
+    items = serializers.ListField(child=AssetRevaluationItemSerializer(), allow_empty=False, max_length=1000)
+
+class AssetValueHistorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = AssetValueHistory
         fields = '__all__'
+        expandable_fields = {'asset': AssetSerializer, 'currency': CurrencySerializer}
 
-class AssetShareSerializer(serializers.ModelSerializer):
+class AssetShareSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = AssetShare
         fields = '__all__'
+        expandable_fields = {'asset': AssetSerializer}
 
-class FundSerializer(serializers.ModelSerializer):
+class FundSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Fund
         fields = '__all__'
+        expandable_fields = {'currency': CurrencySerializer}
 
-class LiabilityTypeSerializer(serializers.ModelSerializer):
+class LiabilityTypeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = LiabilityType
         fields = '__all__'
 
-class LiabilitySerializer(serializers.ModelSerializer):
+class LiabilitySerializer(ScopedRelationsMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Liability
         fields = '__all__'
+        expandable_fields = {'type': LiabilityTypeSerializer, 'currency': CurrencySerializer}
 
-class LiabilityPaymentSerializer(serializers.ModelSerializer):
+class LiabilityPaymentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = LiabilityPayment
         fields = '__all__'
+        expandable_fields = {'liability': LiabilitySerializer}
 
-class IncomeSerializer(serializers.ModelSerializer):
+class IncomeSerializer(ScopedRelationsMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Income
         fields = '__all__'
+        expandable_fields = {'currency': CurrencySerializer, 'category': CategorySerializer, 'asset': AssetSerializer}
 
-class ExpensePaymentSerializer(serializers.ModelSerializer):
+class ExpensePaymentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ExpensePayment
         fields = '__all__'
 
-class ExpenseSerializer(serializers.ModelSerializer):
+class ExpenseSerializer(ScopedRelationsMixin, SparseFieldsMixin, serializers.ModelSerializer):
     payments = ExpensePaymentSerializer(many=True, read_only=True)
 
     class Meta:
         model = Expense
         fields = '__all__'
+        expandable_fields = {
+            'currency': CurrencySerializer, 'category': CategorySerializer,
+            'asset': AssetSerializer, 'liability': LiabilitySerializer,
+        }
+
+class ExpenseSummarySerializer(ScopedRelationsMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    """Расход со сводкой оплат вместо списка (ExpenseQuerySet.with_payment_summary)"""
+    paid_total = serializers.DecimalField(max_digits=20, decimal_places=2, read_only=True)
+    last_paid_date = serializers.DateField(read_only=True)
+    paid_for_current_period = serializers.BooleanField(read_only=True)
 
-class FinanceLogSerializer(serializers.ModelSerializer):
     class Meta:
-        model = FinanceLog
+        model = Expense
         fields = '__all__'
+        expandable_fields = {
+            'currency': CurrencySerializer, 'category': CategorySerializer,
+            'asset': AssetSerializer, 'liability': LiabilitySerializer,
+        }
+
+class FinanceLogSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    # Полное состояние из сжатого снимка (создание, удаление, контрольные точки)
+    state = serializers.SerializerMethodField()
+
+    class Meta:
+        model = FinanceLog
+        exclude = ('snapshot',)
+
+    def get_state(self, obj):
+        return unpack_snapshot(obj.snapshot)
 
-class FinancialGoalSerializer(serializers.ModelSerializer):
+class FinancialGoalSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = FinancialGoal
         fields = '__all__'
 
-class BudgetPlanSerializer(serializers.ModelSerializer):
+class BudgetPlanSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = BudgetPlan
         fields = '__all__' 
\ No newline at end of file
@@ -0,0 +1,161 @@
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .currency import invalidate_base_currency, invalidate_currency_rates, recompute_after_rate_change, recompute_base_amounts
+from .models import Asset, Currency, CurrencyRate, Expense, ExpensePayment, Fund, Liability, LiabilityPayment
+from .networth import apply_net_worth_delta
+
+@receiver(pre_save, sender=Asset)
+@receiver(pre_save, sender=Fund)
+@receiver(pre_save, sender=Liability)
+@receiver(pre_save, sender=LiabilityPayment)
+@receiver(pre_save, sender=CurrencyRate)
+def load_previous_values(sender, instance, **kwargs):
+    """
+    Объекты, загруженные через get_object, уже помнят прежние значения.
+    Для созданных вручную (instance с pk без загрузки) читаем их из БД.
+    """
+    if instance._state.adding or instance.pk is None or instance.get_loaded_values() is not None:
+        return
+    loaded = sender.objects.filter(pk=instance.pk).values(*sender.tracked_fields).first()
+    if loaded is not None:
+        instance._loaded_values = loaded
+
+
+@receiver(post_save, sender=Asset)
+@receiver(post_save, sender=Fund)
+@receiver(post_save, sender=Liability)
+def net_worth_item_saved(sender, instance, created, **kwargs):
+    """Перенести изменение суммы (и области видимости) объекта в снимок"""
+    previous = None if created else instance.get_loaded_net_worth_state()
+    scope_key, currency_id, value = instance.get_net_worth_state()
+    total = instance.net_worth_total
+    if previous is None:
+        apply_net_worth_delta(scope_key, currency_id, **{total: value})
+    elif previous[:2] == (scope_key, currency_id):
+        apply_net_worth_delta(scope_key, currency_id, **{total: value - previous[2]})
+    else:
+        apply_net_worth_delta(previous[0], previous[1], **{total: -previous[2]})
+        apply_net_worth_delta(scope_key, currency_id, **{total: value})
+    instance.remember_loaded_values()
+
+
+@receiver(pre_save, sender=Liability)
+def liability_currency_changing(sender, instance, **kwargs):
+    loaded = instance.get_loaded_values()
+    instance._currency_changed = loaded is not None and loaded['currency_id'] != instance.currency_id
+
+
+@receiver(pre_save, sender=Liability)
+def liability_debt_reloaded(sender, instance, **kwargs):
+    """
+    Платежи меняют задолженность UPDATE'ом мимо объектов в памяти: прежнее
+    значение для снимка берём из БД, иначе устаревший объект сдвинет снимок
+    """
+    loaded = instance.get_loaded_values()
+    if loaded is None:
+        return
+    current_debt = sender.objects.filter(pk=instance.pk).values_list('current_debt', flat=True).first()
+    if current_debt is not None:
+        loaded['current_debt'] = current_debt
+
+
+@receiver(post_save, sender=Liability)
+def liability_currency_changed(sender, instance, **kwargs):
+    """Платежи в валюте пассива: при смене валюты пересчитываем их суммы в базовой"""
+    if getattr(instance, '_currency_changed', False):
+        recompute_base_amounts(instance.currency_id, models=[LiabilityPayment])
+
+
+@receiver(post_delete, sender=Asset)
+@receiver(post_delete, sender=Fund)
+@receiver(post_delete, sender=Liability)
+def net_worth_item_deleted(sender, instance, **kwargs):
+    if getattr(instance, '_net_worth_applied', False):
+        # Пакетное удаление уже вычло объект (apply_net_worth_changes)
+        return
+    scope_key, currency_id, value = instance.get_loaded_net_worth_state() or instance.get_net_worth_state()
+    apply_net_worth_delta(scope_key, currency_id, **{instance.net_worth_total: -value})
+
+
+@receiver(post_save, sender=LiabilityPayment)
+def liability_payment_saved(sender, instance, created, **kwargs):
+    """Платёж меняет итоги платежей пассива, а погашение основного долга — задолженность"""
+    previous = None if created else instance.get_loaded_values()
+    if previous is not None and previous['liability_id'] != instance.liability_id:
+        _change_payment_totals(previous['liability_id'], previous, sign=-1)
+        previous = None
+    changes = {name: getattr(instance, name) - (previous[name] if previous else 0) for name in PAYMENT_FIELDS}
+    _change_payment_totals(instance.liability_id, changes)
+    instance.remember_loaded_values()
+
+
+@receiver(post_delete, sender=LiabilityPayment)
+def liability_payment_deleted(sender, instance, origin=None, **kwargs):
+    # При удалении самого пассива платежи удаляются каскадом,
+    # а его задолженность уже вычтена из снимка целиком.
+    # Удаление платежей queryset'ом (админка, BulkMixin) — обычное удаление
+    if isinstance(origin, Liability) or isinstance(origin, QuerySet) and origin.model is Liability:
+        return
+    previous = instance.get_loaded_values() or {name: getattr(instance, name) for name in LiabilityPayment.tracked_fields}
+    _change_payment_totals(previous['liability_id'], previous, sign=-1)
+
+
+# Поле платежа -> итог в пассиве
+PAYMENT_FIELDS = {'amount': 'paid_total', 'principal': 'paid_principal', 'interest': 'paid_interest'}
+
+
+def _change_payment_totals(liability_id, changes, sign=1):
+    """
+    Изменить итоги платежей и задолженность пассива одним атомарным UPDATE
+    и применить изменение задолженности к снимку. Задолженность меняется
+    разницей (F), а не записью: правка пользователя между платежами сохраняется
+    """
+    changes = {name: sign * (changes[name] or 0) for name in PAYMENT_FIELDS}
+    if not any(changes.values()):
+        return
+    Liability.objects.filter(pk=liability_id).update(
+        current_debt=F('current_debt') - changes['principal'],
+        updated_at=timezone.now(),
+        **{total: F(total) + changes[name] for name, total in PAYMENT_FIELDS.items()}
+    )
+    if not changes['principal']:
+        return
+    liability = Liability.objects.filter(pk=liability_id).values_list('scope_key', 'currency_id').first()
+    if liability is not None:
+        apply_net_worth_delta(*liability, total_liabilities=-changes['principal'])
+
+
+@receiver([post_save, post_delete], sender=CurrencyRate)
+def currency_rate_changed(sender, instance, **kwargs):
+    """
+    Изменение курса сбрасывает историю курсов валюты в памяти процессов
+    и пересчитывает суммы в базовой валюте на затронутом интервале дат
+    """
+    previous = instance.get_loaded_values() if kwargs.get('created') is False else None
+    invalidate_currency_rates(instance.currency_id)
+    transaction.on_commit(lambda: invalidate_currency_rates(instance.currency_id))
+    dates = [instance.date]
+    if previous is not None and previous['currency_id'] != instance.currency_id:
+        recompute_after_rate_change(previous['currency_id'], previous['date'])
+    elif previous is not None:
+        dates.append(previous['date'])
+    recompute_after_rate_change(instance.currency_id, *dates)
+    instance.remember_loaded_values()
+
+
+@receiver([post_save, post_delete], sender=Currency)
+def currency_changed(sender, instance, **kwargs):
+    invalidate_base_currency()
+
+
+@receiver([post_save, post_delete], sender=ExpensePayment)
+def expense_payment_changed(sender, instance, origin=None, **kwargs):
+    """Оплаты входят в ответ расхода: сдвигаем его updated_at (валидаторы условного GET)"""
+    if isinstance(origin, Expense) or getattr(origin, 'model', None) is Expense:
+        # Оплаты удаляются вместе с расходом
+        return
+    Expense.objects.filter(pk=instance.expense_id).update(updated_at=timezone.now())
@@ -0,0 +1,209 @@
+import hashlib
+import re
+from collections import Counter, namedtuple
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+
+from .importer import OperationImporter, decode_lines, iter_rows, load_currencies
+from .models import Expense, Income
+
+# Операция выписки: сумма со знаком (минус — списание), currency — код или None
+Transaction = namedtuple('Transaction', ['date', 'amount', 'currency', 'description'])
+
+STATEMENT_FORMATS = ('ofx', 'qif', 'csv')
+
+# Профили CSV-выписок: колонки (в нижнем регистре), форматы дат,
+# колонка статуса и статусы операций, которые не попадают в импорт
+CSV_PROFILES = {
+    'generic': {
+        'date': 'date', 'amount': 'amount', 'currency': 'currency', 'description': 'description',
+        'date_formats': ('%Y-%m-%d', '%d.%m.%Y'),
+    },
+    'tinkoff': {
+        'date': 'дата операции', 'amount': 'сумма операции', 'currency': 'валюта операции',
+        'description': 'описание', 'date_formats': ('%d.%m.%Y %H:%M:%S', '%d.%m.%Y'),
+        'status': 'статус', 'skip_statuses': {'FAILED'},
+    },
+    'sberbank': {
+        'date': 'дата операции', 'amount': 'сумма в валюте счёта', 'currency': 'валюта',
+        'description': 'описание операции', 'date_formats': ('%d.%m.%Y %H:%M', '%d.%m.%Y'),
+    },
+}
+
+OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+QIF_DATE_FORMATS = ('%m/%d/%Y', '%m/%d/%y', '%d.%m.%Y', '%Y-%m-%d')
+
+
+def guess_statement_format(filename):
+    extension = (filename or '').lower().rsplit('.', 1)[-1]
+    if extension in ('ofx', 'qfx'):
+        return 'ofx'
+    if extension == 'qif':
+        return 'qif'
+    return 'csv'
+
+
+def parse_amount(value):
+    """Сумма со знаком: пробелы и разделители тысяч отбрасываются, запятая — десятичная"""
+    value = str(value or '').replace('\xa0', '').replace(' ', '').replace('+', '')
+    if ',' in value and '.' in value:
+        value = value.replace(',', '')
+    try:
+        amount = Decimal(value.replace(',', '.'))
+    except InvalidOperation:
+        return None
+    return amount if amount.is_finite() else None
+
+
+def parse_date(value, formats):
+    value = str(value or '').strip()
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def normalize_description(description):
+    """Описание без регистра, пунктуации и лишних пробелов (ё = е)"""
+    return ' '.join(re.sub(r'[^\w]+', ' ', description.casefold().replace('ё', 'е')).split())
+
+
+def make_fingerprint(day, amount, currency, description, occurrence=0):
+    """
+    Стабильный отпечаток операции: дата, сумма, валюта, нормализованное описание
+    и порядковый номер среди одинаковых операций выписки (две одинаковые покупки
+    за день — разные операции, а повторная выгрузка даёт те же номера)
+    """
+    raw = f'{day.isoformat()}|{amount:.2f}|{currency.upper()}|{normalize_description(description)}|{occurrence}'
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def parse_ofx(stream, encoding=None):
+    """
+    Операции STMTTRN из OFX (SGML 1.x или XML 2.x) построчно.
+    Валюта — CURDEF выписки; описание — NAME и MEMO
+    """
+    currency = None
+    current = None
+    for line in decode_lines(stream, encoding):
+        for closing, tag, text in OFX_TAG.findall(line):
+            tag = tag.upper()
+            text = text.strip()
+            if tag == 'STMTTRN':
+                if closing and current is not None:
+                    yield Transaction(
+                        parse_date(current.get('DTPOSTED', '')[:8], ('%Y%m%d',)),
+                        parse_amount(current.get('TRNAMT')),
+                        current.get('CURSYM') or currency,
+                        ' '.join(filter(None, [current.get('NAME'), current.get('MEMO')])),
+                    )
+                current = None if closing else {}
+            elif tag == 'CURDEF' and text:
+                currency = text
+            elif current is not None and not closing and text:
+                current[tag] = text
+
+
+def parse_qif(stream, encoding=None):
+    """Операции QIF: D — дата, T/U — сумма, P — получатель, M — примечание, ^ — конец"""
+    current = {}
+    for line in decode_lines(stream, encoding):
+        line = line.rstrip('\r\n')
+        if not line or line.startswith('!'):
+            continue
+        code, value = line[0], line[1:].strip()
+        if code == '^':
+            if current:
+                yield Transaction(
+                    parse_date(current.get('D', '').replace("'", '/').replace(' ', ''), QIF_DATE_FORMATS),
+                    parse_amount(current.get('T', current.get('U'))),
+                    None,
+                    ' '.join(filter(None, [current.get('P'), current.get('M')])),
+                )
+            current = {}
+        else:
+            current[code] = value
+
+
+def parse_csv(stream, profile, encoding=None):
+    columns = CSV_PROFILES[profile]
+    for row in iter_rows(stream, 'csv', encoding):
+        if columns.get('status') and (row.get(columns['status']) or '').strip() in columns['skip_statuses']:
+            continue
+        yield Transaction(
+            parse_date(row.get(columns['date']), columns['date_formats']),
+            parse_amount(row.get(columns['amount'])),
+            (row.get(columns['currency']) or '').strip() or None,
+            (row.get(columns['description']) or '').strip(),
+        )
+
+
+def parse_statement(stream, fmt, profile='generic', encoding=None):
+    """
+    Операции выписки. Кодировка (utf-8 или cp1251, None — по началу файла)
+    одна для всех форматов; неверная — UnicodeDecodeError при чтении
+    """
+    if fmt == 'ofx':
+        return parse_ofx(stream, encoding)
+    if fmt == 'qif':
+        return parse_qif(stream, encoding)
+    return parse_csv(stream, profile, encoding)
+
+
+class StatementImporter:
+    """
+    Импорт выписки: списания становятся расходами, поступления — доходами.
+    Каждой операции присваивается отпечаток (make_fingerprint), операции
+    с уже известным в области отпечатком пропускаются — перекрывающиеся
+    выписки можно загружать повторно.
+    """
+    def __init__(self, user, family_id=None, currency=None, chunk_size=1000, dry_run=False):
+        currencies = load_currencies(user)
+        self.importers = {
+            model: OperationImporter(
+                model, user, family_id, chunk_size=chunk_size, dry_run=dry_run, deduplicate=True, currencies=currencies
+            )
+            for model in (Expense, Income)
+        }
+        self.currency = (currency or getattr(settings, 'BASE_CURRENCY_CODE', 'RUB')).upper()
+        self.occurrences = Counter()
+        self.errors = []
+
+    def run(self, transactions):
+        for number, transaction in enumerate(transactions, start=1):
+            if transaction.date is None or transaction.amount is None:
+                self.errors.append({'row': number, 'errors': {
+                    field: 'Не удалось разобрать' for field in ('date', 'amount')
+                    if getattr(transaction, field) is None
+                }})
+                continue
+            if not transaction.amount:
+                continue
+            amount = transaction.amount.quantize(Decimal('0.01'))
+            currency = (transaction.currency or self.currency).upper()
+            key = (transaction.date, amount, currency, normalize_description(transaction.description))
+            occurrence = self.occurrences[key]
+            self.occurrences[key] += 1
+            importer = self.importers[Expense if amount < 0 else Income]
+            importer.add(number, {
+                'name': transaction.description[:150] or 'Операция по выписке',
+                'amount': abs(amount),
+                'currency': currency,
+                'date': transaction.date.isoformat(),
+                'fingerprint': make_fingerprint(transaction.date, amount, currency, transaction.description, occurrence),
+            })
+        for importer in self.importers.values():
+            importer.flush()
+        return self.get_result()
+
+    def get_result(self):
+        expenses, incomes = self.importers[Expense], self.importers[Income]
+        return {
+            'expenses': {'created': expenses.created, 'skipped': expenses.skipped},
+            'incomes': {'created': incomes.created, 'skipped': incomes.skipped},
+            'errors': sorted(self.errors + expenses.errors + incomes.errors, key=lambda error: error['row']),
+        }
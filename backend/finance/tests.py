@@ -1,13 +1,44 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
-from rest_framework.test import APITestCase, APIClient
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
 from rest_framework import status
+from django.db.models import Prefetch
+from django.utils import timezone
 from decimal import Decimal
+from datetime import date, timedelta
+from io import StringIO
+import json
+import tempfile
+from .pagination import FinancePagination
 from .models import (
     Asset, AssetType, Category, Currency, Fund, Liability, LiabilityType,
-    Income, Expense, FinanceLog
+    Income, Expense, FinanceLog, LiabilityPayment, NetWorthSnapshot, CurrencyRate, AssetValueHistory,
+    ExpensePayment, FinancialGoal, BudgetPlan
 )
-from users.models import Family, Role, FamilyMembership
+from .serializers import (
+    AssetSerializer, CategorySerializer, ExpenseSerializer, ExpenseSummarySerializer, FinanceLogSerializer,
+    FundSerializer, IncomeSerializer, LiabilitySerializer
+)
+from .currency import CurrencyConverter, converter, recompute_base_amounts
+from . import fastread
+from .fastread import get_values_plan
+from .views import ExpenseViewSet
+from common.renderers import MessagePackRenderer
+from .logwriter import FinanceLogWriter, log_writer
+from .auditlog import get_entity_history, get_entity_state, unpack_snapshot
+from .recurrence import iter_occurrences
+from .amortization import LoanTerms, build_schedules
+from .networth import calculate_net_worth_by_scope, rebuild_net_worth_snapshots
+from nucfamily.models import NuclearFamily, FamilyMembership
+from common.access import get_access_scope
 
 User = get_user_model()
 
@@ -126,10 +157,23 @@ class FinanceModelsTestCase(TestCase):
             owner=self.user
         )
         
-        # Проверяем что метод возвращает правильное значение
-        # get_remaining_principal должен возвращать разницу между initial_amount и current_debt
-        expected_remaining = liability.initial_amount - liability.current_debt
-        self.assertEqual(liability.get_remaining_principal(), expected_remaining)
+        # Остаток основного долга — первоначальная сумма за вычетом погашенного по платежам
+        self.assertEqual(liability.get_remaining_principal(), Decimal('5000000.00'))
+        LiabilityPayment.objects.create(
+            liability=liability, amount=Decimal('60000.00'), date='2024-02-01',
+            principal=Decimal('50000.00'), interest=Decimal('10000.00')
+        )
+        liability.refresh_from_db()
+        self.assertEqual(liability.get_remaining_principal(), Decimal('4950000.00'))
+
+        # Расход на дату платежа привязан к нему, на другую дату — нет
+        expense = Expense.objects.create(
+            name='Платёж по ипотеке', amount=Decimal('60000.00'), currency=self.currency, date='2024-02-01',
+            type='mandatory', liability=liability, owner=self.user
+        )
+        self.assertFalse(liability.has_unlinked_expenses())
+        expense.date = '2024-03-01'
+        expense.save()
         self.assertTrue(liability.has_unlinked_expenses())
 
 
@@ -287,14 +331,17 @@ class FamilyAccessTestCase(APITestCase):
             phone='+79991234568'
         )
         
-        self.family = Family.objects.create(name='Тестовая семья')
-        self.role = Role.objects.create(name='Взрослый')
+        self.family = NuclearFamily.objects.create(
+            name='Тестовая семья',
+            join_code='TESTCODE',
+            join_password='hashed'
+        )
         
         # user1 - член семьи, user2 - нет
         FamilyMembership.objects.create(
             user=self.user1,
             family=self.family,
-            role=self.role,
+            role='parent',
             status='active'
         )
         
@@ -353,3 +400,2192 @@ class FamilyAccessTestCase(APITestCase):
         
         response = self.client.post('/api/finance/assets/', data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FinancePaginationTestCase(APITestCase):
+    """Тесты пагинации финансовых списков"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User',
+            middle_name='Test',
+            birth_date='1990-01-01',
+            phone='+79991234567'
+        )
+        self.currency = Currency.objects.create(
+            code='RUB',
+            name='Российский рубль',
+            symbol='₽',
+            is_default=True
+        )
+        # 5 расходов: два на одну дату, чтобы проверить упорядочивание по id
+        for day in ['2024-06-01', '2024-06-02', '2024-06-02', '2024-06-03', '2024-06-04']:
+            Expense.objects.create(
+                name=f'Расход {day}',
+                amount=Decimal('100.00'),
+                currency=self.currency,
+                date=day,
+                type='mandatory',
+                owner=self.user
+            )
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_without_params_is_not_paginated(self):
+        """Без limit/cursor список отдается массивом, как раньше"""
+        response = self.client.get('/api/finance/expenses/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), 5)
+
+    def test_limit_offset_pagination(self):
+        """Тест пагинации limit/offset"""
+        response = self.client.get('/api/finance/expenses/?limit=2&offset=2')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['results'][0]['date'], '2024-06-02')
+
+    def test_cursor_pagination_walks_all_pages(self):
+        """Keyset-пагинация проходит все записи без пропусков и повторов"""
+        expected = list(Expense.objects.order_by('-date', '-id').values_list('id', flat=True))
+        seen = []
+        url = '/api/finance/expenses/?cursor=&limit=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor(self):
+        """Тест некорректного курсора"""
+        response = self.client.get('/api/finance/expenses/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tampered_cursor(self):
+        """Подделанные значения курсора — 404, а не ошибка БД"""
+        pagination = FinancePagination()
+        pagination.ordering = ('-date', '-id')
+        for position in (['2024-13-45', 1], ['2024-06-01', 'abc'], [None, 1], [{}, 1]):
+            with self.subTest(position):
+                cursor = pagination.encode_cursor(position)
+                response = self.client.get('/api/finance/expenses/', {'cursor': cursor})
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_nullable_ordering(self):
+        """Поле с NULL: страницы идут в порядке PostgreSQL (NULL последним по возрастанию, первым по убыванию)"""
+        for i, target_date in enumerate([None, '2025-01-01', None, '2024-01-01', '2025-01-01']):
+            Fund.objects.create(name=f'Фонд {i}', goal=Decimal('100.00'), current_value=Decimal('0.00'),
+                                currency=self.currency, target_date=target_date, owner=self.user)
+        factory = APIRequestFactory()
+        for ordering in (('target_date', 'id'), ('-target_date', '-id')):
+            with self.subTest(ordering):
+                view = type('View', (), {'pagination_ordering': ordering})()
+                pagination = FinancePagination()
+                expected = list(Fund.objects.order_by(*ordering).values_list('id', flat=True))
+                seen, cursor = [], ''
+                while cursor is not None:
+                    request = Request(factory.get('/', {'cursor': cursor, 'limit': 2}))
+                    seen.extend(fund.id for fund in pagination.paginate_queryset(Fund.objects.all(), request, view))
+                    cursor = pagination.encode_cursor(pagination.next_position) if pagination.has_next else None
+                self.assertEqual(seen, expected)
+
+
+class DashboardSummaryTestCase(APITestCase):
+    """Тесты сводки дашборда"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User',
+            middle_name='Test',
+            birth_date='1990-01-01',
+            phone='+79991234567'
+        )
+        self.family = NuclearFamily.objects.create(
+            name='Тестовая семья',
+            join_code='TESTCODE',
+            join_password='hashed'
+        )
+        FamilyMembership.objects.create(user=self.user, family=self.family, role='parent', status='active')
+        self.currency = Currency.objects.create(code='RUB', name='Российский рубль', symbol='₽', is_default=True)
+        realty = AssetType.objects.create(name='Недвижимость', is_base=True)
+        deposit = AssetType.objects.create(name='Вклад', is_base=True)
+        liability_type = LiabilityType.objects.create(name='Кредит', is_base=True)
+
+        for asset_type, value, extra in [
+            (realty, '6000000.00', {'owner': self.user}),
+            (realty, '4000000.00', {'family': self.family, 'is_family': True}),
+            (deposit, '500000.00', {'owner': self.user}),
+        ]:
+            Asset.objects.create(
+                name='Актив', type=asset_type, purchase_value=Decimal(value), purchase_currency=self.currency,
+                current_value=Decimal(value), current_currency=self.currency, **extra
+            )
+        Fund.objects.create(name='Отпуск', goal=Decimal('300000.00'), current_value=Decimal('100000.00'),
+                            currency=self.currency, owner=self.user)
+        linked = Liability.objects.create(
+            name='Ипотека', type=liability_type, initial_amount=Decimal('5000000.00'), currency=self.currency,
+            open_date='2024-01-01', current_debt=Decimal('4500000.00'), owner=self.user
+        )
+        Liability.objects.create(
+            name='Займ', type=liability_type, initial_amount=Decimal('100000.00'), currency=self.currency,
+            open_date='2024-01-01', current_debt=Decimal('50000.00'), owner=self.user
+        )
+        Expense.objects.create(name='Платеж', amount=Decimal('50000.00'), currency=self.currency,
+                               date='2024-02-01', type='mandatory', liability=linked, owner=self.user)
+        LiabilityPayment.objects.create(liability=linked, amount=Decimal('50000.00'), date='2024-02-01',
+                                        principal=Decimal('30000.00'), interest=Decimal('20000.00'))
+        self.client.force_authenticate(user=self.user)
+
+    def test_summary_totals(self):
+        """Тест итогов, структуры по типам и предупреждений"""
+        response = self.client.get('/api/finance/dashboard/summary/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_assets'], Decimal('10500000.00'))
+        self.assertEqual(response.data['total_funds'], Decimal('100000.00'))
+        # Платеж по ипотеке погасил 30000 основного долга
+        self.assertEqual(response.data['total_liabilities'], Decimal('4520000.00'))
+        self.assertEqual(response.data['net_worth'], Decimal('6080000.00'))
+        by_type = {row['type__name']: row for row in response.data['assets_by_type']}
+        self.assertEqual(by_type['Недвижимость']['total_value'], Decimal('10000000.00'))
+        self.assertEqual(by_type['Недвижимость']['count'], 2)
+        self.assertEqual(by_type['Вклад']['count'], 1)
+        self.assertEqual(response.data['warnings'][0]['count'], 1)
+
+    def test_summary_empty(self):
+        """Сводка без данных возвращает нули"""
+        other = User.objects.create_user(
+            username='other', email='other@example.com', password='testpass123', first_name='Other',
+            last_name='User', middle_name='Test', birth_date='1990-01-01', phone='+79991234568'
+        )
+        self.client.force_authenticate(user=other)
+        response = self.client.get('/api/finance/dashboard/summary/')
+        self.assertEqual(response.data['net_worth'], Decimal('0.00'))
+        self.assertEqual(response.data['assets_by_type'], [])
+        self.assertEqual(response.data['warnings'], [])
+
+    def test_summary_query_budget(self):
+        """Сводка: снимки чистого капитала и один агрегат (область доступа и курсы уже в кэше)"""
+        self.client.get('/api/finance/dashboard/summary/')
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/finance/dashboard/summary/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_liabilities_summary(self):
+        """Тест сводки по пассивам"""
+        response = self.client.get('/api/finance/dashboard/liabilities_summary/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_initial_amount'], Decimal('5100000.00'))
+        self.assertEqual(response.data['total_current_debt'], Decimal('4520000.00'))
+        rows = {row['name']: row for row in response.data['liabilities']}
+        self.assertEqual(rows['Ипотека']['total_paid'], Decimal('50000.00'))
+        self.assertEqual(rows['Ипотека']['principal_paid'], Decimal('30000.00'))
+        self.assertEqual(rows['Ипотека']['interest_paid'], Decimal('20000.00'))
+        self.assertFalse(rows['Ипотека']['has_unlinked_expenses'])
+        self.assertEqual(rows['Займ']['total_paid'], Decimal('0.00'))
+
+    def test_liability_totals_agree(self):
+        """Итог пассивов сводки совпадает с задолженностью в сводке по пассивам, в том числе после правки"""
+        liability = Liability.objects.get(name='Займ')
+        self.client.patch(f'/api/finance/liabilities/{liability.id}/', {'current_debt': '45000.00'}, format='json')
+        LiabilityPayment.objects.create(liability=liability, amount=Decimal('6000.00'), date='2024-03-01',
+                                        principal=Decimal('5000.00'), interest=Decimal('1000.00'))
+        summary = self.client.get('/api/finance/dashboard/summary/').data
+        liabilities = self.client.get('/api/finance/dashboard/liabilities_summary/').data
+        self.assertEqual(summary['total_liabilities'], liabilities['total_current_debt'])
+        self.assertEqual(summary['total_liabilities'], Decimal('4510000.00'))
+
+    def test_liabilities_summary_query_budget(self):
+        """Сводка по пассивам не зависит от числа пассивов"""
+        self.client.get('/api/finance/dashboard/liabilities_summary/')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/finance/dashboard/liabilities_summary/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_liability_methods_match_annotations(self):
+        """Методы модели дают одинаковый результат с аннотациями и без"""
+        Expense.objects.create(name='Без платежа', amount=Decimal('1000.00'), currency=self.currency,
+                               date='2024-03-01', type='mandatory', liability=Liability.objects.get(name='Ипотека'),
+                               owner=self.user)
+        for plain, annotated in zip(Liability.objects.order_by('id'),
+                                    Liability.objects.with_payment_totals().with_unlinked_expenses().order_by('id')):
+            self.assertEqual(plain.get_total_payments(), annotated.get_total_payments())
+            self.assertEqual(plain.get_total_principal_paid(), annotated.get_total_principal_paid())
+            self.assertEqual(plain.get_total_interest_paid(), annotated.get_total_interest_paid())
+            self.assertEqual(plain.has_unlinked_expenses(), annotated.has_unlinked_expenses())
+
+
+class ScopeFilterTestCase(APITestCase):
+    """Тесты ключа области видимости и фильтра ?scope="""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User',
+            middle_name='Test',
+            birth_date='1990-01-01',
+            phone='+79991234567'
+        )
+        self.family = NuclearFamily.objects.create(name='Семья', join_code='FAMILY01', join_password='hashed')
+        self.other_family = NuclearFamily.objects.create(name='Чужая семья', join_code='FAMILY02', join_password='hashed')
+        FamilyMembership.objects.create(user=self.user, family=self.family, role='parent', status='active')
+        self.currency = Currency.objects.create(code='RUB', name='Российский рубль', symbol='₽', is_default=True)
+        self.personal = Expense.objects.create(name='Личный', amount=Decimal('100.00'), currency=self.currency,
+                                               date='2024-06-01', type='mandatory', owner=self.user)
+        self.family_expense = Expense.objects.create(name='Семейный', amount=Decimal('200.00'), currency=self.currency,
+                                                     date='2024-06-01', type='mandatory', family=self.family,
+                                                     is_family=True)
+        Expense.objects.create(name='Чужой', amount=Decimal('300.00'), currency=self.currency, date='2024-06-01',
+                               type='mandatory', family=self.other_family, is_family=True)
+        self.client.force_authenticate(user=self.user)
+
+    def test_scope_key_maintained_on_save(self):
+        """Ключ области пересчитывается при сохранении"""
+        self.assertEqual(self.personal.scope_key, f'u:{self.user.id}')
+        self.assertEqual(self.family_expense.scope_key, f'f:{self.family.id}')
+        self.personal.family = self.family
+        self.personal.is_family = True
+        self.personal.save(update_fields=['family', 'is_family'])
+        self.personal.refresh_from_db()
+        self.assertEqual(self.personal.scope_key, f'f:{self.family.id}')
+
+    def test_list_all_scopes(self):
+        """Без параметра видны личные и семейные записи"""
+        response = self.client.get('/api/finance/expenses/')
+        self.assertEqual({item['name'] for item in response.data}, {'Личный', 'Семейный'})
+
+    def test_list_single_scope(self):
+        """Параметр scope ограничивает выборку одной областью"""
+        response = self.client.get('/api/finance/expenses/?scope=personal')
+        self.assertEqual([item['name'] for item in response.data], ['Личный'])
+        response = self.client.get(f'/api/finance/expenses/?scope=family:{self.family.id}')
+        self.assertEqual([item['name'] for item in response.data], ['Семейный'])
+
+    def test_foreign_scope_rejected(self):
+        """Чужая семья как область недоступна"""
+        response = self.client.get(f'/api/finance/expenses/?scope=family:{self.other_family.id}')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/finance/expenses/?scope=family:abc')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_sets_scope_key(self):
+        """perform_create заполняет ключ области"""
+        response = self.client.post('/api/finance/expenses/', {
+            'name': 'Новый', 'amount': '10.00', 'currency': self.currency.id, 'date': '2024-06-02',
+            'type': 'optional', 'is_family': True, 'family': self.family.id
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Expense.objects.get(name='Новый').scope_key, f'f:{self.family.id}')
+
+
+    def test_goals_and_budgets_scoped(self):
+        """Цели и бюджеты видны только в областях пользователя, с фильтром ?scope="""
+        FinancialGoal.objects.create(name='Своя', target_amount=Decimal('1000.00'), target_date='2025-01-01',
+                                     owner=self.user)
+        FinancialGoal.objects.create(name='Чужая', target_amount=Decimal('1000.00'), target_date='2025-01-01',
+                                     family=self.other_family, is_family=True)
+        BudgetPlan.objects.create(period='2024-06', planned_income=Decimal('10.00'), planned_expense=Decimal('5.00'),
+                                  family=self.family, is_family=True)
+        BudgetPlan.objects.create(period='2024-07', planned_income=Decimal('10.00'), planned_expense=Decimal('5.00'),
+                                  family=self.other_family, is_family=True)
+        response = self.client.get('/api/finance/financial-goals/')
+        self.assertEqual([item['name'] for item in response.data], ['Своя'])
+        response = self.client.get(f'/api/finance/budget-plans/?scope=family:{self.family.id}')
+        self.assertEqual([item['period'] for item in response.data], ['2024-06'])
+        self.assertEqual(self.client.get('/api/finance/budget-plans/?scope=personal').data, [])
+        response = self.client.post('/api/finance/financial-goals/', {
+            'name': 'Новая', 'target_amount': '500.00', 'target_date': '2025-06-01'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(FinancialGoal.objects.get(name='Новая').scope_key, f'u:{self.user.id}')
+
+
+class NetWorthSnapshotTestCase(APITestCase):
+    """Тесты инкрементальных снимков чистого капитала"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User',
+            middle_name='Test',
+            birth_date='1990-01-01',
+            phone='+79991234567'
+        )
+        self.family = NuclearFamily.objects.create(name='Семья', join_code='FAMILY01', join_password='hashed')
+        FamilyMembership.objects.create(user=self.user, family=self.family, role='parent', status='active')
+        self.currency = Currency.objects.create(code='RUB', name='Российский рубль', symbol='₽', is_default=True)
+        self.asset_type = AssetType.objects.create(name='Вклад', is_base=True)
+        self.liability_type = LiabilityType.objects.create(name='Кредит', is_base=True)
+        self.personal_key = f'u:{self.user.id}'
+        self.family_key = f'f:{self.family.id}'
+        self.client.force_authenticate(user=self.user)
+
+    def create_asset(self, value, **extra):
+        return Asset.objects.create(
+            name='Вклад', type=self.asset_type, purchase_value=Decimal(value), purchase_currency=self.currency,
+            current_value=Decimal(value), current_currency=self.currency, **extra
+        )
+
+    def create_liability(self, debt):
+        return Liability.objects.create(
+            name='Кредит', type=self.liability_type, initial_amount=Decimal(debt), currency=self.currency,
+            open_date='2024-01-01', current_debt=Decimal(debt), owner=self.user
+        )
+
+    def snapshot(self, scope_key):
+        return NetWorthSnapshot.objects.get(scope_key=scope_key)
+
+    def assertSnapshotsMatchRows(self):
+        expected = calculate_net_worth_by_scope()
+        for snapshot in NetWorthSnapshot.objects.all():
+            totals = expected.get((snapshot.scope_key, snapshot.currency_id), {})
+            for field in ('total_assets', 'total_funds', 'total_liabilities'):
+                self.assertEqual(getattr(snapshot, field), totals.get(field, Decimal('0.00')))
+
+    def test_create_update_delete_asset(self):
+        """Создание, изменение и удаление актива меняют снимок на разницу"""
+        asset = self.create_asset('1000.00', owner=self.user)
+        self.assertEqual(self.snapshot(self.personal_key).total_assets, Decimal('1000.00'))
+        response = self.client.patch(f'/api/finance/assets/{asset.id}/', {'current_value': '1500.00'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.snapshot(self.personal_key).total_assets, Decimal('1500.00'))
+        self.client.delete(f'/api/finance/assets/{asset.id}/')
+        self.assertEqual(self.snapshot(self.personal_key).total_assets, Decimal('0.00'))
+
+    def test_scope_change_moves_value(self):
+        """Перевод актива в семейные переносит сумму между областями"""
+        asset = self.create_asset('1000.00', owner=self.user)
+        asset.family = self.family
+        asset.is_family = True
+        asset.save()
+        self.assertEqual(self.snapshot(self.personal_key).total_assets, Decimal('0.00'))
+        self.assertEqual(self.snapshot(self.family_key).total_assets, Decimal('1000.00'))
+        self.assertSnapshotsMatchRows()
+
+    def test_liability_payments_reduce_debt(self):
+        """Платеж уменьшает задолженность и итог пассивов, удаление возвращает"""
+        liability = self.create_liability('10000.00')
+        response = self.client.post('/api/finance/liability-payments/', {
+            'liability': liability.id, 'amount': '1200.00', 'date': '2024-02-01',
+            'principal': '1000.00', 'interest': '200.00'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        liability.refresh_from_db()
+        self.assertEqual(liability.current_debt, Decimal('9000.00'))
+        self.assertEqual(self.snapshot(self.personal_key).total_liabilities, Decimal('9000.00'))
+
+        payment_id = response.data['id']
+        self.client.patch(f'/api/finance/liability-payments/{payment_id}/', {'principal': '1100.00'}, format='json')
+        self.assertEqual(self.snapshot(self.personal_key).total_liabilities, Decimal('8900.00'))
+        self.client.delete(f'/api/finance/liability-payments/{payment_id}/')
+        liability.refresh_from_db()
+        self.assertEqual(liability.current_debt, Decimal('10000.00'))
+        self.assertSnapshotsMatchRows()
+
+    def test_liability_delete_with_payments(self):
+        """Удаление пассива с платежами обнуляет итог пассивов"""
+        liability = self.create_liability('10000.00')
+        LiabilityPayment.objects.create(liability=liability, amount=Decimal('1000.00'), date='2024-02-01',
+                                        principal=Decimal('1000.00'), interest=Decimal('0.00'))
+        Liability.objects.get(pk=liability.pk).delete()
+        self.assertEqual(self.snapshot(self.personal_key).total_liabilities, Decimal('0.00'))
+
+    def test_foreign_liability_payments_hidden(self):
+        """Платежи по чужим пассивам не видны и не создаются"""
+        other = User.objects.create_user(
+            username='other', email='other@example.com', password='testpass123', first_name='Other',
+            last_name='User', middle_name='Test', birth_date='1990-01-01', phone='+79991234568'
+        )
+        liability = self.create_liability('10000.00')
+        LiabilityPayment.objects.create(liability=liability, amount=Decimal('1000.00'), date='2024-02-01',
+                                        principal=Decimal('1000.00'), interest=Decimal('0.00'))
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get('/api/finance/liability-payments/').data, [])
+        response = self.client.post('/api/finance/liability-payments/', {
+            'liability': liability.id, 'amount': '1.00', 'date': '2024-03-01', 'principal': '1.00', 'interest': '0.00'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rebuild_matches_incremental(self):
+        """Пересчёт с нуля даёт те же итоги, что и инкрементальные изменения"""
+        self.create_asset('1000.00', owner=self.user)
+        self.create_asset('2000.00', family=self.family, is_family=True)
+        Fund.objects.create(name='Отпуск', goal=Decimal('300.00'), current_value=Decimal('100.00'),
+                            currency=self.currency, owner=self.user)
+        self.create_liability('500.00')
+        before = {s.scope_key: s.net_worth for s in NetWorthSnapshot.objects.all()}
+        NetWorthSnapshot.objects.update(total_assets=Decimal('0.00'))
+        self.assertEqual(rebuild_net_worth_snapshots(), 2)
+        self.assertEqual({s.scope_key: s.net_worth for s in NetWorthSnapshot.objects.all()}, before)
+
+    def test_history(self):
+        """История переносит значения областей вперёд по датам"""
+        NetWorthSnapshot.objects.create(scope_key=self.personal_key, date='2024-01-01', currency=self.currency,
+                                        total_assets=Decimal('100.00'))
+        NetWorthSnapshot.objects.create(scope_key=self.family_key, date='2024-02-01', currency=self.currency,
+                                        total_assets=Decimal('50.00'))
+        NetWorthSnapshot.objects.create(scope_key=self.personal_key, date='2024-03-01', currency=self.currency,
+                                        total_assets=Decimal('70.00'), total_liabilities=Decimal('20.00'))
+        response = self.client.get('/api/finance/dashboard/net_worth_history/?date_from=2024-02-01')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([str(point['date']) for point in response.data], ['2024-02-01', '2024-03-01'])
+        self.assertEqual([point['net_worth'] for point in response.data], [Decimal('150.00'), Decimal('100.00')])
+        response = self.client.get('/api/finance/dashboard/net_worth_history/?date_from=bad')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CurrencyConversionTestCase(APITestCase):
+    """Тесты пересчёта валют по курсам на дату"""
+
+    def setUp(self):
+        cache.clear()
+        converter.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User',
+            middle_name='Test',
+            birth_date='1990-01-01',
+            phone='+79991234567'
+        )
+        self.rub = Currency.objects.create(code='RUB', name='Российский рубль', symbol='₽', is_default=True)
+        self.usd = Currency.objects.create(code='USD', name='Доллар США', symbol='$', is_default=True)
+        self.eur = Currency.objects.create(code='EUR', name='Евро', symbol='€', is_default=True)
+        CurrencyRate.objects.create(currency=self.usd, date='2024-01-01', rate_to_base=Decimal('90'))
+        CurrencyRate.objects.create(currency=self.usd, date='2024-06-01', rate_to_base=Decimal('100'))
+        self.asset_type = AssetType.objects.create(name='Вклад', is_base=True)
+        self.client.force_authenticate(user=self.user)
+
+    def test_as_of_lookup(self):
+        """Курс берётся последний на дату, до первого курса — нет пересчёта"""
+        amounts, missing = converter.convert_many([
+            (Decimal('10.00'), self.usd.id, date(2024, 3, 1)),
+            (Decimal('10.00'), self.usd.id, date(2024, 6, 1)),
+            (Decimal('10.00'), self.usd.id, date(2023, 12, 31)),
+            (Decimal('10.00'), self.rub.id, date(2024, 3, 1)),
+        ], self.rub.id)
+        self.assertEqual(amounts, [Decimal('900.00'), Decimal('1000.00'), Decimal('10.00'), Decimal('10.00')])
+        self.assertEqual(missing, {self.usd.id})
+        self.assertEqual(converter.convert(Decimal('500.00'), self.rub.id, self.usd.id, date(2024, 7, 1)),
+                         Decimal('5.00'))
+        self.assertIsNone(converter.convert(Decimal('1.00'), self.eur.id, self.rub.id))
+
+    def test_index_cached_and_invalidated(self):
+        """История курсов читается один раз и сбрасывается при изменении курса"""
+        converter.convert_many([(Decimal('1.00'), self.usd.id)], self.rub.id)
+        with self.assertNumQueries(0):
+            converter.convert_many([(Decimal('1.00'), self.usd.id)], self.rub.id)
+        CurrencyRate.objects.create(currency=self.usd, date='2024-09-01', rate_to_base=Decimal('95'))
+        self.assertEqual(converter.convert(Decimal('1.00'), self.usd.id, self.rub.id), Decimal('95.00'))
+
+    def test_index_expires_in_other_process(self):
+        """Процесс, не видевший сброса версии курса, перечитывает историю по таймауту"""
+        worker = CurrencyConverter(max_age=60)
+        self.assertEqual(worker.convert(Decimal('1.00'), self.usd.id, self.rub.id), Decimal('100.00'))
+        # Курс изменён в другом процессе: версия в кэше этого процесса не сменилась
+        CurrencyRate.objects.filter(currency=self.usd, date='2024-06-01').update(rate_to_base=Decimal('95'))
+        self.assertEqual(worker.convert(Decimal('1.00'), self.usd.id, self.rub.id), Decimal('100.00'))
+        for index in worker._indexes.values():
+            index.loaded_at -= 61
+        self.assertEqual(worker.convert(Decimal('1.00'), self.usd.id, self.rub.id), Decimal('95.00'))
+
+    def test_dashboard_totals_in_base_currency(self):
+        """Итоги дашборда приводятся к базовой валюте или к ?currency="""
+        for currency, value in [(self.rub, '1000.00'), (self.usd, '10.00')]:
+            Asset.objects.create(
+                name='Вклад', type=self.asset_type, purchase_value=Decimal(value), purchase_currency=currency,
+                current_value=Decimal(value), current_currency=currency, owner=self.user
+            )
+        response = self.client.get('/api/finance/dashboard/summary/')
+        self.assertEqual(response.data['currency'], self.rub.id)
+        self.assertEqual(response.data['total_assets'], Decimal('2000.00'))
+        self.assertEqual(response.data['assets_by_type'][0]['total_value'], Decimal('2000.00'))
+        response = self.client.get(f'/api/finance/dashboard/summary/?currency={self.usd.id}')
+        self.assertEqual(response.data['total_assets'], Decimal('20.00'))
+        response = self.client.get('/api/finance/dashboard/summary/?currency=abc')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_missing_rate_warning(self):
+        """Суммы без курса попадают в предупреждение"""
+        Asset.objects.create(
+            name='Вклад', type=self.asset_type, purchase_value=Decimal('10.00'), purchase_currency=self.eur,
+            current_value=Decimal('10.00'), current_currency=self.eur, owner=self.user
+        )
+        response = self.client.get('/api/finance/dashboard/summary/')
+        self.assertEqual(response.data['warnings'][0]['type'], 'missing_rates')
+        self.assertEqual(response.data['warnings'][0]['currencies'], [self.eur.id])
+
+
+class BaseAmountTestCase(APITestCase):
+    """Тесты суммы в базовой валюте, хранимой в строках операций"""
+
+    def setUp(self):
+        cache.clear()
+        converter.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User',
+            middle_name='Test',
+            birth_date='1990-01-01',
+            phone='+79991234567'
+        )
+        self.rub = Currency.objects.create(code='RUB', name='Российский рубль', symbol='₽', is_default=True)
+        self.usd = Currency.objects.create(code='USD', name='Доллар США', symbol='$', is_default=True)
+        CurrencyRate.objects.create(currency=self.usd, date='2024-01-01', rate_to_base=Decimal('90'))
+        self.client.force_authenticate(user=self.user)
+
+    def create_expense(self, amount, currency, day):
+        return Expense.objects.create(name='Расход', amount=Decimal(amount), currency=currency, date=day,
+                                      type='mandatory', owner=self.user)
+
+    def test_computed_on_save(self):
+        """Сумма считается при сохранении по курсу на дату, без курса — None"""
+        self.assertEqual(self.create_expense('10.00', self.usd, '2024-02-01').amount_base, Decimal('900.00'))
+        self.assertEqual(self.create_expense('10.00', self.rub, '2024-02-01').amount_base, Decimal('10.00'))
+        self.assertIsNone(self.create_expense('10.00', self.usd, '2023-12-01').amount_base)
+
+    def test_recomputed_on_rate_change(self):
+        """Новый или исправленный курс пересчитывает строки до следующего курса"""
+        january = self.create_expense('10.00', self.usd, '2024-01-15')
+        march = self.create_expense('10.00', self.usd, '2024-03-15')
+        may = self.create_expense('10.00', self.usd, '2024-05-15')
+        CurrencyRate.objects.create(currency=self.usd, date='2024-05-01', rate_to_base=Decimal('100'))
+        rate = CurrencyRate.objects.create(currency=self.usd, date='2024-03-01', rate_to_base=Decimal('95'))
+
+        def values():
+            return [Expense.objects.get(pk=expense.pk).amount_base for expense in (january, march, may)]
+
+        self.assertEqual(values(), [Decimal('900.00'), Decimal('950.00'), Decimal('1000.00')])
+
+        rate.rate_to_base = Decimal('96')
+        rate.save()
+        self.assertEqual(values(), [Decimal('900.00'), Decimal('960.00'), Decimal('1000.00')])
+        rate.delete()
+        self.assertEqual(values(), [Decimal('900.00'), Decimal('900.00'), Decimal('1000.00')])
+
+    def test_half_cent_rounding(self):
+        """Сохранение и пересчёт в БД округляют половину копейки одинаково (от нуля)"""
+        eur = Currency.objects.create(code='EUR', name='Евро', symbol='€', is_default=True)
+        CurrencyRate.objects.create(currency=eur, date='2024-01-01', rate_to_base=Decimal('0.5'))
+        expense = self.create_expense('2.05', eur, '2024-02-01')
+        self.assertEqual(expense.amount_base, Decimal('1.03'))
+        recompute_base_amounts(eur.id)
+        expense.refresh_from_db()
+        self.assertEqual(expense.amount_base, Decimal('1.03'))
+
+    def test_liability_payment_uses_liability_currency(self):
+        """Платеж пересчитывается по валюте пассива"""
+        liability = Liability.objects.create(
+            name='Кредит', type=LiabilityType.objects.create(name='Кредит', is_base=True),
+            initial_amount=Decimal('1000.00'), currency=self.usd, open_date='2024-01-01',
+            current_debt=Decimal('1000.00'), owner=self.user
+        )
+        payment = LiabilityPayment.objects.create(liability=liability, amount=Decimal('10.00'), date='2024-02-01',
+                                                  principal=Decimal('10.00'), interest=Decimal('0.00'))
+        self.assertEqual(payment.amount_base, Decimal('900.00'))
+
+    def test_cash_flow(self):
+        """Доходы и расходы по месяцам в базовой валюте"""
+        self.create_expense('10.00', self.usd, '2024-02-01')
+        self.create_expense('100.00', self.rub, '2024-02-20')
+        self.create_expense('10.00', self.usd, '2023-12-01')
+        Income.objects.create(name='Зарплата', amount=Decimal('5000.00'), currency=self.rub, date='2024-02-05',
+                              type='regular', owner=self.user)
+        response = self.client.get('/api/finance/dashboard/cash_flow/?date_from=2024-01-01')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['months'], [{
+            'month': date(2024, 2, 1), 'income': Decimal('5000.00'), 'expense': Decimal('1000.00'),
+            'balance': Decimal('4000.00')
+        }])
+        response = self.client.get('/api/finance/dashboard/cash_flow/')
+        self.assertEqual(response.data['warnings'][0]['count'], 1)
+
+
+class AssetValueSeriesTestCase(APITestCase):
+    """Тесты рядов стоимости активов для графиков"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User',
+            middle_name='Test',
+            birth_date='1990-01-01',
+            phone='+79991234567'
+        )
+        self.other = User.objects.create_user(
+            username='other', email='other@example.com', password='testpass123', first_name='Other',
+            last_name='User', middle_name='Test', birth_date='1990-01-01', phone='+79991234568'
+        )
+        self.currency = Currency.objects.create(code='RUB', name='Российский рубль', symbol='₽', is_default=True)
+        asset_type = AssetType.objects.create(name='Вклад', is_base=True)
+        self.assets = [
+            Asset.objects.create(
+                name=f'Вклад {i}', type=asset_type, purchase_value=Decimal('100.00'), purchase_currency=self.currency,
+                current_value=Decimal('100.00'), current_currency=self.currency, owner=owner
+            )
+            for i, owner in enumerate([self.user, self.user, self.other])
+        ]
+        # Год ежедневных оценок по каждому активу
+        self.start = date(2024, 1, 1)
+        AssetValueHistory.objects.bulk_create([
+            AssetValueHistory(asset=asset, value=Decimal(100 + day), amount_base=Decimal(100 + day),
+                              currency=self.currency, date=self.start + timedelta(days=day))
+            for asset in self.assets for day in range(366)
+        ])
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_scoped(self):
+        """Список истории содержит только активы пользователя, чужой актив недоступен"""
+        response = self.client.get('/api/finance/asset-value-history/?limit=1000')
+        self.assertEqual(response.data['count'], 2 * 366)
+        response = self.client.post('/api/finance/asset-value-history/', {
+            'asset': self.assets[2].id, 'value': '1.00', 'currency': self.currency.id, 'date': '2025-01-01'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_last_value_buckets(self):
+        """Корзины с последним значением: не больше points точек на ряд"""
+        response = self.client.get('/api/finance/asset-value-history/series/?points=12&date_from=2024-01-01'
+                                   '&date_to=2024-12-31')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['series']), 2)
+        for item in response.data['series']:
+            self.assertLessEqual(len(item['points']), 12)
+            self.assertEqual(item['points'][-1], {'date': date(2024, 12, 31), 'value': Decimal('465.00')})
+        self.assertLessEqual(len(response.data['total']), 12)
+        self.assertEqual(response.data['total'][-1]['value'], Decimal('930.00'))
+
+    def test_lttb(self):
+        """LTTB оставляет ровно points точек, включая края периода"""
+        response = self.client.get(f'/api/finance/asset-value-history/series/?method=lttb&points=50'
+                                   f'&assets={self.assets[0].id}&date_from=2024-03-01&date_to=2024-06-30')
+        points = response.data['series'][0]['points']
+        self.assertEqual(len(points), 50)
+        self.assertEqual(points[0]['date'], date(2024, 3, 1))
+        self.assertEqual(points[-1]['date'], date(2024, 6, 30))
+        # Итог по одному активу совпадает с его рядом
+        self.assertEqual(response.data['total'], points)
+
+    def test_invalid_params(self):
+        """Некорректные параметры отклоняются"""
+        for query in ('points=1', 'method=avg', 'assets=a,b', 'date_from=2024-02-01&date_to=2024-01-01'):
+            response = self.client.get(f'/api/finance/asset-value-history/series/?{query}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+
+
+class RecurrenceTestCase(APITestCase):
+    """Тесты разворачивания повторяющихся расходов и доходов"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User',
+            middle_name='Test',
+            birth_date='1990-01-01',
+            phone='+79991234567'
+        )
+        self.currency = Currency.objects.create(code='RUB', name='Российский рубль', symbol='₽', is_default=True)
+        self.client.force_authenticate(user=self.user)
+
+    def create_expense(self, name, day, recurrence_type):
+        return Expense.objects.create(name=name, amount=Decimal('100.00'), currency=self.currency, date=day,
+                                      type='mandatory', recurrence_type=recurrence_type, owner=self.user)
+
+    def pay(self, expense, day):
+        payment = ExpensePayment.objects.create(expense=expense, amount=expense.amount)
+        # paid_date заполняется автоматически, выставляем нужную дату
+        ExpensePayment.objects.filter(pk=payment.pk).update(paid_date=day)
+
+    def test_iter_occurrences(self):
+        """Повторы в окне: конец месяца, недели, кварталы, дата окончания"""
+        self.assertEqual(
+            list(iter_occurrences(date(2024, 1, 31), 'monthly', date(2024, 2, 1), date(2024, 4, 30))),
+            [date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)]
+        )
+        self.assertEqual(
+            list(iter_occurrences(date(2024, 1, 3), 'weekly', date(2024, 3, 1), date(2024, 3, 14))),
+            [date(2024, 3, 6), date(2024, 3, 13)]
+        )
+        self.assertEqual(
+            list(iter_occurrences(date(2023, 2, 15), 'quarterly', date(2024, 1, 1), date(2024, 12, 31),
+                                  end=date(2024, 9, 1))),
+            [date(2024, 2, 15), date(2024, 5, 15), date(2024, 8, 15)]
+        )
+        self.assertEqual(list(iter_occurrences(date(2024, 5, 1), 'none', date(2024, 6, 1), date(2024, 6, 30))), [])
+
+    def test_expense_occurrences(self):
+        """Повторы расходов за месяц с отметкой оплаты"""
+        rent = self.create_expense('Аренда', '2024-01-10', 'monthly')
+        gym = self.create_expense('Спорт', '2024-05-06', 'weekly')
+        once = self.create_expense('Ремонт', '2024-05-20', 'none')
+        self.create_expense('Старый', '2024-04-20', 'none')
+        self.pay(rent, '2024-05-03')
+        self.pay(rent, '2024-04-10')
+        self.pay(gym, '2024-05-08')
+        self.pay(once, '2024-06-01')
+
+        # Область доступа, расходы и оплаты за окно
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/finance/expenses/occurrences/?date_from=2024-05-01&date_to=2024-05-31')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [(row['name'], str(row['due_date']), row['paid']) for row in response.data]
+        self.assertEqual(rows, [
+            ('Спорт', '2024-05-06', True),
+            ('Аренда', '2024-05-10', True),
+            ('Спорт', '2024-05-13', False),
+            ('Спорт', '2024-05-20', False),
+            ('Ремонт', '2024-05-20', True),
+            ('Спорт', '2024-05-27', False),
+        ])
+        self.assertEqual(str(response.data[1]['payment']['paid_date']), '2024-05-03')
+
+    def test_income_occurrences(self):
+        """Доходы повторяются до даты окончания"""
+        Income.objects.create(name='Зарплата', amount=Decimal('1000.00'), currency=self.currency, date='2024-01-05',
+                              type='regular', recurrence_type='monthly', end_date='2024-02-10', owner=self.user)
+        response = self.client.get('/api/finance/incomes/occurrences/?date_from=2024-01-01&date_to=2024-03-31')
+        self.assertEqual([str(row['due_date']) for row in response.data], ['2024-01-05', '2024-02-05'])
+
+    def test_window_limit(self):
+        """Окно ограничено по длине"""
+        response = self.client.get('/api/finance/expenses/occurrences/?date_from=2020-01-01&date_to=2024-01-01')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class LiabilityScheduleTestCase(APITestCase):
+    """Тесты графиков платежей по пассивам"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User',
+            middle_name='Test',
+            birth_date='1990-01-01',
+            phone='+79991234567'
+        )
+        self.currency = Currency.objects.create(code='RUB', name='Российский рубль', symbol='₽', is_default=True)
+        self.liability_type = LiabilityType.objects.create(name='Кредит', is_base=True)
+        self.client.force_authenticate(user=self.user)
+
+    def create_liability(self, **extra):
+        return Liability.objects.create(
+            name='Кредит', type=self.liability_type, initial_amount=Decimal('1000000.00'), currency=self.currency,
+            open_date='2024-01-15', current_debt=Decimal('1000000.00'), owner=self.user, **extra
+        )
+
+    def test_build_schedules(self):
+        """Аннуитет и дифференцированный график в одной пачке"""
+        batch = build_schedules([
+            LoanTerms(Decimal('1000000.00'), Decimal('12'), 12, 'annuity', date(2024, 2, 15)),
+            LoanTerms(Decimal('600000.00'), Decimal('10'), 3, 'diff', date(2024, 2, 15)),
+        ])
+        self.assertAlmostEqual(batch.payment[0, 0], 88848.79, places=2)
+        self.assertAlmostEqual(batch.interest[0, 0], 10000.00, places=2)
+        self.assertAlmostEqual(batch.principal[0].sum(), 1000000.00, places=2)
+        self.assertEqual(batch.balance[0, 11], 0)
+        self.assertEqual(list(batch.principal[1, :3]), [200000.0, 200000.0, 200000.0])
+        self.assertEqual(list(batch.interest[1, :3]), [5000.0, 3333.33, 1666.67])
+        self.assertEqual(list(batch.payment[1, 3:]), [0.0] * 9)
+
+    def test_schedule_reconciled_with_payments(self):
+        """Платежи сопоставляются со строками графика"""
+        liability = self.create_liability(close_date='2025-01-15', interest_rate=Decimal('12.00'),
+                                          payment_type='annuity', payment_date='2024-02-15')
+        LiabilityPayment.objects.create(liability=liability, amount=Decimal('88848.79'), date='2024-02-14',
+                                        principal=Decimal('78848.79'), interest=Decimal('10000.00'))
+        LiabilityPayment.objects.create(liability=liability, amount=Decimal('50000.00'), date='2024-03-15',
+                                        principal=Decimal('40788.49'), interest=Decimal('9211.51'))
+
+        response = self.client.get(f'/api/finance/liabilities/{liability.id}/schedule/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = response.data['rows']
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(str(rows[1]['date']), '2024-03-15')
+        self.assertEqual([row['status'] for row in rows[:3]], ['paid', 'partial', 'overdue'])
+        self.assertEqual(rows[0]['paid'], Decimal('88848.79'))
+        self.assertEqual(response.data['paid_principal'], Decimal('119637.28'))
+        self.assertEqual(response.data['expected_debt'], Decimal('0.00'))
+        self.assertEqual(response.data['overdue'], 11)
+
+    def test_batch_schedules(self):
+        """Графики нескольких пассивов; пассивы без условий пропускаются"""
+        first = self.create_liability(close_date='2025-01-15', interest_rate=Decimal('12.00'), payment_type='annuity')
+        second = self.create_liability(close_date='2054-01-15', interest_rate=Decimal('8.50'), payment_type='diff')
+        incomplete = self.create_liability()
+
+        # Область доступа, пассивы и платежи всех пассивов
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/finance/liabilities/schedules/?rows=0')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['liability'] for item in response.data['schedules']], [first.id, second.id])
+        self.assertEqual(response.data['schedules'][1]['months'], 360)
+        self.assertNotIn('rows', response.data['schedules'][0])
+        self.assertEqual(response.data['skipped'], [{'id': incomplete.id, 'reason': 'Не указана дата окончания'}])
+
+        response = self.client.get(f'/api/finance/liabilities/{incomplete.id}/schedule/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class LiabilityPaymentTotalsTestCase(APITestCase):
+    """Тесты сохранённых итогов платежей по пассиву"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User',
+            middle_name='Test',
+            birth_date='1990-01-01',
+            phone='+79991234567'
+        )
+        self.currency = Currency.objects.create(code='RUB', name='Российский рубль', symbol='₽', is_default=True)
+        liability_type = LiabilityType.objects.create(name='Кредит', is_base=True)
+        self.liability, self.other = [
+            Liability.objects.create(
+                name=name, type=liability_type, initial_amount=Decimal('100000.00'), currency=self.currency,
+                open_date='2024-01-01', current_debt=Decimal('100000.00'), owner=self.user
+            )
+            for name in ('Кредит', 'Займ')
+        ]
+        self.client.force_authenticate(user=self.user)
+
+    def assertTotals(self, liability, paid, principal, interest):
+        liability.refresh_from_db()
+        self.assertEqual(
+            (liability.paid_total, liability.paid_principal, liability.paid_interest, liability.current_debt),
+            (Decimal(paid), Decimal(principal), Decimal(interest), Decimal('100000.00') - Decimal(principal))
+        )
+
+    def test_totals_follow_payments(self):
+        """Создание, изменение, перенос и удаление платежа через API"""
+        url = '/api/finance/liability-payments/'
+        data = {'liability': self.liability.id, 'amount': '3000.00', 'date': '2024-02-01',
+                'principal': '2000.00', 'interest': '1000.00'}
+        payment_id = self.client.post(url, data, format='json').data['id']
+        self.client.post(url, {**data, 'date': '2024-03-01'}, format='json')
+        self.assertTotals(self.liability, '6000.00', '4000.00', '2000.00')
+
+        self.client.patch(f'{url}{payment_id}/', {'amount': '3500.00', 'principal': '2500.00'}, format='json')
+        self.assertTotals(self.liability, '6500.00', '4500.00', '2000.00')
+
+        self.client.patch(f'{url}{payment_id}/', {'liability': self.other.id}, format='json')
+        self.assertTotals(self.liability, '3000.00', '2000.00', '1000.00')
+        self.assertTotals(self.other, '3500.00', '2500.00', '1000.00')
+
+        self.client.delete(f'{url}{payment_id}/')
+        self.assertTotals(self.other, '0.00', '0.00', '0.00')
+
+        response = self.client.get(f'/api/finance/liabilities/{self.liability.id}/')
+        self.assertEqual(response.data['paid_total'], '3000.00')
+
+    def test_stale_liability_save_keeps_totals(self):
+        """Сохранение пассива, загруженного до платежа, не затирает итоги"""
+        stale = Liability.objects.get(pk=self.liability.pk)
+        LiabilityPayment.objects.create(liability=self.liability, amount=Decimal('500.00'), date='2024-02-01',
+                                        principal=Decimal('400.00'), interest=Decimal('100.00'))
+        stale.name = 'Ипотека'
+        stale.current_debt = Decimal('99600.00')
+        stale.save()
+        self.assertTotals(self.liability, '500.00', '400.00', '100.00')
+        # Снимок — сумма задолженностей, как они записаны после сохранения
+        snapshot = NetWorthSnapshot.objects.get(scope_key=self.liability.scope_key)
+        self.assertEqual(snapshot.total_liabilities, sum(
+            Liability.objects.filter(scope_key=self.liability.scope_key).values_list('current_debt', flat=True)
+        ))
+
+    def test_queryset_delete_reverts_totals(self):
+        """Удаление платежей queryset'ом возвращает итоги, удаление пассива не вычитает их дважды"""
+        for day in ('2024-02-01', '2024-03-01'):
+            LiabilityPayment.objects.create(liability=self.liability, amount=Decimal('500.00'), date=day,
+                                            principal=Decimal('400.00'), interest=Decimal('100.00'))
+        LiabilityPayment.objects.filter(liability=self.liability, date='2024-02-01').delete()
+        self.assertTotals(self.liability, '500.00', '400.00', '100.00')
+        snapshot = NetWorthSnapshot.objects.get(scope_key=self.liability.scope_key)
+        self.assertEqual(snapshot.total_liabilities, Decimal('199600.00'))
+
+        Liability.objects.filter(pk=self.liability.pk).delete()
+        snapshot.refresh_from_db()
+        self.assertEqual(snapshot.total_liabilities, Decimal('100000.00'))
+
+    def test_verify_command(self):
+        """Команда сверки находит и исправляет расхождения"""
+        LiabilityPayment.objects.create(liability=self.liability, amount=Decimal('500.00'), date='2024-02-01',
+                                        principal=Decimal('400.00'), interest=Decimal('100.00'))
+        Liability.objects.filter(pk=self.liability.pk).update(paid_total=Decimal('0.00'))
+
+        out = StringIO()
+        call_command('verify_liability_totals', batch_size=1, stdout=out)
+        self.assertIn('расхождений: 1', out.getvalue())
+        call_command('verify_liability_totals', fix=True, stdout=out)
+        self.assertTotals(self.liability, '500.00', '400.00', '100.00')
+
+
+class AssetRevaluationTestCase(APITestCase):
+    """Тесты пакетной переоценки активов"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User',
+            middle_name='Test',
+            birth_date='1990-01-01',
+            phone='+79991234567'
+        )
+        self.other_user = User.objects.create_user(
+            username='other',
+            email='other@example.com',
+            password='testpass123',
+            first_name='Other',
+            last_name='User',
+            middle_name='Other',
+            birth_date='1990-01-01',
+            phone='+79991234568'
+        )
+        self.currency = Currency.objects.create(code='RUB', name='Российский рубль', symbol='₽', is_default=True)
+        self.asset_type = AssetType.objects.create(name='Недвижимость', is_base=True)
+        self.assets = [self.create_asset(self.user, '1000.00') for _ in range(3)]
+        self.foreign = self.create_asset(self.other_user, '500.00')
+        self.client.force_authenticate(user=self.user)
+
+    def create_asset(self, owner, value):
+        return Asset.objects.create(
+            name='Актив', type=self.asset_type, purchase_value=Decimal(value), purchase_currency=self.currency,
+            current_value=Decimal(value), current_currency=self.currency, owner=owner
+        )
+
+    def revalue(self, items):
+        return self.client.post('/api/finance/assets/revalue/', {'items': items}, format='json')
+
+    def test_revalue(self):
+        """Текущая стоимость, история, снимок и одна запись лога"""
+        first, second, _ = self.assets
+        today = date.today()
+        response = self.revalue([
+            {'asset': first.id, 'value': '1500.00', 'date': str(today)},
+            {'asset': first.id, 'value': '1200.00', 'date': str(today - timedelta(days=30))},
+            {'asset': second.id, 'value': '800.00'},
+            {'asset': second.id, 'value': '900.00'},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['history'], 3)
+        self.assertEqual([asset['id'] for asset in response.data['assets']], [first.id, second.id])
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.current_value, Decimal('1500.00'))
+        self.assertEqual(second.current_value, Decimal('900.00'))
+        self.assertEqual(
+            list(AssetValueHistory.objects.filter(asset=first, date__lt=today).values_list('value', 'amount_base')),
+            [(Decimal('1200.00'), Decimal('1200.00'))]
+        )
+        self.assertEqual(AssetValueHistory.objects.get(asset=second, date=today).value, Decimal('900.00'))
+
+        snapshot = NetWorthSnapshot.objects.get(scope_key=f'u:{self.user.id}', currency=self.currency, date=today)
+        self.assertEqual(snapshot.total_assets, Decimal('3400.00'))
+        self.assertEqual(FinanceLog.objects.filter(entity_type='Asset', action='revalue').count(), 1)
+
+        # Более старая оценка не меняет текущую стоимость
+        self.revalue([{'asset': first.id, 'value': '100.00', 'date': str(today - timedelta(days=10))}])
+        first.refresh_from_db()
+        self.assertEqual(first.current_value, Decimal('1500.00'))
+
+    def test_query_count_does_not_grow(self):
+        """Число запросов не зависит от числа активов"""
+        self.revalue([{'asset': self.assets[0].id, 'value': '1.00'}])
+        # Активы, история, активы, снимок, лог и точки сохранения
+        with self.assertNumQueries(9):
+            self.revalue([{'asset': self.assets[0].id, 'value': '2.00'}])
+        with self.assertNumQueries(9):
+            self.revalue([{'asset': asset.id, 'value': '3.00'} for asset in self.assets])
+
+    def test_foreign_asset_rejected(self):
+        """Чужой актив — ошибка, ничего не меняется"""
+        response = self.revalue([
+            {'asset': self.assets[0].id, 'value': '2000.00'},
+            {'asset': self.foreign.id, 'value': '2000.00'},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assets[0].refresh_from_db()
+        self.assertEqual(self.assets[0].current_value, Decimal('1000.00'))
+        self.assertFalse(AssetValueHistory.objects.filter(value=Decimal('2000.00')).exists())
+
+        response = self.revalue([{'asset': self.assets[0].id, 'value': '1.00', 'currency': 999999}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class OperationImportTestCase(APITestCase):
+    """Тесты импорта расходов и доходов из файла"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User',
+            middle_name='Test',
+            birth_date='1990-01-01',
+            phone='+79991234567'
+        )
+        self.family = NuclearFamily.objects.create(name='Семья', join_code='IMPORT01', join_password='secret')
+        FamilyMembership.objects.create(user=self.user, family=self.family, role='parent', status='active')
+        self.currency = Currency.objects.create(code='RUB', name='Российский рубль', symbol='₽', is_default=True)
+        self.usd = Currency.objects.create(code='USD', name='Доллар США', symbol='$')
+        self.category = Category.objects.create(name='Продукты', type='expense', owner=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, url, name, content, **data):
+        upload = SimpleUploadedFile(name, content.encode('utf-8'))
+        return self.client.post(url, {'file': upload, **data}, format='multipart')
+
+    def test_csv_import(self):
+        """CSV с ; и русскими датами; ошибочные строки пропускаются"""
+        content = (
+            'Name;Amount;Currency;Date;Category;Type\n'
+            'Магазин;1 250,50;rub;05.03.2024;продукты;\n'
+            'Подписка;10;USD;2024-03-07;;mandatory\n'
+            'Ошибка;abc;EUR;2024-13-01;Нет такой;\n'
+        )
+        response = self.upload('/api/finance/expenses/import/', 'bank.csv', content)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['errors'][0]['row'], 3)
+        self.assertEqual(set(response.data['errors'][0]['errors']), {'amount', 'currency', 'date', 'category'})
+
+        shop = Expense.objects.get(name='Магазин')
+        self.assertEqual((shop.amount, shop.amount_base, shop.date), (Decimal('1250.50'), Decimal('1250.50'), date(2024, 3, 5)))
+        self.assertEqual((shop.category_id, shop.type, shop.scope_key), (self.category.id, 'optional', f'u:{self.user.id}'))
+        # Курса USD нет — сумма в базовой валюте не посчитана
+        self.assertIsNone(Expense.objects.get(name='Подписка').amount_base)
+        self.assertEqual(FinanceLog.objects.filter(entity_type='Expense', action='import').count(), 1)
+        self.assertEqual(len(self.client.get('/api/finance/expenses/').data), 2)
+
+    def test_jsonl_family_import(self):
+        """JSON-строки доходов в семейную область"""
+        content = (
+            '{"name": "Зарплата", "amount": 100000, "currency": "RUB", "date": "2024-03-10", "type": "regular",'
+            ' "recurrence_type": "monthly"}\n'
+            '\n'
+            '[1, 2]\n'
+            '{"name": "Премия", "amount": "5000", "currency": %d, "date": "2024-03-20"}\n' % self.currency.id
+        )
+        response = self.upload('/api/finance/incomes/import/', 'incomes.jsonl', content, family=self.family.id)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['errors'], [{'row': 2, 'errors': {'row': 'Ожидается JSON-объект'}}])
+        self.assertEqual(
+            set(Income.objects.values_list('scope_key', 'recurrence_type')),
+            {(f'f:{self.family.id}', 'monthly'), (f'f:{self.family.id}', 'none')}
+        )
+
+        other = NuclearFamily.objects.create(name='Чужая', join_code='IMPORT02', join_password='secret')
+        response = self.upload('/api/finance/incomes/import/', 'incomes.jsonl', content, family=other.id)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_dry_run_and_query_count(self):
+        """Проверка без записи; число запросов не растёт с числом строк"""
+        lines = [f'Покупка {i},{i}.00,RUB,2024-03-01\n' for i in range(1, 51)]
+        rows = ''.join(lines)
+        response = self.upload('/api/finance/expenses/import/', 'bank.csv', 'name,amount,currency,date\n' + rows,
+                               dry_run='1')
+        self.assertEqual((response.status_code, response.data['created']), (status.HTTP_200_OK, 50))
+        self.assertFalse(Expense.objects.exists())
+
+        self.upload('/api/finance/expenses/import/', 'bank.csv', 'name,amount,currency,date\n' + ''.join(lines[:30]))
+        with self.assertNumQueries(6) as context:
+            self.upload('/api/finance/expenses/import/', 'bank.csv', 'name,amount,currency,date\n' + rows)
+        inserts = [query for query in context.captured_queries if query['sql'].startswith('INSERT INTO "expenses"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Expense.objects.count(), 80)
+
+    def test_cp1251(self):
+        """Файл в cp1251 определяется по началу; неверная кодировка — 400 без записанных строк"""
+        content = 'name;amount;currency;date;category\nМагазин;1250,50;RUB;05.03.2024;Продукты\n'.encode('cp1251')
+        url = '/api/finance/expenses/import/'
+        response = self.client.post(url, {'file': SimpleUploadedFile('bank.csv', content)}, format='multipart')
+        self.assertEqual((response.status_code, response.data['created']), (status.HTTP_201_CREATED, 1))
+        self.assertEqual(Expense.objects.get().category_id, self.category.id)
+
+        response = self.client.post(
+            url, {'file': SimpleUploadedFile('bank.csv', content), 'encoding': 'utf-8'}, format='multipart'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('file', response.data)
+        response = self.client.post(
+            url, {'file': SimpleUploadedFile('bank.csv', content), 'encoding': 'koi8-r'}, format='multipart'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Не UTF-8 только после первых пачек: они откатываются
+        rows = ''.join(f'Покупка {i},1.00,RUB,2024-03-01\n' for i in range(3000))
+        content = ('name,amount,currency,date\n' + rows).encode('utf-8') + 'Аптека,2.00,RUB,2024-03-02\n'.encode('cp1251')
+        response = self.client.post(url, {'file': SimpleUploadedFile('bank.csv', content)}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Expense.objects.count(), 1)
+
+    def test_command(self):
+        """Команда импорта из файла"""
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8', delete=False) as handle:
+            handle.write('name,amount,currency,date\nАптека,300,RUB,2024-04-01\nБез суммы,,RUB,2024-04-01\n')
+        out, err = StringIO(), StringIO()
+        call_command('import_operations', handle.name, user=self.user.username, stdout=out, stderr=err)
+        self.assertIn('Импортировано записей: 1, ошибок: 1', out.getvalue())
+        self.assertIn('Строка 2: amount', err.getvalue())
+        self.assertTrue(Expense.objects.filter(name='Аптека', owner=self.user).exists())
+
+
+class StatementImportTestCase(APITestCase):
+    """Тесты импорта банковских выписок с защитой от дублей"""
+
+    OFX = (
+        'OFXHEADER:100\nDATA:OFXSGML\n\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS>\n'
+        '<CURDEF>RUB\n<BANKTRANLIST>\n'
+        '<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240305120000<TRNAMT>-350.00<FITID>1<NAME>Кофейня<MEMO>Карта *1234</STMTTRN>\n'
+        '<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240305<TRNAMT>-350.00<FITID>2<NAME>Кофейня<MEMO>Карта *1234</STMTTRN>\n'
+        '<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240310<TRNAMT>100000.00<FITID>3<NAME>Зарплата</STMTTRN>\n'
+        '</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n'
+    )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User',
+            middle_name='Test',
+            birth_date='1990-01-01',
+            phone='+79991234567'
+        )
+        self.currency = Currency.objects.create(code='RUB', name='Российский рубль', symbol='₽', is_default=True)
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, name, content, **data):
+        upload = SimpleUploadedFile(name, content.encode('utf-8'))
+        return self.client.post('/api/finance/statements/import/', {'file': upload, **data}, format='multipart')
+
+    def test_ofx_reimport_skips_known(self):
+        """Одинаковые операции дня различаются, повторная загрузка ничего не дублирует"""
+        response = self.upload('march.ofx', self.OFX)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['expenses'], {'created': 2, 'skipped': 0})
+        self.assertEqual(response.data['incomes'], {'created': 1, 'skipped': 0})
+        self.assertEqual(Expense.objects.filter(name='Кофейня Карта *1234', amount=Decimal('350.00')).count(), 2)
+        self.assertEqual(Income.objects.get().amount, Decimal('100000.00'))
+        self.assertEqual(len(set(Expense.objects.values_list('fingerprint', flat=True))), 2)
+
+        response = self.upload('march.ofx', self.OFX)
+        self.assertEqual(response.data['expenses'], {'created': 0, 'skipped': 2})
+        self.assertEqual(response.data['incomes'], {'created': 0, 'skipped': 1})
+        self.assertEqual(Expense.objects.count(), 2)
+
+    def test_overlapping_qif_and_csv(self):
+        """Перекрывающиеся выписки в разных форматах дают одинаковые отпечатки"""
+        qif = '!Type:Bank\nD03/05/2024\nT-1,250.00\nPМагазин «Продукты»\n^\nD03/06/2024\nT-99.90\nPАптека\n^\n'
+        response = self.upload('feb-march.qif', qif, currency='rub')
+        self.assertEqual(response.data['expenses'], {'created': 2, 'skipped': 0})
+
+        csv_content = (
+            '"Дата операции";"Статус";"Сумма операции";"Валюта операции";"Описание"\n'
+            '"06.03.2024 10:15:00";"OK";"-99,90";"RUB";"аптека"\n'
+            '"07.03.2024 09:00:00";"OK";"-500,00";"RUB";"Такси"\n'
+            '"07.03.2024 09:05:00";"FAILED";"-500,00";"RUB";"Такси"\n'
+            '"08.03.2024 09:05:00";"OK";"abc";"RUB";"Ошибка"\n'
+        )
+        # Отпечаток строится по дате без времени и описанию без регистра
+        with self.assertNumQueries(8):
+            response = self.upload('march.csv', csv_content, profile='tinkoff')
+        self.assertEqual(response.data['expenses'], {'created': 1, 'skipped': 1})
+        self.assertEqual(response.data['errors'], [{'row': 3, 'errors': {'amount': 'Не удалось разобрать'}}])
+        self.assertEqual(
+            sorted(Expense.objects.values_list('name', 'amount')),
+            [('Аптека', Decimal('99.90')), ('Магазин «Продукты»', Decimal('1250.00')), ('Такси', Decimal('500.00'))]
+        )
+
+    def test_encodings(self):
+        """Выписки в cp1251 читаются во всех форматах, неверная кодировка — 400"""
+        qif = '!Type:Bank\nD03/05/2024\nT-99.90\nPАптека\n^\n'.encode('cp1251')
+        csv_content = '"Дата операции";"Сумма операции";"Валюта операции";"Описание"\n"07.03.2024";"-500,00";"RUB";"Такси"\n'
+        for name, content, data in (
+            ('march.ofx', self.OFX.encode('cp1251'), {}),
+            ('march.qif', qif, {}),
+            ('march.csv', csv_content.encode('cp1251'), {'profile': 'tinkoff'}),
+        ):
+            with self.subTest(name):
+                upload = SimpleUploadedFile(name, content)
+                response = self.client.post(
+                    '/api/finance/statements/import/', {'file': upload, 'encoding': 'utf-8', **data}, format='multipart'
+                )
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                upload = SimpleUploadedFile(name, content)
+                response = self.client.post('/api/finance/statements/import/', {'file': upload, **data}, format='multipart')
+                self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            sorted(Expense.objects.values_list('name', flat=True)), ['Аптека', 'Кофейня Карта *1234', 'Кофейня Карта *1234', 'Такси']
+        )
+
+    def test_dry_run_and_command(self):
+        """Проверка без записи и команда импорта"""
+        response = self.upload('march.ofx', self.OFX, dry_run='1')
+        self.assertEqual((response.status_code, response.data['expenses']['created']), (status.HTTP_200_OK, 2))
+        self.assertFalse(Expense.objects.exists())
+
+        with tempfile.NamedTemporaryFile('w', suffix='.ofx', encoding='utf-8', delete=False) as handle:
+            handle.write(self.OFX)
+        out = StringIO()
+        call_command('import_statement', handle.name, user=self.user.username, stdout=out)
+        call_command('import_statement', handle.name, user=self.user.username, stdout=out)
+        self.assertIn('Расходов: 0 (пропущено 2)', out.getvalue())
+        self.assertEqual(Expense.objects.count(), 2)
+
+
+class BulkOperationsTestCase(APITestCase):
+    """Тесты пакетного создания, изменения и удаления"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User',
+            middle_name='Test',
+            birth_date='1990-01-01',
+            phone='+79991234567'
+        )
+        self.other_user = User.objects.create_user(
+            username='other',
+            email='other@example.com',
+            password='testpass123',
+            first_name='Other',
+            last_name='User',
+            middle_name='Other',
+            birth_date='1990-01-01',
+            phone='+79991234568'
+        )
+        self.currency = Currency.objects.create(code='RUB', name='Российский рубль', symbol='₽', is_default=True)
+        self.asset_type = AssetType.objects.create(name='Недвижимость', is_base=True)
+        self.liability_type = LiabilityType.objects.create(name='Кредит', is_base=True)
+        self.family = NuclearFamily.objects.create(name='Семья', join_code='BULKCODE', join_password='hashed')
+        FamilyMembership.objects.create(user=self.user, family=self.family, role='parent', status='active')
+        self.client.force_authenticate(user=self.user)
+
+    def expense_payload(self, number, **extra):
+        return {'name': f'Расход {number}', 'amount': f'{number}.00', 'currency': self.currency.id,
+                'date': '2024-01-15', 'type': 'optional', **extra}
+
+    def snapshot_total(self, field):
+        snapshot = NetWorthSnapshot.objects.get(scope_key=f'u:{self.user.id}', currency=self.currency, date=date.today())
+        return getattr(snapshot, field)
+
+    def test_create_many(self):
+        """Создание списка: владелец, область, сумма в базовой валюте и одна запись лога"""
+        response = self.client.post('/api/finance/expenses/bulk/', [
+            self.expense_payload(1), self.expense_payload(2, is_family=True, family=self.family.id)
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 2)
+        personal, family = Expense.objects.order_by('id')
+        self.assertEqual((personal.owner_id, personal.scope_key), (self.user.id, f'u:{self.user.id}'))
+        self.assertEqual((family.owner_id, family.scope_key), (None, f'f:{self.family.id}'))
+        self.assertEqual(personal.amount_base, Decimal('1.00'))
+        self.assertEqual(FinanceLog.objects.filter(entity_type='Expense', action='bulk_create').count(), 1)
+
+    def test_create_many_validation(self):
+        """Ошибка в одном элементе или чужая семья — ничего не создаётся"""
+        response = self.client.post('/api/finance/expenses/bulk/', [
+            self.expense_payload(1), {'name': 'Без суммы'}
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        foreign_family = NuclearFamily.objects.create(name='Чужая', join_code='OTHERCODE', join_password='hashed')
+        response = self.client.post('/api/finance/expenses/bulk/', [
+            self.expense_payload(1), self.expense_payload(2, is_family=True, family=foreign_family.id)
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Expense.objects.exists())
+
+    def test_update_many(self):
+        """Частичное изменение по id с пересчётом суммы в базовой валюте"""
+        self.client.post('/api/finance/expenses/bulk/', [self.expense_payload(n) for n in (1, 2, 3)], format='json')
+        first, second, third = Expense.objects.order_by('id')
+        response = self.client.patch('/api/finance/expenses/bulk/', [
+            {'id': first.id, 'amount': '10.00'}, {'id': second.id, 'name': 'Новое имя'}
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.amount, first.amount_base), (Decimal('10.00'), Decimal('10.00')))
+        self.assertEqual(second.name, 'Новое имя')
+        log = FinanceLog.objects.get(entity_type='Expense', action='bulk_update')
+        self.assertEqual([item['id'] for item in log.data_before], [first.id, second.id])
+
+        # Поля владельца пакетно не меняются, ошибка в элементе отменяет весь пакет
+        response = self.client.patch('/api/finance/expenses/bulk/', [{'id': third.id, 'is_family': True}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.patch('/api/finance/expenses/bulk/', [
+            {'id': third.id, 'amount': '5.00'}, {'id': first.id, 'amount': 'abc'}
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        third.refresh_from_db()
+        self.assertEqual(third.amount, Decimal('3.00'))
+
+    def test_foreign_ids_rejected(self):
+        """Чужие объекты не меняются и не удаляются"""
+        foreign = Expense.objects.create(
+            name='Чужой', amount=Decimal('1.00'), currency=self.currency, date=date(2024, 1, 1), owner=self.other_user
+        )
+        own = Expense.objects.create(
+            name='Свой', amount=Decimal('1.00'), currency=self.currency, date=date(2024, 1, 1), owner=self.user
+        )
+        response = self.client.patch('/api/finance/expenses/bulk/', [{'id': foreign.id, 'amount': '9.00'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.delete('/api/finance/expenses/bulk/', {'ids': [own.id, foreign.id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Expense.objects.count(), 2)
+
+        response = self.client.delete('/api/finance/expenses/bulk/', {'ids': [own.id]}, format='json')
+        self.assertEqual(response.data, {'deleted': 1})
+        self.assertEqual(list(Expense.objects.values_list('id', flat=True)), [foreign.id])
+        self.assertEqual(FinanceLog.objects.filter(entity_type='Expense', action='bulk_delete').count(), 1)
+
+    def test_query_count_does_not_grow(self):
+        """Число запросов не зависит от размера пакета"""
+        self.client.post('/api/finance/expenses/bulk/', [self.expense_payload(1)], format='json')
+        counts = []
+        for size in (1, 10):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post('/api/finance/expenses/bulk/', [self.expense_payload(n) for n in range(size)], format='json')
+            counts.append(len(queries))
+        ids = list(Expense.objects.values_list('id', flat=True))
+        for chunk in (ids[:1], ids[1:]):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.delete('/api/finance/expenses/bulk/', {'ids': chunk}, format='json')
+            counts.append(len(queries))
+        # Валидация каждого элемента проверяет валюту отдельным запросом
+        self.assertEqual(counts[1] - counts[0], 9)
+        self.assertEqual(counts[2], counts[3])
+
+    def test_net_worth_items(self):
+        """Снимок сходится с пересчётом после пакетных операций с активами и пассивами"""
+        response = self.client.post('/api/finance/assets/bulk/', [
+            {'name': f'Актив {n}', 'type': self.asset_type.id, 'purchase_value': '100.00',
+             'purchase_currency': self.currency.id, 'current_value': '100.00', 'current_currency': self.currency.id}
+            for n in range(3)
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        assets = list(Asset.objects.order_by('id'))
+        self.assertEqual(self.snapshot_total('total_assets'), Decimal('300.00'))
+        self.assertEqual(AssetValueHistory.objects.filter(asset__in=assets, date=date.today()).count(), 3)
+
+        self.client.patch('/api/finance/assets/bulk/', [{'id': assets[0].id, 'current_value': '250.00'}], format='json')
+        self.assertEqual(self.snapshot_total('total_assets'), Decimal('450.00'))
+        self.assertEqual(AssetValueHistory.objects.get(asset=assets[0], date=date.today()).value, Decimal('250.00'))
+        self.client.delete('/api/finance/assets/bulk/', {'ids': [assets[0].id, assets[1].id]}, format='json')
+        self.assertEqual(self.snapshot_total('total_assets'), Decimal('100.00'))
+
+        liability = Liability.objects.create(
+            name='Кредит', type=self.liability_type, initial_amount=Decimal('1000.00'),
+            current_debt=Decimal('1000.00'), currency=self.currency, open_date=date(2024, 1, 1), owner=self.user
+        )
+        LiabilityPayment.objects.create(
+            liability=liability, date=date(2024, 2, 1), amount=Decimal('300.00'),
+            principal=Decimal('300.00'), interest=Decimal('0.00')
+        )
+        self.assertEqual(self.snapshot_total('total_liabilities'), Decimal('700.00'))
+        response = self.client.delete('/api/finance/liabilities/bulk/', {'ids': [liability.id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(LiabilityPayment.objects.exists())
+        self.assertEqual(self.snapshot_total('total_liabilities'), Decimal('0.00'))
+
+        expected = calculate_net_worth_by_scope()[(f'u:{self.user.id}', self.currency.id)]
+        self.assertEqual(self.snapshot_total('total_assets'), expected['total_assets'])
+
+
+@override_settings(FINANCE_LOG_BUFFER_SIZE=3, FINANCE_LOG_FLUSH_INTERVAL=0)
+class FinanceLogWriterTestCase(APITestCase):
+    """Тесты буферизованной записи журнала"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User',
+            middle_name='Test',
+            birth_date='1990-01-01',
+            phone='+79991234567'
+        )
+        self.currency = Currency.objects.create(code='RUB', name='Российский рубль', symbol='₽', is_default=True)
+        self.client.force_authenticate(user=self.user)
+        self.writer = FinanceLogWriter()
+
+    def write(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.writer.write(**{'entity_type': 'Expense', 'entity_id': 1, 'action': 'create',
+                                        'user': self.user, **fields})
+
+    def test_flush_by_size(self):
+        """Записи копятся до порога и пишутся одним запросом с датой действия"""
+        first = self.write()
+        self.write()
+        self.assertFalse(FinanceLog.objects.exists())
+        with self.assertNumQueries(3):
+            self.write()
+        self.assertEqual(FinanceLog.objects.count(), 3)
+        self.assertEqual(FinanceLog.objects.order_by('id').first().date, first.date)
+        self.assertEqual(self.writer.flush(), 0)
+
+    def test_rolled_back_not_logged(self):
+        """Запись из откаченной транзакции не попадает в буфер"""
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.writer.write(entity_type='Expense', entity_id=1, action='create', user=self.user)
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual(self.writer.flush(), 0)
+
+    def test_fallback_saves_valid_entries(self):
+        """Ошибка пакета — записи сохраняются по одной, ошибочная пропускается"""
+        self.write()
+        self.write(entity_type='x' * 100)
+        with self.assertLogs('finance.logwriter', level='ERROR'):
+            self.write()
+        self.assertEqual(FinanceLog.objects.count(), 2)
+
+    @override_settings(FINANCE_LOG_BUFFER_SIZE=0)
+    def test_synchronous_mode(self):
+        """Без буфера запись сохраняется сразу"""
+        self.writer.write(entity_type='Expense', entity_id=1, action='create', user=self.user)
+        self.assertEqual(FinanceLog.objects.count(), 1)
+
+    def test_update_logs_loaded_instance(self):
+        """Изменение логирует прежние значения без повторной загрузки объекта"""
+        expense = Expense.objects.create(
+            name='Обед', amount=Decimal('100.00'), currency=self.currency, date=date(2024, 1, 1), owner=self.user
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/finance/expenses/{expense.id}/', {'amount': '150.00'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(FinanceLog.objects.exists())
+        log_writer.flush()
+        log = FinanceLog.objects.get(action='update')
+        self.assertEqual(log.changes['amount'], ['100.00', '150.00'])
+
+
+@override_settings(FINANCE_LOG_STORAGE='diff')
+class AuditLogStorageTestCase(APITestCase):
+    """Тесты хранения журнала изменениями, чтения истории и архивации"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User',
+            middle_name='Test',
+            birth_date='1990-01-01',
+            phone='+79991234567'
+        )
+        self.currency = Currency.objects.create(code='RUB', name='Российский рубль', symbol='₽', is_default=True)
+        self.client.force_authenticate(user=self.user)
+
+    def make_history(self):
+        """Расход создаётся, дважды меняется; второй расход создаётся и удаляется"""
+        payload = {'name': 'Обед', 'amount': '100.00', 'currency': self.currency.id, 'date': '2024-01-01',
+                   'type': 'optional'}
+        expense_id = self.client.post('/api/finance/expenses/', payload, format='json').data['id']
+        self.client.patch(f'/api/finance/expenses/{expense_id}/', {'amount': '150.00'}, format='json')
+        self.client.patch(f'/api/finance/expenses/{expense_id}/', {'name': 'Ужин'}, format='json')
+        deleted_id = self.client.post('/api/finance/expenses/', payload, format='json').data['id']
+        self.client.delete(f'/api/finance/expenses/{deleted_id}/')
+        return expense_id, deleted_id
+
+    def test_diff_storage(self):
+        """Создание и удаление — сжатый снимок, изменение — только изменённые поля"""
+        expense_id, deleted_id = self.make_history()
+        create, first, second = FinanceLog.objects.filter(entity_id=expense_id).order_by('id')
+        self.assertIsNone(create.data_after)
+        self.assertEqual(unpack_snapshot(create.snapshot)['amount'], '100.00')
+        self.assertIsNone(first.data_before)
+        self.assertEqual(first.changes['amount'], ['100.00', '150.00'])
+        self.assertNotIn('name', first.changes)
+
+        history = get_entity_history('Expense', expense_id)
+        self.assertEqual([version['action'] for version in history], ['create', 'update', 'update'])
+        self.assertEqual((history[-1]['state']['name'], history[-1]['state']['amount']), ('Ужин', '150.00'))
+        self.assertEqual(get_entity_state('Expense', expense_id, at=first.date)['name'], 'Обед')
+        deleted = get_entity_history('Expense', deleted_id)
+        self.assertIsNone(deleted[-1]['state'])
+        self.assertEqual(deleted[-1]['changes']['name'], ['Обед', None])
+
+    @override_settings(FINANCE_LOG_STORAGE='full')
+    def test_full_storage_readable(self):
+        """Записи с полными данными читаются тем же читателем"""
+        expense_id, _ = self.make_history()
+        self.assertIsNotNone(FinanceLog.objects.filter(entity_id=expense_id, action='update').first().data_before)
+        history = get_entity_history('Expense', expense_id)
+        self.assertEqual(history[1]['changes']['amount'], ['100.00', '150.00'])
+        self.assertEqual(history[-1]['state']['name'], 'Ужин')
+
+    def test_archive(self):
+        """Старые записи уходят в файлы, в таблице остаётся контрольный снимок"""
+        expense_id, deleted_id = self.make_history()
+        before = get_entity_history('Expense', expense_id)
+        last_update = FinanceLog.objects.filter(entity_id=expense_id).order_by('-id').first()
+        old = timezone.now() - timedelta(days=400)
+        FinanceLog.objects.exclude(pk=last_update.pk).update(date=old)
+        FinanceLog.objects.filter(pk=last_update.pk).update(date=timezone.now())
+
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('archive_finance_logs', '--days', '30', '--dir', directory, stdout=StringIO())
+            self.assertEqual(
+                list(FinanceLog.objects.filter(entity_id=expense_id).order_by('date', 'id').values_list('action', flat=True)),
+                ['snapshot', 'update']
+            )
+            self.assertFalse(FinanceLog.objects.filter(entity_id=deleted_id).exists())
+            # Без архива — последнее состояние, с архивом — вся история
+            self.assertEqual(get_entity_history('Expense', expense_id)[-1]['state'], before[-1]['state'])
+            archived = get_entity_history('Expense', expense_id, archive_dir=directory)
+            self.assertEqual([version['state'] for version in archived], [version['state'] for version in before])
+            self.assertEqual(len(get_entity_history('Expense', deleted_id, archive_dir=directory)), 2)
+
+            # Повторная архивация переносит и снимок, история не меняется
+            FinanceLog.objects.all().update(date=old)
+            call_command('archive_finance_logs', '--days', '30', '--dir', directory, stdout=StringIO())
+            self.assertEqual(list(FinanceLog.objects.values_list('action', flat=True)), ['snapshot'])
+            archived = get_entity_history('Expense', expense_id, archive_dir=directory)
+            self.assertEqual([version['state'] for version in archived], [version['state'] for version in before])
+
+
+class FinanceLogHistoryTestCase(APITestCase):
+    """Тесты журнала изменений: область видимости, фильтры и курсоры"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User',
+            middle_name='Test',
+            birth_date='1990-01-01',
+            phone='+79991234567'
+        )
+        self.relative = User.objects.create_user(
+            username='relative',
+            email='relative@example.com',
+            password='testpass123',
+            first_name='Relative',
+            last_name='User',
+            middle_name='Relative',
+            birth_date='1990-01-01',
+            phone='+79991234568'
+        )
+        self.stranger = User.objects.create_user(
+            username='stranger',
+            email='stranger@example.com',
+            password='testpass123',
+            first_name='Stranger',
+            last_name='User',
+            middle_name='Stranger',
+            birth_date='1990-01-01',
+            phone='+79991234569'
+        )
+        self.family = NuclearFamily.objects.create(name='Семья', join_code='LOGCODE', join_password='hashed')
+        for user in (self.user, self.relative):
+            FamilyMembership.objects.create(user=user, family=self.family, role='parent', status='active')
+        self.currency = Currency.objects.create(code='RUB', name='Российский рубль', symbol='₽', is_default=True)
+
+        # Семейный расход создаёт один член семьи, меняет другой
+        self.client.force_authenticate(user=self.relative)
+        self.expense_id = self.client.post('/api/finance/expenses/', {
+            'name': 'Продукты', 'amount': '100.00', 'currency': self.currency.id, 'date': '2024-01-01',
+            'type': 'optional', 'is_family': True, 'family': self.family.id
+        }, format='json').data['id']
+        self.client.force_authenticate(user=self.user)
+        for amount in ('110.00', '120.00', '130.00'):
+            self.client.patch(f'/api/finance/expenses/{self.expense_id}/', {'amount': amount}, format='json')
+        self.client.patch(f'/api/finance/expenses/{self.expense_id}/', {'name': 'Рынок'}, format='json')
+
+    def history(self, **params):
+        return self.client.get('/api/finance/finance-logs/', params)
+
+    def test_entity_timeline(self):
+        """История объекта видна членам семьи, новые записи первыми"""
+        response = self.history(entity_type='Expense', entity_id=self.expense_id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        actions = [entry['action'] for entry in response.data['results']]
+        self.assertEqual(actions, ['update'] * 4 + ['create'])
+        self.assertEqual(response.data['results'][-1]['data_after']['name'], 'Продукты')
+        self.assertEqual(response.data['results'][-1]['scope_key'], f'f:{self.family.id}')
+
+        self.client.force_authenticate(user=self.stranger)
+        self.assertEqual(self.history(entity_type='Expense', entity_id=self.expense_id).data['results'], [])
+
+    def test_filters(self):
+        """Пользователь, период, действие и изменённое поле"""
+        self.assertEqual(len(self.history(user='me').data['results']), 4)
+        self.assertEqual(len(self.history(user=self.relative.id, action='create').data['results']), 1)
+        self.assertEqual(len(self.history(field='name').data['results']), 1)
+        self.assertEqual(len(self.history(field='amount').data['results']), 3)
+        today = date.today()
+        self.assertEqual(len(self.history(date_from=str(today), date_to=str(today)).data['results']), 5)
+        self.assertEqual(self.history(date_to=str(today - timedelta(days=1))).data['results'], [])
+        self.assertEqual(self.history(entity_type='Expense').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.history(user='x').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_scope_filter(self):
+        """?scope= оставляет только записи выбранной области, без прочих действий пользователя"""
+        self.client.post('/api/finance/expenses/', {
+            'name': 'Обед', 'amount': '100.00', 'currency': self.currency.id, 'date': '2024-01-01', 'type': 'optional'
+        }, format='json')
+        family_scope = {entry['scope_key'] for entry in self.history(scope=f'family:{self.family.id}').data['results']}
+        self.assertEqual(family_scope, {f'f:{self.family.id}'})
+        personal = self.history(scope='personal').data['results']
+        self.assertEqual([(entry['action'], entry['scope_key']) for entry in personal], [('create', f'u:{self.user.id}')])
+        self.assertEqual(len(self.history().data['results']), 6)
+
+    def test_cursor_pagination(self):
+        """Страницы по курсору без пропусков и повторов"""
+        response = self.history(limit=2)
+        ids = [entry['id'] for entry in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            ids += [entry['id'] for entry in response.data['results']]
+        self.assertEqual(ids, list(FinanceLog.objects.order_by('-date', '-id').values_list('id', flat=True)))
+
+    def test_read_only(self):
+        """Журнал нельзя изменить через API"""
+        entry = FinanceLog.objects.first()
+        self.assertEqual(self.client.delete(f'/api/finance/finance-logs/{entry.id}/').status_code,
+                         status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.assertEqual(self.client.post('/api/finance/finance-logs/', {}).status_code,
+                         status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class ExpensePaymentSummaryTestCase(APITestCase):
+    """Тесты списка расходов с оплатами и сводкой оплат"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User',
+            middle_name='Test',
+            birth_date='1990-01-01',
+            phone='+79991234567'
+        )
+        self.currency = Currency.objects.create(code='RUB', name='Российский рубль', symbol='₽', is_default=True)
+        self.client.force_authenticate(user=self.user)
+        self.today = date.today()
+        self.monthly = self.create_expense('monthly')
+        self.weekly = self.create_expense('weekly')
+        self.single = self.create_expense('none')
+        self.pay(self.monthly, self.today, '100.00')
+        self.pay(self.monthly, self.today - timedelta(days=70), '90.00')
+        self.pay(self.weekly, self.today - timedelta(days=14), '10.00')
+
+    def create_expense(self, recurrence_type):
+        return Expense.objects.create(
+            name=recurrence_type, amount=Decimal('100.00'), currency=self.currency, date=date(2024, 1, 1),
+            type='mandatory', recurrence_type=recurrence_type, owner=self.user
+        )
+
+    def pay(self, expense, day, amount):
+        payment = ExpensePayment.objects.create(expense=expense, amount=Decimal(amount))
+        ExpensePayment.objects.filter(pk=payment.pk).update(paid_date=day)
+
+    def test_full_payments_prefetched(self):
+        """Вложенные оплаты читаются одним запросом на весь список"""
+        self.client.get('/api/finance/expenses/')
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/finance/expenses/')
+        payments = {row['id']: row['payments'] for row in response.data}
+        self.assertEqual(len(payments[self.monthly.id]), 2)
+        self.assertEqual(payments[self.single.id], [])
+
+    def test_summary(self):
+        """Сводка: сумма, последняя дата и оплата текущего периода"""
+        self.client.get('/api/finance/expenses/')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/finance/expenses/', {'payments': 'summary'})
+        rows = {row['id']: row for row in response.data}
+        self.assertNotIn('payments', rows[self.monthly.id])
+        self.assertEqual(rows[self.monthly.id]['paid_total'], '190.00')
+        self.assertEqual(rows[self.monthly.id]['last_paid_date'], str(self.today))
+        self.assertTrue(rows[self.monthly.id]['paid_for_current_period'])
+        self.assertFalse(rows[self.weekly.id]['paid_for_current_period'])
+        self.assertEqual(
+            (rows[self.single.id]['paid_total'], rows[self.single.id]['last_paid_date'],
+             rows[self.single.id]['paid_for_current_period']),
+            ('0.00', None, False)
+        )
+
+        # Период считается для даты ?on=
+        response = self.client.get('/api/finance/expenses/', {'payments': 'summary', 'on': str(self.today - timedelta(days=14))})
+        rows = {row['id']: row for row in response.data}
+        self.assertTrue(rows[self.weekly.id]['paid_for_current_period'])
+
+        response = self.client.get(f'/api/finance/expenses/{self.monthly.id}/', {'payments': 'summary'})
+        self.assertEqual(response.data['paid_total'], '190.00')
+        self.assertEqual(self.client.get('/api/finance/expenses/', {'payments': 'x'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+
+class ValuesReadTestCase(APITestCase):
+    """Тесты быстрого чтения списков из .values(): ответ совпадает с сериализатором байт в байт"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User',
+            middle_name='Test',
+            birth_date='1990-01-01',
+            phone='+79991234567'
+        )
+        self.currency = Currency.objects.create(code='RUB', name='Российский рубль', symbol='₽', is_default=True)
+        self.client.force_authenticate(user=self.user)
+        parent = Category.objects.create(name='Дом', type='expense', owner=self.user)
+        self.category = Category.objects.create(name='Ремонт', type='expense', parent=parent, owner=self.user)
+        asset_type = AssetType.objects.create(name='Недвижимость', is_base=True)
+        self.asset = Asset.objects.create(
+            name='Квартира', type=asset_type, category=None, purchase_value=Decimal('5000000.10'),
+            purchase_currency=self.currency, current_value=Decimal('6000000'), current_currency=self.currency,
+            owner=self.user
+        )
+        Fund.objects.create(
+            name='Отпуск', goal=Decimal('300000.00'), current_value=Decimal('0.5'), currency=self.currency,
+            owner=self.user
+        )
+        Liability.objects.create(
+            name='Ипотека', type=LiabilityType.objects.create(name='Кредит', is_base=True),
+            initial_amount=Decimal('5000000.00'), currency=self.currency, open_date='2024-01-01',
+            current_debt=Decimal('4500000.00'), interest_rate=Decimal('7.5'), owner=self.user
+        )
+        Income.objects.create(
+            name='Аренда «с кавычками»', amount=Decimal('50000.00'), currency=self.currency, date='2024-06-01',
+            asset=self.asset, owner=self.user
+        )
+        self.expenses = [
+            Expense.objects.create(
+                name=f'Расход {i}', amount=Decimal('1500.5') + i, currency=self.currency, date=date(2024, 6, i + 1),
+                category=self.category if i % 2 else None, type='mandatory', recurrence_type='monthly',
+                owner=self.user
+            )
+            for i in range(5)
+        ]
+        for expense in self.expenses[:2]:
+            for day in (date(2024, 7, 1), date(2024, 6, 1)):
+                payment = ExpensePayment.objects.create(expense=expense, amount=Decimal('10'))
+                ExpensePayment.objects.filter(pk=payment.pk).update(paid_date=day)
+
+    def render(self, serializer_class, queryset):
+        return JSONRenderer().render(serializer_class(queryset, many=True).data)
+
+    def test_lists_identical(self):
+        """Списки всех областей совпадают с выводом ModelSerializer"""
+        cases = [
+            ('categories', CategorySerializer, Category.objects.all()),
+            ('assets', AssetSerializer, Asset.objects.all()),
+            ('funds', FundSerializer, Fund.objects.all()),
+            ('liabilities', LiabilitySerializer, Liability.objects.all()),
+            ('incomes', IncomeSerializer, Income.objects.all()),
+            ('expenses', ExpenseSerializer, Expense.objects.prefetch_related(
+                Prefetch('payments', queryset=ExpensePayment.objects.order_by('pk'))
+            )),
+        ]
+        for path, serializer_class, queryset in cases:
+            with self.subTest(path=path):
+                ids = [row['id'] for row in self.client.get(f'/api/finance/{path}/').data]
+                expected = self.render(serializer_class, sorted(queryset, key=lambda item: ids.index(item.pk)))
+                self.assertEqual(self.client.get(f'/api/finance/{path}/', HTTP_ACCEPT='application/json').content, expected)
+
+    def test_summary_and_retrieve_identical(self):
+        """Сводка оплат (аннотации) и один объект — тоже байт в байт"""
+        response = self.client.get('/api/finance/expenses/', {'payments': 'summary', 'limit': 2, 'offset': 1})
+        expenses = Expense.objects.with_payment_summary().order_by('-date', '-id')[1:3]
+        self.assertEqual(
+            JSONRenderer().render(response.data['results']), self.render(ExpenseSummarySerializer, expenses)
+        )
+        expense = Expense.objects.prefetch_related('payments').get(pk=self.expenses[0].pk)
+        response = self.client.get(f'/api/finance/expenses/{expense.pk}/')
+        self.assertEqual(response.content, JSONRenderer().render(ExpenseSerializer(expense).data))
+        self.assertEqual(self.client.get('/api/finance/expenses/0/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_pagination(self):
+        """Keyset-курсор строится по строкам .values()"""
+        first = self.client.get('/api/finance/expenses/', {'cursor': '', 'limit': 3}).data
+        second = self.client.get(first['next']).data
+        self.assertEqual(
+            [row['id'] for row in first['results'] + second['results']],
+            [expense.pk for expense in sorted(self.expenses, key=lambda item: item.date, reverse=True)]
+        )
+
+    def test_queries_and_fallback(self):
+        """Расходы с оплатами — два запроса; сериализатор с вычисляемым полем читается обычным путём"""
+        self.client.get('/api/finance/expenses/')
+        with self.assertNumQueries(2):
+            self.client.get('/api/finance/expenses/')
+        self.assertIsNotNone(get_values_plan(ExpenseSerializer, Expense.objects.all()))
+        self.assertIsNone(get_values_plan(FinanceLogSerializer, FinanceLog.objects.all()))
+
+    def test_plan_cache_bounded(self):
+        """Произвольные ?fields= не растят кэш планов сверх MAX_PLANS"""
+        self.addCleanup(setattr, fastread, 'MAX_PLANS', fastread.MAX_PLANS)
+        fastread.MAX_PLANS = 3
+        for i in range(5):
+            response = self.client.get('/api/finance/expenses/', {'fields': f'id,junk{i}'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLessEqual(len(fastread._plans), 3)
+
+
+class ResponseFormatTestCase(APITestCase):
+    """Тесты выбора формата ответа и потоковой выдачи списков"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User',
+            middle_name='Test',
+            birth_date='1990-01-01',
+            phone='+79991234567'
+        )
+        self.currency = Currency.objects.create(code='RUB', name='Российский рубль', symbol='₽', is_default=True)
+        self.client.force_authenticate(user=self.user)
+        for i in range(5):
+            expense = Expense.objects.create(
+                name=f'Расход {i}', amount=Decimal('100.10') * (i + 1), currency=self.currency,
+                date=date(2024, 6, i + 1), type='mandatory', owner=self.user
+            )
+            ExpensePayment.objects.create(expense=expense, amount=Decimal('10'))
+
+    def test_ndjson_stream(self):
+        """Список без пагинации отдаётся потоком: строка на расход, пачками"""
+        expected = self.client.get('/api/finance/expenses/').json()
+        response = self.client.get('/api/finance/expenses/', HTTP_ACCEPT='application/x-ndjson')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(line) for line in lines], expected)
+
+    def test_ndjson_chunks(self):
+        """Пачки stream_chunk_size с вложенными оплатами"""
+        self.addCleanup(setattr, ExpenseViewSet, 'stream_chunk_size', ExpenseViewSet.stream_chunk_size)
+        ExpenseViewSet.stream_chunk_size = 2
+        chunks = list(self.client.get('/api/finance/expenses/', {'format': 'ndjson'}).streaming_content)
+        self.assertEqual([chunk.count(b'\n') for chunk in chunks], [2, 2, 1])
+        self.assertTrue(all(json.loads(line)['payments'] for line in b''.join(chunks).splitlines()))
+
+    def test_paginated_and_dashboard(self):
+        """Страница — одна строка NDJSON; Decimal дашборда в JSON — строкой"""
+        response = self.client.get('/api/finance/expenses/', {'format': 'ndjson', 'limit': 2})
+        self.assertFalse(response.streaming)
+        self.assertEqual(len(json.loads(response.content)['results']), 2)
+        response = self.client.get('/api/finance/dashboard/summary/')
+        self.assertIsInstance(response.json()['net_worth'], str)
+
+    def test_msgpack_negotiation(self):
+        """MessagePack выбирается по Accept, без библиотеки — 406"""
+        self.assertIn(MessagePackRenderer, api_settings.DEFAULT_RENDERER_CLASSES)
+        self.assertTrue(MessagePackRenderer.available, 'msgpack не установлен (requirements.txt)')
+        response = self.client.get('/api/finance/expenses/', HTTP_ACCEPT='application/msgpack')
+        import msgpack
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), self.client.get('/api/finance/expenses/').json())
+
+        self.addCleanup(setattr, MessagePackRenderer, 'available', True)
+        MessagePackRenderer.available = False
+        response = self.client.get('/api/finance/expenses/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_406_NOT_ACCEPTABLE)
+
+
+class SparseFieldsTestCase(APITestCase):
+    """Тесты ?fields= и ?expand= в финансовых списках"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User',
+            middle_name='Test',
+            birth_date='1990-01-01',
+            phone='+79991234567'
+        )
+        self.currency = Currency.objects.create(code='RUB', name='Российский рубль', symbol='₽', is_default=True)
+        self.client.force_authenticate(user=self.user)
+        for i in range(3):
+            expense = Expense.objects.create(
+                name=f'Расход {i}', amount=Decimal('100.00'), currency=self.currency, date=date(2024, 6, i + 1),
+                type='mandatory', owner=self.user
+            )
+            ExpensePayment.objects.create(expense=expense, amount=Decimal('10.50'))
+
+    def test_fields(self):
+        """Только выбранные поля, в том числе вложенные; ответ как у сериализатора с тем же выбором"""
+        response = self.client.get('/api/finance/expenses/', {'fields': 'id,name,payments.amount'})
+        self.assertEqual(set(response.data[0]), {'id', 'name', 'payments'})
+        self.assertEqual(response.data[0]['payments'], [{'amount': '10.50'}])
+        expected = ExpenseSerializer(
+            Expense.objects.all(), many=True, fields=('id', 'name', 'payments.amount')
+        ).data
+        self.assertEqual(json.loads(response.content), json.loads(JSONRenderer().render(expected)))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/finance/expenses/', {'fields': 'id,name'})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"amount"', queries[0]['sql'])
+
+    def test_expand(self):
+        """Связь из expandable_fields — вложенным объектом, одним запросом на список"""
+        self.client.get('/api/finance/expenses/', {'expand': 'currency'})
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/finance/expenses/', {'expand': 'currency', 'fields': 'id,currency,payments'})
+        self.assertEqual(response.data[0]['currency']['code'], 'RUB')
+        response = self.client.get('/api/finance/expenses/', {'expand': 'currency,owner', 'fields': 'currency.code,owner'})
+        self.assertEqual(response.data[0], {'currency': {'code': 'RUB'}, 'owner': self.user.id})
+
+    def test_foreign_asset_not_expanded(self):
+        """Чужой актив нельзя указать в расходе, а старая ссылка на него в ?expand= остаётся id"""
+        other = User.objects.create_user(
+            username='other', email='other@example.com', password='testpass123', first_name='Other',
+            last_name='User', middle_name='Test', birth_date='1990-01-01', phone='+79991234568'
+        )
+        asset_type = AssetType.objects.create(name='Вклад', is_base=True)
+        own, foreign = [
+            Asset.objects.create(
+                name=name, type=asset_type, purchase_value=Decimal('1000.00'), purchase_currency=self.currency,
+                current_value=Decimal('1000.00'), current_currency=self.currency, owner=owner
+            )
+            for name, owner in (('Свой', self.user), ('Чужой', other))
+        ]
+        expense = Expense.objects.order_by('id').first()
+        response = self.client.patch(f'/api/finance/expenses/{expense.pk}/', {'asset': foreign.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('asset', response.data)
+        response = self.client.patch(f'/api/finance/expenses/{expense.pk}/', {'asset': own.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        Expense.objects.exclude(pk=expense.pk).update(asset=foreign)
+        response = self.client.get('/api/finance/expenses/', {'expand': 'asset', 'fields': 'id,asset'})
+        assets = {item['id']: item['asset'] for item in response.data}
+        self.assertEqual(assets[expense.pk]['name'], 'Свой')
+        self.assertEqual({assets[pk] for pk in assets if pk != expense.pk}, {foreign.id})
+
+    def test_write_ignores_selection(self):
+        """На запись выбор полей не действует: поля не теряются"""
+        expense = Expense.objects.first()
+        response = self.client.patch(
+            f'/api/finance/expenses/{expense.pk}/?fields=id', {'amount': '250.00'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['amount'], '250.00')
+        expense.refresh_from_db()
+        self.assertEqual(expense.amount, Decimal('250.00'))
+
+
+class ConditionalGetTestCase(APITestCase):
+    """Тесты условного GET (ETag) для списков и объектов"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User',
+            middle_name='Test',
+            birth_date='1990-01-01',
+            phone='+79991234567'
+        )
+        self.currency = Currency.objects.create(code='RUB', name='Российский рубль', symbol='₽', is_default=True)
+        self.category = Category.objects.create(name='Продукты', type='expense', owner=self.user)
+        self.client.force_authenticate(user=self.user)
+        self.expenses = [
+            Expense.objects.create(
+                name=f'Расход {i}', amount=Decimal('100.00'), currency=self.currency, date=date(2024, 6, i + 1),
+                type='mandatory', category=self.category, owner=self.user
+            )
+            for i in range(3)
+        ]
+
+    def get_etag(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response['ETag']
+
+    def test_not_modified(self):
+        """Совпавший If-None-Match — 304 одним агрегатным запросом, без сериализации"""
+        response = self.client.get('/api/finance/expenses/')
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/finance/expenses/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        self.assertIn('ETag', response)
+        # Валидатор только из БД: другой процесс с пустым кэшем отвечает так же
+        cache.clear()
+        response = self.client.get('/api/finance/expenses/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        # Параметры и формат ответа — другой валидатор
+        etag = response['ETag']
+        self.assertNotEqual(self.get_etag('/api/finance/expenses/', payments='summary'), etag)
+        self.assertNotEqual(self.get_etag('/api/finance/expenses/', format='ndjson'), etag)
+
+    def test_changes_invalidate(self):
+        """Создание, изменение, удаление и оплата меняют валидатор"""
+        url = '/api/finance/expenses/'
+        etags = [self.get_etag(url)]
+        self.client.post(url, {'name': 'Новый', 'amount': '5.00', 'currency': self.currency.id,
+                               'date': '2024-07-01', 'type': 'optional'}, format='json')
+        etags.append(self.get_etag(url))
+        self.client.patch(f'{url}{self.expenses[0].pk}/', {'amount': '7.00'}, format='json')
+        etags.append(self.get_etag(url))
+        self.client.post(f'{url}{self.expenses[1].pk}/pay/', {'paid_date': '2024-06-02'}, format='json')
+        etags.append(self.get_etag(url))
+        self.client.delete(f'{url}{self.expenses[2].pk}/')
+        etags.append(self.get_etag(url))
+        self.client.delete(f'{url}bulk/', {'ids': [self.expenses[0].pk]}, format='json')
+        etags.append(self.get_etag(url))
+        self.assertEqual(len(set(etags)), len(etags))
+
+    def test_delete_without_count_change(self):
+        """Удаление категории обнуляет её в расходах и сдвигает их updated_at — валидатор меняется"""
+        etag = self.get_etag('/api/finance/expenses/')
+        self.category.delete()
+        response = self.client.get('/api/finance/expenses/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data[0]['category'])
+
+    def test_payment_and_recompute(self):
+        """Изменение оплаты и пересчёт amount_base сдвигают updated_at расхода"""
+        url = f'/api/finance/expenses/{self.expenses[0].pk}/'
+        etag = self.get_etag(url)
+        payment = ExpensePayment.objects.create(expense=self.expenses[0], amount=Decimal('100.00'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+        etag = self.get_etag(url)
+        payment.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+        etag = self.get_etag(url)
+        recompute_base_amounts(self.currency.id, models=[Expense])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_page(self):
+        """Страница: 304 по id и updated_at её строк, изменение строки страницы меняет валидатор"""
+        url = '/api/finance/expenses/'
+        # Без If-None-Match — без лишних запросов: count, строки и оплаты
+        self.get_etag(url, limit=2)
+        with self.assertNumQueries(3):
+            etag = self.get_etag(url, limit=2)
+        # С If-None-Match — count и id, updated_at строк страницы
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'limit': 2}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        first = self.client.get(url, {'limit': 2}).data['results'][0]['id']
+        self.client.patch(f'{url}{first}/', {'name': 'Изменён'}, format='json')
+        response = self.client.get(url, {'limit': 2}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], self.get_etag(url, limit=2))
+
+    def test_detail(self):
+        """Объект: 304 по своему валидатору, несуществующий — 404"""
+        url = f'/api/finance/expenses/{self.expenses[0].pk}/'
+        etag = self.get_etag(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.client.patch(url, {'name': 'Изменён'}, format='json')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get('/api/finance/expenses/0/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get('/api/finance/expenses/abc/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_reference_data(self):
+        """Справочники: валидатор по количеству и max(updated_at)"""
+        etag = self.get_etag('/api/finance/currencies/')
+        response = self.client.get('/api/finance/currencies/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.currency.symbol = 'р.'
+        self.currency.save()
+        response = self.client.get('/api/finance/currencies/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
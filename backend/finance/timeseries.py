@@ -0,0 +1,74 @@
+import math
+from decimal import Decimal
+
+from django.db import models
+
+
+class DayBucket(models.Func):
+    """
+    Номер корзины даты: (date - start) / size. В PostgreSQL разность дат —
+    целое число дней, деление целочисленное
+    """
+    arg_joiner = ' - '
+    template = '((%(expressions)s) / %(size)s)'
+    output_field = models.IntegerField()
+
+    def __init__(self, expression, start, size, **extra):
+        super().__init__(expression, models.Value(start, output_field=models.DateField()), size=int(size), **extra)
+
+
+def get_bucket_size(date_from, date_to, points):
+    """Ширина корзины в днях, чтобы на период пришлось не больше points точек"""
+    days = (date_to - date_from).days + 1
+    return max(1, math.ceil(days / max(points, 1)))
+
+
+def lttb(points, threshold):
+    """
+    Largest-Triangle-Three-Buckets: оставить threshold точек [(date, value)],
+    сохраняя форму ряда. Первая и последняя точки сохраняются всегда.
+    """
+    if threshold >= len(points) or threshold < 3:
+        return list(points)
+    xs = [point[0].toordinal() for point in points]
+    ys = [float(point[1]) for point in points]
+    sampled = [points[0]]
+    every = (len(points) - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Среднее следующей корзины — третья вершина треугольника
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, len(points))
+        count = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / count
+        avg_y = sum(ys[next_start:next_end]) / count
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((xs[a] - avg_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (avg_y - ys[a]))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+    sampled.append(points[-1])
+    return sampled
+
+
+def carry_forward_total(series, start_values=None):
+    """
+    Сумма нескольких разреженных рядов {key: [(date, value)]} по объединению
+    дат: значение каждого ряда держится до его следующей точки
+    """
+    current = dict(start_values or {})
+    by_date = {}
+    for key, points in series.items():
+        for day, value in points:
+            by_date.setdefault(day, []).append((key, value))
+    total = []
+    for day in sorted(by_date):
+        for key, value in by_date[day]:
+            current[key] = value
+        total.append((day, sum(current.values(), Decimal('0.00'))))
+    return total
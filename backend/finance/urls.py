@@ -18,6 +18,7 @@ router.register(r'expenses', views.ExpenseViewSet, basename='expense')
 router.register(r'finance-logs', views.FinanceLogViewSet, basename='financelog')
 router.register(r'financial-goals', views.FinancialGoalViewSet, basename='financialgoal')
 router.register(r'budget-plans', views.BudgetPlanViewSet, basename='budgetplan')
+router.register(r'statements', views.StatementViewSet, basename='statement')
 router.register(r'dashboard', views.DashboardViewSet, basename='dashboard')
 
 urlpatterns = router.urls 
\ No newline at end of file
@@ -1,39 +1,67 @@
 from django.shortcuts import render
 from rest_framework import viewsets, permissions
+from .pagination import FinancePagination, HistoryPagination
+from .fastread import get_values_plan
+from .timeseries import DayBucket, carry_forward_total, get_bucket_size, lttb
+from .amortization import build_liability_schedules
+from .importer import ENCODINGS, FORMATS, OperationImporter, guess_format, iter_rows
+from .statements import CSV_PROFILES, STATEMENT_FORMATS, StatementImporter, guess_statement_format, parse_statement
+from .recurrence import add_months, expand, mark_expense_payments, recurring_in_window
 from .models import (
-    Category, Currency, CurrencyRate, AssetType, Asset, AssetValueHistory, AssetShare, Fund,
+    BaseAmountMixin, NetWorthMixin, Category, Currency, CurrencyRate, AssetType, Asset, AssetValueHistory, AssetShare, Fund,
     LiabilityType, Liability, LiabilityPayment, Income, Expense, FinanceLog, FinancialGoal, BudgetPlan, ExpensePayment
 )
 from .serializers import (
     CategorySerializer, CurrencySerializer, CurrencyRateSerializer, AssetTypeSerializer, AssetSerializer,
-    AssetValueHistorySerializer, AssetShareSerializer, FundSerializer, LiabilityTypeSerializer, LiabilitySerializer,
-    LiabilityPaymentSerializer, IncomeSerializer, ExpenseSerializer, FinanceLogSerializer, FinancialGoalSerializer, BudgetPlanSerializer, ExpensePaymentSerializer
+    AssetValueHistorySerializer, AssetRevaluationSerializer, AssetShareSerializer, FundSerializer, LiabilityTypeSerializer, LiabilitySerializer,
+    LiabilityPaymentSerializer, IncomeSerializer, ExpenseSerializer, ExpenseSummarySerializer, FinanceLogSerializer, FinancialGoalSerializer, BudgetPlanSerializer, ExpensePaymentSerializer
 )
-from nucfamily.models import FamilyMembership
-from django.db import models
+from common.access import get_access_scope, make_scope_key
+from common.conditional import ConditionalGetMixin
+from common.fieldsets import SparseFieldsViewMixin
+from .currency import converter, fill_base_amounts, get_base_currency_id, recompute_base_amounts
+from .logwriter import log_writer
+from .networth import apply_net_worth_changes, get_net_worth_totals, get_net_worth_history
+from django.db import models, transaction
+from django.db.models import prefetch_related_objects
+from django.db.models.deletion import Collector
+from django.http import StreamingHttpResponse
+from itertools import islice
 from rest_framework import serializers
 import json
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 from django.db.models import Sum, Count
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
 from decimal import Decimal
+from datetime import datetime, time, timedelta
 from rest_framework import status
 
 # Create your views here.
 
-class FamilyUserQuerysetMixin:
+class AccessScopeMixin:
+    """
+    Миксин для выбора областей видимости по параметру ?scope=personal|family:<id>
+    """
+    def get_scope_keys(self):
+        requested = self.request.query_params.get('scope')
+        try:
+            return get_access_scope(self.request.user).resolve_scope_keys(requested)
+        except ValueError:
+            raise serializers.ValidationError({'scope': f'Область видимости недоступна: {requested}'})
+
+    def get_scope_q(self):
+        return models.Q(scope_key__in=self.get_scope_keys())
+
+class FamilyUserQuerysetMixin(AccessScopeMixin):
     """
     Миксин для фильтрации объектов по owner (user) и family (где пользователь член семьи)
     """
     def get_queryset(self):
-        user = self.request.user
-        # Получаем id семей, где пользователь активный член
-        family_ids = FamilyMembership.objects.filter(user=user, status='active').values_list('family_id', flat=True)
-        # Фильтруем: либо owner=user, либо family в family_ids
-        return self.queryset.filter(
-            models.Q(owner=user) |
-            models.Q(family__in=family_ids, is_family=True)
-        ).distinct()
+        # Фильтруем по денормализованному ключу: личная область и области семей пользователя
+        return self.queryset.filter(self.get_scope_q())
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -41,34 +69,92 @@ class FamilyUserQuerysetMixin:
         is_family = self.request.data.get('is_family', False)
         if is_family and family:
             # Проверяем, что пользователь член этой семьи
-            if not FamilyMembership.objects.filter(user=user, family_id=family, status='active').exists():
+            if not get_access_scope(user).is_member(family):
                 raise serializers.ValidationError('Вы не являетесь членом выбранной семьи')
-            serializer.save(owner=None, family_id=family, is_family=True)
+            serializer.save(owner=None, family_id=family, is_family=True,
+                            scope_key=make_scope_key(family_id=family, is_family=True))
         else:
-            serializer.save(owner=user, family=None, is_family=False)
+            serializer.save(owner=user, family=None, is_family=False,
+                            scope_key=make_scope_key(owner_id=user.pk))
+
+class DateRangeMixin:
+    """
+    Миксин для разбора периода ?date_from=&date_to=
+    """
+    def get_date_params(self):
+        """Параметры ?date_from=&date_to= (даты или None)"""
+        params = self.request.query_params
+        dates = {}
+        for name in ('date_from', 'date_to'):
+            try:
+                dates[name] = serializers.DateField().to_internal_value(params[name]) if params.get(name) else None
+            except serializers.ValidationError as exc:
+                raise serializers.ValidationError({name: exc.detail})
+        return dates
+
+class ParentScopeMixin(AccessScopeMixin):
+    """
+    Миксин для дочерних объектов без своей области видимости (платежи, история
+    стоимости): они видны и создаются по области родителя scope_parent_field
+    """
+    scope_parent_field = None
+    scope_parent_error = 'Нет доступа к выбранному объекту'
+
+    def get_queryset(self):
+        return self.queryset.filter(**{f'{self.scope_parent_field}__scope_key__in': self.get_scope_keys()})
+
+    def perform_create(self, serializer):
+        self.check_parent(serializer.validated_data[self.scope_parent_field])
+        serializer.save()
+
+    def perform_update(self, serializer):
+        if self.scope_parent_field in serializer.validated_data:
+            self.check_parent(serializer.validated_data[self.scope_parent_field])
+        serializer.save()
+
+    def check_parent(self, parent):
+        if parent.scope_key not in get_access_scope(self.request.user).scope_keys:
+            raise serializers.ValidationError(self.scope_parent_error)
 
 class LoggableViewSetMixin:
     """
     Миксин для автоматического логирования изменений в FinanceLog
     """
     def log_action(self, action, instance, data_before=None, data_after=None, entity_id=None):
-        FinanceLog.objects.create(
+        log_writer.write(
             entity_type=instance.__class__.__name__,
             entity_id=entity_id if entity_id is not None else instance.pk,
             action=action,
             user=self.request.user,
             data_before=data_before,
-            data_after=data_after
+            data_after=data_after,
+            scope_key=getattr(instance, 'scope_key', '')
         )
 
+    def log_batch(self, action, data_before=None, data_after=None, scope_key=''):
+        """Одна запись лога на пакетную операцию (entity_id = 0)"""
+        log_writer.write(
+            entity_type=self.queryset.model.__name__,
+            entity_id=0,
+            action=action,
+            user=self.request.user,
+            data_before=data_before,
+            data_after=data_after,
+            scope_key=scope_key
+        )
+
+    def get_batch_scope_key(self, instances):
+        """Область пакета, если все объекты из одной области, иначе ''"""
+        keys = {instance.scope_key for instance in instances}
+        return keys.pop() if len(keys) == 1 else ''
+
     def perform_create(self, serializer):
         super().perform_create(serializer)
         self.log_action('create', serializer.instance, data_before=None, data_after=serializer.data)
 
     def perform_update(self, serializer):
-        # Получаем данные до изменений
-        instance = self.get_object()
-        data_before = self.get_serializer(instance).data
+        # Объект уже загружен в update(), до save() в нём прежние значения
+        data_before = self.get_serializer(serializer.instance).data
         super().perform_update(serializer)
         self.log_action('update', serializer.instance, data_before=data_before, data_after=serializer.data)
 
@@ -78,70 +164,706 @@ class LoggableViewSetMixin:
         super().perform_destroy(instance)
         self.log_action('delete', instance, data_before=data_before, data_after=None, entity_id=entity_id)
 
-class CategoryViewSet(LoggableViewSetMixin, FamilyUserQuerysetMixin, viewsets.ModelViewSet):
+class ValuesReadMixin:
+    """
+    Быстрое чтение list/retrieve: строки .values() проходят через
+    заранее построенный план полей сериализатора (finance.fastread) без
+    создания объектов модели. Ответ совпадает с обычным сериализатором
+    байт в байт; сериализаторы с вычисляемыми полями читаются обычным путём.
+    Список без пагинации для потокового рендерера (NDJSONRenderer) отдаётся
+    потоком, без сборки всех строк в памяти.
+    """
+    values_read = True
+    stream_chunk_size = 2000
+
+    def get_values_plan(self, queryset):
+        if not self.values_read:
+            return None
+        return get_values_plan(self.get_serializer_class(), queryset, self.get_field_selection())
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        plan = self.get_values_plan(queryset)
+        if plan is None:
+            page = self.paginate_queryset(queryset)
+            rows = queryset if page is None else page
+            data = self.get_serializer(rows, many=True).data
+        else:
+            # Поля упорядочивания нужны keyset-пагинации для курсора
+            ordering = [field.lstrip('-') for field in getattr(self, 'pagination_ordering', None) or ()]
+            queryset = plan.values(queryset, extra=ordering)
+            page = self.paginate_queryset(queryset)
+            if page is None and getattr(request.accepted_renderer, 'streaming', False):
+                return self.stream_list(plan, queryset)
+            data = plan.render(queryset if page is None else page)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def stream_list(self, plan, queryset):
+        """Весь список потоком: строки читаются и рендерятся пачками по stream_chunk_size"""
+        rows = queryset.iterator(chunk_size=self.stream_chunk_size)
+        chunks = iter(lambda: plan.render(islice(rows, self.stream_chunk_size)), [])
+        renderer = self.request.accepted_renderer
+        return StreamingHttpResponse(renderer.stream(chunks), content_type=renderer.media_type)
+
+    def retrieve(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        plan = self.get_values_plan(queryset)
+        if plan is None:
+            return super().retrieve(request, *args, **kwargs)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(plan.values(queryset), **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(request, row)
+        return Response(plan.render([row])[0])
+
+class BulkMixin:
+    """
+    Пакетные операции одним запросом на .../bulk/:
+    POST — создать список объектов, PATCH — частично изменить объекты
+    [{"id": 1, ...}], DELETE — удалить {"ids": [...]}.
+    Доступ проверяется один раз на пакет, всё выполняется в одной транзакции
+    через bulk_create/bulk_update и одно удаление; в лог пишется одна запись.
+    bulk_create/bulk_update не вызывают save() и сигналы, поэтому scope_key,
+    amount_base и снимки чистого капитала обновляются здесь пачкой.
+    """
+    bulk_max_size = 500
+    # Перенос между областями видимости — только по одному объекту
+    bulk_readonly_fields = ('owner', 'family', 'is_family')
+    bulk_prefetch_related = ()
+
+    @action(detail=False, methods=['post', 'patch', 'delete'])
+    def bulk(self, request):
+        handlers = {'POST': self.create_many, 'PATCH': self.update_many, 'DELETE': self.delete_many}
+        return handlers[request.method](request)
+
+    def create_many(self, request):
+        serializer = self.get_serializer(
+            data=request.data, many=True, allow_empty=False, max_length=self.bulk_max_size
+        )
+        serializer.is_valid(raise_exception=True)
+        model = self.queryset.model
+        scope = get_access_scope(request.user)
+        instances = []
+        for item in serializer.validated_data:
+            family = item.pop('family', None)
+            is_family = item.pop('is_family', False)
+            item.pop('owner', None)
+            if is_family and family:
+                if not scope.is_member(family.pk):
+                    raise serializers.ValidationError('Вы не являетесь членом выбранной семьи')
+                instance = model(owner=None, family=family, is_family=True, **item)
+            else:
+                instance = model(owner=request.user, family=None, is_family=False, **item)
+            instance.refresh_scope_key()
+            instances.append(instance)
+
+        with transaction.atomic():
+            if issubclass(model, BaseAmountMixin):
+                fill_base_amounts(instances)
+            model.objects.bulk_create(instances)
+            self.after_bulk_save(instances, fields=None)
+            if issubclass(model, NetWorthMixin):
+                apply_net_worth_changes(instances)
+            data = self.get_bulk_data(instances)
+            self.log_batch('bulk_create', data_after=data, scope_key=self.get_batch_scope_key(instances))
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    def update_many(self, request):
+        items = self.get_bulk_list(request.data)
+        ids = []
+        for position, item in enumerate(items):
+            if not isinstance(item, dict) or not isinstance(item.get('id'), int):
+                raise serializers.ValidationError({'items': f'Элемент {position}: нужен объект с числовым id'})
+            readonly = sorted(set(item) & set(self.bulk_readonly_fields))
+            if readonly:
+                raise serializers.ValidationError({'items': f'Элемент {position}: поля {", ".join(readonly)} пакетно не меняются'})
+            ids.append(item['id'])
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError({'items': 'id в пакете повторяются'})
+
+        model = self.queryset.model
+        with transaction.atomic():
+            instances = self.get_bulk_instances(ids)
+            data_before = self.get_bulk_data(instances.values())
+            fields = set()
+            errors = []
+            for item in items:
+                instance = instances[item['id']]
+                serializer = self.get_serializer(instance, data={k: v for k, v in item.items() if k != 'id'}, partial=True)
+                if not serializer.is_valid():
+                    errors.append({'id': item['id'], 'errors': serializer.errors})
+                    continue
+                for attr, value in serializer.validated_data.items():
+                    setattr(instance, attr, value)
+                fields.update(serializer.validated_data)
+            if errors:
+                raise serializers.ValidationError({'items': errors})
+
+            instances = list(instances.values())
+            if issubclass(model, BaseAmountMixin) and fields & {model.amount_field, 'currency', 'date'}:
+                fill_base_amounts(instances)
+                fields.add('amount_base')
+            for field in model._meta.concrete_fields:
+                if getattr(field, 'auto_now', False):
+                    for instance in instances:
+                        field.pre_save(instance, add=False)
+                    fields.add(field.name)
+            model.objects.bulk_update(instances, sorted(fields))
+            self.after_bulk_save(instances, fields=fields)
+            if issubclass(model, NetWorthMixin):
+                apply_net_worth_changes(instances)
+            data = self.get_bulk_data(instances)
+            self.log_batch(
+                'bulk_update', data_before=data_before, data_after=data,
+                scope_key=self.get_batch_scope_key(instances)
+            )
+        return Response(data)
+
+    def delete_many(self, request):
+        ids = serializers.ListField(
+            child=serializers.IntegerField(), allow_empty=False, max_length=self.bulk_max_size
+        )
+        try:
+            ids = ids.run_validation(request.data.get('ids') if isinstance(request.data, dict) else None)
+        except serializers.ValidationError as exc:
+            raise serializers.ValidationError({'ids': exc.detail})
+
+        model = self.queryset.model
+        with transaction.atomic():
+            instances = list(self.get_bulk_instances(set(ids)).values())
+            data_before = self.get_bulk_data(instances)
+            if issubclass(model, NetWorthMixin):
+                apply_net_worth_changes(instances, deleted=True)
+            # Одно удаление пачкой; origin — не платёж, поэтому каскадно удаляемые
+            # платежи пассивов не меняют итоги удаляемого пассива
+            queryset = self.get_queryset()
+            collector = Collector(using=queryset.db, origin=queryset)
+            collector.collect(instances)
+            collector.delete()
+            self.log_batch('bulk_delete', data_before=data_before, scope_key=self.get_batch_scope_key(instances))
+        return Response({'deleted': len(instances)})
+
+    def get_bulk_list(self, data):
+        if not isinstance(data, list) or not data:
+            raise serializers.ValidationError({'items': 'Ожидается непустой список объектов'})
+        if len(data) > self.bulk_max_size:
+            raise serializers.ValidationError({'items': f'Не больше {self.bulk_max_size} объектов за запрос'})
+        return data
+
+    def get_bulk_instances(self, ids):
+        """Объекты пакета одним запросом с блокировкой; недоступные id — ошибка"""
+        instances = {obj.pk: obj for obj in self.get_queryset().filter(pk__in=ids).select_for_update()}
+        missing = set(ids) - set(instances)
+        if missing:
+            raise serializers.ValidationError({'ids': f'Объекты не найдены: {sorted(missing)}'})
+        return instances
+
+    def get_bulk_data(self, instances):
+        instances = sorted(instances, key=lambda instance: instance.pk)
+        prefetch_related_objects(instances, *self.bulk_prefetch_related)
+        return self.get_serializer(instances, many=True).data
+
+    def after_bulk_save(self, instances, fields):
+        """Действия после bulk_create (fields=None) и bulk_update, которые делал бы save()"""
+
+class CategoryViewSet(ConditionalGetMixin, ValuesReadMixin, BulkMixin, LoggableViewSetMixin, FamilyUserQuerysetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FinancePagination
+    pagination_ordering = ('name', 'id')
 
-class CurrencyViewSet(viewsets.ModelViewSet):
+class CurrencyViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Currency.objects.all()
     serializer_class = CurrencySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FinancePagination
+    pagination_ordering = ('code', 'id')
 
-class CurrencyRateViewSet(viewsets.ModelViewSet):
+class CurrencyRateViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = CurrencyRate.objects.all()
     serializer_class = CurrencyRateSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FinancePagination
+    pagination_ordering = ('-date', '-id')
 
-class AssetTypeViewSet(viewsets.ModelViewSet):
+class AssetTypeViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = AssetType.objects.all()
     serializer_class = AssetTypeSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FinancePagination
+    pagination_ordering = ('name', 'id')
 
-class AssetViewSet(LoggableViewSetMixin, FamilyUserQuerysetMixin, viewsets.ModelViewSet):
+class AssetViewSet(ConditionalGetMixin, ValuesReadMixin, BulkMixin, LoggableViewSetMixin, FamilyUserQuerysetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Asset.objects.all()
     serializer_class = AssetSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FinancePagination
+    pagination_ordering = ('-created_at', '-id')
+
+    @action(detail=False, methods=['post'])
+    def revalue(self, request):
+        """
+        Переоценка многих активов одним запросом:
+        {"items": [{"asset": id, "value": "...", "currency": id, "date": "YYYY-MM-DD"}]}.
+        История стоимости записывается на каждую дату (повтор даты перезаписывает
+        оценку), текущая стоимость актива — по самой поздней оценке, если она
+        не старше уже сохранённой. Всё в одной транзакции с одной записью лога.
+        """
+        serializer = AssetRevaluationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        today = timezone.localdate()
+        # Повтор (актив, дата) в запросе — побеждает последний
+        items = {}
+        for item in serializer.validated_data['items']:
+            items[(item['asset'], item.get('date') or today)] = item
+
+        currency_ids = {item['currency'] for item in items.values() if 'currency' in item}
+        unknown = currency_ids - set(Currency.objects.filter(id__in=currency_ids).values_list('id', flat=True))
+        if unknown:
+            raise serializers.ValidationError({'items': f'Валюты не найдены: {sorted(unknown)}'})
+
+        with transaction.atomic():
+            asset_ids = {asset_id for asset_id, _ in items}
+            assets = {asset.id: asset for asset in self.get_queryset().filter(id__in=asset_ids).select_for_update()}
+            if asset_ids - set(assets):
+                raise serializers.ValidationError({'items': f'Нет доступа к активам: {sorted(asset_ids - set(assets))}'})
+            data_before = {asset.id: self.get_revaluation_state(asset) for asset in assets.values()}
+
+            history = [
+                AssetValueHistory(
+                    asset_id=asset_id, date=day, value=item['value'],
+                    currency_id=item.get('currency', assets[asset_id].current_currency_id)
+                )
+                for (asset_id, day), item in sorted(items.items())
+            ]
+            self.save_value_history(history)
+
+            # Строки отсортированы по дате, поэтому последняя оценка актива идёт последней
+            changed = {}
+            now = timezone.now()
+            for row in history:
+                asset = assets[row.asset_id]
+                if asset.last_valuation_date and row.date < asset.last_valuation_date:
+                    continue
+                asset.current_value = row.value
+                asset.current_currency_id = row.currency_id
+                asset.last_valuation_date = row.date
+                asset.updated_at = now
+                changed[asset.id] = asset
+            Asset.objects.bulk_update(
+                changed.values(), ['current_value', 'current_currency', 'last_valuation_date', 'updated_at']
+            )
+            # bulk_update не вызывает сигналы — изменения снимков применяются здесь
+            apply_net_worth_changes(changed.values())
+
+            self.log_batch(
+                'revalue',
+                data_before={str(asset_id): data_before[asset_id] for asset_id in changed},
+                data_after={
+                    'assets': {str(asset.id): self.get_revaluation_state(asset) for asset in changed.values()},
+                    'history': [
+                        {'asset': row.asset_id, 'date': row.date.isoformat(), 'value': str(row.value),
+                         'currency': row.currency_id}
+                        for row in history
+                    ],
+                },
+                scope_key=self.get_batch_scope_key(changed.values())
+            )
+
+        return Response({
+            'history': len(history),
+            'assets': self.get_serializer(sorted(changed.values(), key=lambda asset: asset.id), many=True).data,
+        })
+
+    def after_bulk_save(self, assets, fields):
+        # Как AssetSerializer.create/update: оценка на дату последней оценки попадает в историю
+        self.save_value_history([
+            AssetValueHistory(asset=asset, date=asset.last_valuation_date, value=asset.current_value,
+                              currency_id=asset.current_currency_id)
+            for asset in assets
+        ])
+
+    def save_value_history(self, history):
+        """Записать оценки пачкой; оценка на уже занятую дату перезаписывается"""
+        fill_base_amounts(history)
+        AssetValueHistory.objects.bulk_create(
+            history, update_conflicts=True, unique_fields=['asset', 'date'],
+            update_fields=['value', 'currency', 'amount_base']
+        )
+
+    def get_revaluation_state(self, asset):
+        return {
+            'current_value': str(asset.current_value),
+            'current_currency': asset.current_currency_id,
+            'last_valuation_date': asset.last_valuation_date.isoformat() if asset.last_valuation_date else None,
+        }
 
-class AssetValueHistoryViewSet(viewsets.ModelViewSet):
+class AssetValueHistoryViewSet(DateRangeMixin, ParentScopeMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = AssetValueHistory.objects.all()
     serializer_class = AssetValueHistorySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FinancePagination
+    pagination_ordering = ('-date', '-id')
+    scope_parent_field = 'asset'
+    scope_parent_error = 'Нет доступа к выбранному активу'
+    default_points = 200
+    max_points = 2000
+
+    @action(detail=False, methods=['get'])
+    def series(self, request):
+        """
+        Ряды стоимости активов для графика: ?assets=1,2&date_from=&date_to=&points=&method=last|lttb.
+        Каждый ряд прореживается до points точек на сервере; total — сумма
+        активов в базовой валюте с переносом последнего значения вперёд.
+        method=last (по умолчанию) выбирает последнее значение в каждой корзине
+        дат прямо в БД (DISTINCT ON по индексу (asset_id, date)), поэтому из базы
+        читается не больше points строк на актив; method=lttb читает весь период
+        и сохраняет форму ряда (Largest-Triangle-Three-Buckets).
+        """
+        params = request.query_params
+        history = self.get_queryset()
+        if params.get('assets'):
+            try:
+                asset_ids = [int(value) for value in params['assets'].split(',') if value]
+            except ValueError:
+                raise serializers.ValidationError({'assets': 'Ожидается список id через запятую'})
+            history = history.filter(asset_id__in=asset_ids)
+        try:
+            points = min(int(params.get('points', self.default_points)), self.max_points)
+        except ValueError:
+            raise serializers.ValidationError({'points': 'Ожидается целое число'})
+        if points < 2:
+            raise serializers.ValidationError({'points': 'Нужно не меньше 2 точек'})
+        method = params.get('method', 'last')
+        if method not in ('last', 'lttb'):
+            raise serializers.ValidationError({'method': 'Допустимо last или lttb'})
+
+        dates = self.get_date_params()
+        date_to = dates['date_to'] or timezone.localdate()
+        date_from = dates['date_from'] or history.aggregate(first=models.Min('date'))['first'] or date_to
+        if date_from > date_to:
+            raise serializers.ValidationError({'date_from': 'Начало периода позже конца'})
+
+        # Значения на начало периода — чтобы итог не проседал до первой точки актива
+        start = {
+            asset_id: amount
+            for asset_id, amount in history.filter(date__lt=date_from).order_by('asset_id', '-date').distinct(
+                'asset_id'
+            ).values_list('asset_id', Coalesce('amount_base', 'value'))
+        }
+        in_range = history.filter(date__gte=date_from, date__lte=date_to)
+        columns = ('asset_id', 'currency_id', 'date', 'value', 'amount_base')
+        if method == 'last':
+            size = get_bucket_size(date_from, date_to, points)
+            rows = in_range.annotate(bucket=DayBucket('date', date_from, size)).order_by(
+                'asset_id', 'bucket', '-date'
+            ).distinct('asset_id', 'bucket').values_list(*columns, 'bucket')
+        else:
+            rows = in_range.order_by('asset_id', 'date').values_list(*columns)
+
+        series = {}
+        base_series = {}
+        unconverted = 0
+        for asset_id, currency_id, day, value, amount_base, *_ in rows:
+            item = series.setdefault(asset_id, {'asset': asset_id, 'currency': currency_id, 'points': []})
+            item['points'].append((day, value))
+            if amount_base is None:
+                unconverted += 1
+            base_series.setdefault(asset_id, []).append((day, value if amount_base is None else amount_base))
+
+        total = carry_forward_total(base_series, start)
+        if method == 'lttb':
+            for item in series.values():
+                item['points'] = lttb(item['points'], points)
+            total = lttb(total, points)
+        elif len(total) > points:
+            # Даты корзин разных активов не совпадают — итог прореживаем так же
+            total = [
+                group[-1] for group in self.group_by_bucket(total, date_from, get_bucket_size(date_from, date_to, points))
+            ]
+
+        def as_points(values):
+            return [{'date': day, 'value': value} for day, value in values]
 
-class AssetShareViewSet(viewsets.ModelViewSet):
+        return Response({
+            'date_from': date_from,
+            'date_to': date_to,
+            'method': method,
+            'currency': get_base_currency_id(),
+            'series': [{**item, 'points': as_points(item['points'])} for item in series.values()],
+            'total': as_points(total),
+            'warnings': [{
+                'type': 'missing_rates',
+                'message': 'Часть оценок без курса учтена в итоге без пересчёта',
+                'count': unconverted
+            }] if unconverted else []
+        })
+
+    def group_by_bucket(self, values, date_from, size):
+        groups = {}
+        for day, value in values:
+            groups.setdefault((day - date_from).days // size, []).append((day, value))
+        return [groups[key] for key in sorted(groups)]
+
+class AssetShareViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = AssetShare.objects.all()
     serializer_class = AssetShareSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FinancePagination
+    pagination_ordering = ('-valid_from', '-id')
 
-class FundViewSet(LoggableViewSetMixin, FamilyUserQuerysetMixin, viewsets.ModelViewSet):
+class FundViewSet(ConditionalGetMixin, ValuesReadMixin, BulkMixin, LoggableViewSetMixin, FamilyUserQuerysetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Fund.objects.all()
     serializer_class = FundSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FinancePagination
+    pagination_ordering = ('-created_at', '-id')
 
-class LiabilityTypeViewSet(viewsets.ModelViewSet):
+class LiabilityTypeViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = LiabilityType.objects.all()
     serializer_class = LiabilityTypeSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FinancePagination
+    pagination_ordering = ('name', 'id')
 
-class LiabilityViewSet(LoggableViewSetMixin, FamilyUserQuerysetMixin, viewsets.ModelViewSet):
+class LiabilityViewSet(ConditionalGetMixin, ValuesReadMixin, BulkMixin, LoggableViewSetMixin, FamilyUserQuerysetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Liability.objects.all()
     serializer_class = LiabilitySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FinancePagination
+    pagination_ordering = ('-open_date', '-id')
+
+    def after_bulk_save(self, liabilities, fields):
+        # Как сигнал liability_currency_changed: платежи пересчитываются в новой валюте пассива
+        if fields and 'currency' in fields:
+            currencies = {
+                liability.currency_id for liability in liabilities
+                if (liability.get_loaded_values() or {}).get('currency_id') != liability.currency_id
+            }
+            for currency_id in currencies:
+                recompute_base_amounts(currency_id, models=[LiabilityPayment])
+
+    def get_schedules(self, liabilities):
+        """Графики пассивов со сверкой; платежи всех пассивов читаются одним запросом"""
+        liabilities = list(liabilities)
+        payments = {}
+        for row in LiabilityPayment.objects.filter(liability__in=liabilities).order_by('date', 'id').values_list(
+            'liability_id', 'date', 'amount', 'principal', 'interest'
+        ):
+            payments.setdefault(row[0], []).append(row[1:])
+        include_rows = self.request.query_params.get('rows', '1') not in ('0', 'false')
+        return build_liability_schedules(liabilities, payments, include_rows, timezone.localdate())
+
+    @action(detail=True, methods=['get'])
+    def schedule(self, request, pk=None):
+        """График платежей пассива со сверкой по внесённым платежам (?rows=0 — без строк)"""
+        schedules, skipped = self.get_schedules([self.get_object()])
+        if skipped:
+            return Response({'detail': skipped[0]['reason']}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(schedules[0])
+
+    @action(detail=False, methods=['get'])
+    def schedules(self, request):
+        """
+        Графики сразу для нескольких пассивов (?ids=1,2, по умолчанию все доступные;
+        ?rows=0 — только итоги). Пассивы без срока или способа погашения — в skipped.
+        """
+        liabilities = self.get_queryset().order_by('id')
+        if request.query_params.get('ids'):
+            try:
+                ids = [int(value) for value in request.query_params['ids'].split(',') if value]
+            except ValueError:
+                raise serializers.ValidationError({'ids': 'Ожидается список id через запятую'})
+            liabilities = liabilities.filter(id__in=ids)
+        schedules, skipped = self.get_schedules(liabilities)
+        return Response({'schedules': schedules, 'skipped': skipped})
 
-class LiabilityPaymentViewSet(viewsets.ModelViewSet):
+class LiabilityPaymentViewSet(ParentScopeMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = LiabilityPayment.objects.all()
     serializer_class = LiabilityPaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FinancePagination
+    pagination_ordering = ('-date', '-id')
+    scope_parent_field = 'liability'
+    scope_parent_error = 'Нет доступа к выбранному пассиву'
 
-class IncomeViewSet(LoggableViewSetMixin, FamilyUserQuerysetMixin, viewsets.ModelViewSet):
+class OccurrencesMixin(DateRangeMixin):
+    """
+    Миксин для списка повторов за окно (по умолчанию текущий месяц):
+    повторяющиеся записи разворачиваются на сервере, клиенту не нужна вся история
+    """
+    occurrence_end_field = None
+    max_occurrence_days = 366
+
+    def get_occurrence_window(self):
+        dates = self.get_date_params()
+        today = timezone.localdate()
+        date_from = dates['date_from'] or today.replace(day=1)
+        date_to = dates['date_to'] or add_months(date_from.replace(day=1), 1) - timedelta(days=1)
+        if date_from > date_to:
+            raise serializers.ValidationError({'date_from': 'Начало периода позже конца'})
+        if (date_to - date_from).days >= self.max_occurrence_days:
+            raise serializers.ValidationError({'date_to': f'Период не длиннее {self.max_occurrence_days} дней'})
+        return date_from, date_to
+
+    def get_occurrences(self):
+        date_from, date_to = self.get_occurrence_window()
+        items = recurring_in_window(self.get_queryset(), date_from, date_to, self.occurrence_end_field)
+        return expand(items.iterator(), date_from, date_to, self.occurrence_end_field)
+
+    def serialize_occurrence(self, occurrence):
+        item = occurrence.item
+        return {
+            'id': item.id,
+            'name': item.name,
+            'amount': item.amount,
+            'amount_base': item.amount_base,
+            'currency': item.currency_id,
+            'category': item.category_id,
+            'type': item.type,
+            'recurrence_type': item.recurrence_type,
+            'date': item.date,
+            'due_date': occurrence.due_date,
+            'period_start': occurrence.period_start,
+            'period_end': occurrence.period_end,
+        }
+
+def get_upload_encoding(request):
+    """Кодировка загружаемого файла из encoding=; None — определить по началу файла"""
+    encoding = (request.data.get('encoding') or '').lower() or None
+    if encoding is not None and encoding not in ENCODINGS:
+        raise serializers.ValidationError({'encoding': f'Допустимо: {", ".join(ENCODINGS)}'})
+    return encoding
+
+def encoding_error():
+    return serializers.ValidationError(
+        {'file': f'Не удалось прочитать файл: неверная кодировка, укажите encoding ({", ".join(ENCODINGS)})'}
+    )
+
+class ImportMixin:
+    """
+    Миксин для импорта записей из файла: POST multipart с полем file
+    (CSV с заголовком или JSON-строки), format=csv|jsonl (по умолчанию по
+    расширению), encoding=utf-8|cp1251 (по умолчанию по началу файла),
+    family=<id> для семейных записей, dry_run=1 — только проверка.
+    Колонки: name, amount, currency (код или id), date, category (название или id),
+    type, recurrence_type. Ошибочные строки пропускаются и возвращаются в errors.
+    """
+    import_chunk_size = 1000
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_file(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise serializers.ValidationError({'file': 'Файл не передан'})
+        fmt = request.data.get('format') or guess_format(upload.name)
+        if fmt not in FORMATS:
+            raise serializers.ValidationError({'format': f'Допустимо: {", ".join(FORMATS)}'})
+        encoding = get_upload_encoding(request)
+        family = request.data.get('family')
+        if family and not str(family).isdigit():
+            raise serializers.ValidationError({'family': 'Ожидается id семьи'})
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true')
+        try:
+            importer = OperationImporter(
+                self.queryset.model, request.user, int(family) if family else None,
+                chunk_size=self.import_chunk_size, dry_run=dry_run
+            )
+        except ValueError as exc:
+            raise serializers.ValidationError({'family': str(exc)})
+
+        # Неверная кодировка обнаруживается при чтении: транзакция откатывает записанные пачки
+        try:
+            with transaction.atomic():
+                created, errors = importer.run(iter_rows(upload, fmt, encoding))
+                if created and not dry_run:
+                    self.log_batch('import', data_after={
+                        'file': upload.name, 'created': created, 'errors': len(errors), 'scope_key': importer.scope_key
+                    }, scope_key=importer.scope_key)
+        except UnicodeDecodeError:
+            raise encoding_error()
+        return Response(
+            {'created': created, 'dry_run': dry_run, 'errors': errors},
+            status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED
+        )
+
+class IncomeViewSet(ImportMixin, OccurrencesMixin, ConditionalGetMixin, ValuesReadMixin, BulkMixin, LoggableViewSetMixin, FamilyUserQuerysetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Income.objects.all()
     serializer_class = IncomeSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FinancePagination
+    pagination_ordering = ('-date', '-id')
+    occurrence_end_field = 'end_date'
+
+    @action(detail=False, methods=['get'])
+    def occurrences(self, request):
+        """Ожидаемые поступления за период (?date_from=&date_to=, по умолчанию текущий месяц)"""
+        data = [self.serialize_occurrence(occurrence) for occurrence in self.get_occurrences()]
+        data.sort(key=lambda row: (row['due_date'], row['id']))
+        return Response(data)
 
-class ExpenseViewSet(LoggableViewSetMixin, FamilyUserQuerysetMixin, viewsets.ModelViewSet):
+class ExpenseViewSet(ImportMixin, OccurrencesMixin, ConditionalGetMixin, ValuesReadMixin, BulkMixin, LoggableViewSetMixin, FamilyUserQuerysetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Expense.objects.all()
     serializer_class = ExpenseSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FinancePagination
+    pagination_ordering = ('-date', '-id')
+    bulk_prefetch_related = ('payments',)
+    payments_modes = ('full', 'summary')
+
+    def get_payments_mode(self):
+        """
+        ?payments=full (по умолчанию) — вложенный список оплат, читается одним
+        запросом на страницу; ?payments=summary — только сводка, посчитанная
+        в SQL (?on= — дата, для которой определяется текущий период)
+        """
+        mode = self.request.query_params.get('payments', 'full')
+        if mode not in self.payments_modes:
+            raise serializers.ValidationError({'payments': f'Допустимо: {", ".join(self.payments_modes)}'})
+        return mode
+
+    def get_queryset(self):
+        expenses = super().get_queryset()
+        if self.action not in ('list', 'retrieve'):
+            return expenses
+        if self.get_payments_mode() == 'summary':
+            on = self.request.query_params.get('on')
+            try:
+                on = serializers.DateField().to_internal_value(on) if on else None
+            except serializers.ValidationError as exc:
+                raise serializers.ValidationError({'on': exc.detail})
+            return expenses.with_payment_summary(on)
+        # Оплаты по pk — тот же порядок, что и у быстрого чтения (ValuesPlan)
+        return expenses.prefetch_related(models.Prefetch('payments', queryset=ExpensePayment.objects.order_by('pk')))
+
+    def get_validator_parts(self):
+        parts = super().get_validator_parts()
+        if self.get_payments_mode() == 'summary':
+            # Оплата за текущий период зависит от сегодняшней даты
+            parts.append(timezone.localdate().isoformat())
+        return parts
+
+    def get_serializer_class(self):
+        if self.action in ('list', 'retrieve') and self.get_payments_mode() == 'summary':
+            return ExpenseSummarySerializer
+        return super().get_serializer_class()
+
+    @action(detail=False, methods=['get'])
+    def occurrences(self, request):
+        """
+        Что нужно оплатить за период (?date_from=&date_to=, по умолчанию текущий месяц):
+        повторы расходов с отметкой оплаты; оплаты читаются одним запросом
+        """
+        data = []
+        for occurrence, payment in mark_expense_payments(self.get_occurrences()):
+            row = self.serialize_occurrence(occurrence)
+            row['paid'] = payment is not None
+            row['payment'] = ExpensePaymentSerializer(payment).data if payment else None
+            data.append(row)
+        data.sort(key=lambda row: (row['due_date'], row['id']))
+        return Response(data)
 
     @action(detail=True, methods=['get'])
     def payments(self, request, pk=None):
@@ -182,96 +904,296 @@ class ExpenseViewSet(LoggableViewSetMixin, FamilyUserQuerysetMixin, viewsets.Mod
         else:
             return Response({'detail': 'No payment found'}, status=status.HTTP_404_NOT_FOUND)
 
-class FinanceLogViewSet(viewsets.ModelViewSet):
-    queryset = FinanceLog.objects.all()
+class FinanceLogViewSet(DateRangeMixin, AccessScopeMixin, SparseFieldsViewMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Журнал изменений (только чтение), всегда с keyset-пагинацией:
+    - ?entity_type=Expense&entity_id=5 — история одного объекта;
+    - ?user=me|<id>&date_from=&date_to= — изменения пользователя за период;
+    - ?action=, ?field=<поле> — только изменения, затронувшие поле (GIN по changes);
+    - ?scope=personal|family:<id> — как в остальных списках.
+    Видны записи об объектах областей пользователя, а без ?scope= — ещё
+    и его собственные действия (пакетные записи, объекты вне его областей).
+    """
+    queryset = FinanceLog.objects.select_related('user')
     serializer_class = FinanceLogSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = HistoryPagination
+    pagination_ordering = ('-date', '-id')
+
+    def get_queryset(self):
+        params = self.request.query_params
+        condition = self.get_scope_q()
+        if not params.get('scope'):
+            condition |= models.Q(user=self.request.user)
+        logs = self.queryset.filter(condition)
+        if params.get('entity_type') or params.get('entity_id'):
+            if not params.get('entity_type') or not str(params.get('entity_id', '')).isdigit():
+                raise serializers.ValidationError({'entity_id': 'Нужны entity_type и числовой entity_id'})
+            logs = logs.filter(entity_type=params['entity_type'], entity_id=int(params['entity_id']))
+        if params.get('user'):
+            if params['user'] == 'me':
+                logs = logs.filter(user=self.request.user)
+            elif params['user'].isdigit():
+                logs = logs.filter(user_id=int(params['user']))
+            else:
+                raise serializers.ValidationError({'user': 'Ожидается me или id пользователя'})
+        dates = self.get_date_params()
+        # Границы дней в текущем часовом поясе — условие по индексу, без приведения date
+        if dates['date_from']:
+            logs = logs.filter(date__gte=self.day_start(dates['date_from']))
+        if dates['date_to']:
+            logs = logs.filter(date__lt=self.day_start(dates['date_to'] + timedelta(days=1)))
+        if params.get('action'):
+            logs = logs.filter(action=params['action'])
+        if params.get('field'):
+            logs = logs.filter(changes__has_key=params['field'])
+        return logs
+
+    def day_start(self, day):
+        return timezone.make_aware(datetime.combine(day, time.min))
 
-class FinancialGoalViewSet(viewsets.ModelViewSet):
+class FinancialGoalViewSet(FamilyUserQuerysetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = FinancialGoal.objects.all()
     serializer_class = FinancialGoalSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FinancePagination
+    pagination_ordering = ('target_date', 'id')
 
-class BudgetPlanViewSet(viewsets.ModelViewSet):
+class BudgetPlanViewSet(FamilyUserQuerysetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = BudgetPlan.objects.all()
     serializer_class = BudgetPlanSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FinancePagination
+    pagination_ordering = ('-period', '-id')
+
+class StatementViewSet(viewsets.ViewSet):
+    """
+    Импорт банковских выписок (OFX, QIF, CSV-профили банков) с защитой от дублей
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_file(self, request):
+        """
+        POST multipart: file, format=ofx|qif|csv (по умолчанию по расширению),
+        profile=<профиль CSV>, currency=<код валюты операций без валюты>,
+        encoding=utf-8|cp1251 (по умолчанию по началу файла), family=<id>, dry_run=1. Операции, уже загруженные из другой выписки
+        (по отпечатку), пропускаются и считаются в skipped.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise serializers.ValidationError({'file': 'Файл не передан'})
+        fmt = request.data.get('format') or guess_statement_format(upload.name)
+        if fmt not in STATEMENT_FORMATS:
+            raise serializers.ValidationError({'format': f'Допустимо: {", ".join(STATEMENT_FORMATS)}'})
+        profile = request.data.get('profile') or 'generic'
+        if profile not in CSV_PROFILES:
+            raise serializers.ValidationError({'profile': f'Допустимо: {", ".join(CSV_PROFILES)}'})
+        encoding = get_upload_encoding(request)
+        family = request.data.get('family')
+        if family and not str(family).isdigit():
+            raise serializers.ValidationError({'family': 'Ожидается id семьи'})
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true')
+        try:
+            importer = StatementImporter(
+                request.user, int(family) if family else None, request.data.get('currency'), dry_run=dry_run
+            )
+        except ValueError as exc:
+            raise serializers.ValidationError({'family': str(exc)})
 
-class DashboardViewSet(viewsets.ViewSet):
+        try:
+            with transaction.atomic():
+                result = importer.run(parse_statement(upload, fmt, profile, encoding))
+                for model, key in ((Expense, 'expenses'), (Income, 'incomes')):
+                    if result[key]['created'] and not dry_run:
+                        log_writer.write(
+                            entity_type=model.__name__, entity_id=0, action='import_statement', user=request.user,
+                            scope_key=importer.importers[model].scope_key,
+                            data_after={'file': upload.name, 'format': fmt, **result[key]}
+                        )
+        except UnicodeDecodeError:
+            raise encoding_error()
+        return Response(
+            {**result, 'dry_run': dry_run},
+            status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED
+        )
+
+class DashboardViewSet(DateRangeMixin, AccessScopeMixin, viewsets.ViewSet):
     """
-    ViewSet для финансового дашборда с агрегированными данными
+    ViewSet для финансового дашборда с агрегированными данными.
+    Суммы приводятся к валюте ?currency=<id> (по умолчанию — базовая валюта)
+    по курсам на дату.
     """
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         # Используем ту же логику фильтрации, что и в FamilyUserQuerysetMixin
-        user = self.request.user
-        family_ids = FamilyMembership.objects.filter(user=user, status='active').values_list('family_id', flat=True)
-        return Asset.objects.filter(
-            models.Q(owner=user) |
-            models.Q(family__in=family_ids, is_family=True)
-        ).distinct()
+        return Asset.objects.filter(self.get_scope_q())
+
+    def get_target_currency_id(self):
+        requested = self.request.query_params.get('currency')
+        if not requested:
+            return get_base_currency_id()
+        currency_id = None
+        if requested.isdigit():
+            currency_id = Currency.objects.filter(
+                models.Q(owner__isnull=True) | models.Q(owner=self.request.user), id=requested
+            ).values_list('id', flat=True).first()
+        if currency_id is None:
+            raise serializers.ValidationError({'currency': 'Валюта не найдена'})
+        return currency_id
+
+    def get_missing_rates_warning(self, missing):
+        return {
+            'type': 'missing_rates',
+            'message': 'Нет курса для части валют, суммы учтены без пересчёта',
+            'currencies': sorted(missing)
+        }
 
     @action(detail=False, methods=['get'])
     def summary(self, request):
         """Получить общую сводку финансового состояния"""
-        user = request.user
-        family_ids = FamilyMembership.objects.filter(user=user, status='active').values_list('family_id', flat=True)
-        
-        # Общий капитал (активы + фонды - пассивы)
-        total_assets = Asset.objects.filter(
-            models.Q(owner=user) | models.Q(family__in=family_ids, is_family=True)
-        ).aggregate(total=Sum('current_value'))['total'] or Decimal('0.00')
-        
-        total_funds = Fund.objects.filter(
-            models.Q(owner=user) | models.Q(family__in=family_ids, is_family=True)
-        ).aggregate(total=Sum('current_value'))['total'] or Decimal('0.00')
-        
-        total_liabilities = Liability.objects.filter(
-            models.Q(owner=user) | models.Q(family__in=family_ids, is_family=True)
-        ).aggregate(total=Sum('current_debt'))['total'] or Decimal('0.00')
-        
+        currency_id = self.get_target_currency_id()
+
+        # Итоги берутся из снимков чистого капитала (последний снимок каждой области)
+        totals, missing = get_net_worth_totals(self.get_scope_keys(), currency_id)
+        total_assets = totals['total_assets']
+        total_funds = totals['total_funds']
+        total_liabilities = totals['total_liabilities']
         net_worth = total_assets + total_funds - total_liabilities
-        
-        # Структура активов по типам
-        assets_by_type = Asset.objects.filter(
-            models.Q(owner=user) | models.Q(family__in=family_ids, is_family=True)
-        ).values('type__name').annotate(
-            total_value=Sum('current_value'),
-            count=Count('id')
-        )
-        
+
+        # Разбивка активов по типам и валютам и предупреждения — одним запросом (UNION ALL)
+        unlinked_count = 0
+        asset_rows = []
+        for kind, label, currency, total, count, unlinked in self.get_summary_queryset(self.get_scope_q()):
+            if kind == 'asset':
+                asset_rows.append((label, currency, total or Decimal('0.00'), count))
+            elif kind == 'liability':
+                unlinked_count = unlinked
+
+        # Суммы по типам в разных валютах пересчитываются одним пакетом
+        if currency_id:
+            converted, asset_missing = converter.convert_many(
+                [(total, currency) for _, currency, total, _ in asset_rows], currency_id
+            )
+            missing |= asset_missing
+        else:
+            converted = [total for _, _, total, _ in asset_rows]
+        assets_by_type = {}
+        for (label, _, _, count), total in zip(asset_rows, converted):
+            row = assets_by_type.setdefault(label, {'type__name': label, 'total_value': Decimal('0.00'), 'count': 0})
+            row['total_value'] += total
+            row['count'] += count
+
         # Предупреждения
         warnings = []
-        unlinked_liabilities = Liability.objects.filter(
-            models.Q(owner=user) | models.Q(family__in=family_ids, is_family=True)
-        ).filter(expenses__isnull=True)
-        
-        if unlinked_liabilities.exists():
+        if unlinked_count:
             warnings.append({
                 'type': 'unlinked_expenses',
-                'message': f'У {unlinked_liabilities.count()} пассивов нет привязанных расходов',
-                'count': unlinked_liabilities.count()
+                'message': f'У {unlinked_count} пассивов нет привязанных расходов',
+                'count': unlinked_count
             })
-        
+        if missing:
+            warnings.append(self.get_missing_rates_warning(missing))
+
         return Response({
+            'currency': currency_id,
             'net_worth': net_worth,
             'total_assets': total_assets,
             'total_funds': total_funds,
             'total_liabilities': total_liabilities,
-            'assets_by_type': list(assets_by_type),
+            'assets_by_type': list(assets_by_type.values()),
             'warnings': warnings
         })
 
+    @action(detail=False, methods=['get'])
+    def net_worth_history(self, request):
+        """История чистого капитала по снимкам (?date_from=&date_to=)"""
+        history, _ = get_net_worth_history(self.get_scope_keys(), self.get_target_currency_id(), **self.get_date_params())
+        return Response(history)
+
+    @action(detail=False, methods=['get'])
+    def cash_flow(self, request):
+        """
+        Доходы и расходы по месяцам в базовой валюте (?date_from=&date_to=).
+        Суммы берутся из amount_base, поэтому это один SUM по индексу
+        (scope_key, date) без пересчёта валют по строкам.
+        """
+        dates = self.get_date_params()
+        period = models.Q(scope_key__in=self.get_scope_keys())
+        if dates['date_from']:
+            period &= models.Q(date__gte=dates['date_from'])
+        if dates['date_to']:
+            period &= models.Q(date__lte=dates['date_to'])
+
+        def monthly(model, kind):
+            return model.objects.filter(period).annotate(
+                month=TruncMonth('date'),
+                kind=models.Value(kind, output_field=models.CharField()),
+            ).values('month', 'kind').annotate(
+                total=Sum('amount_base'),
+                unconverted=Count('id', filter=models.Q(amount_base__isnull=True)),
+            ).values_list('month', 'kind', 'total', 'unconverted')
+
+        months = {}
+        unconverted = 0
+        for month, kind, total, count in monthly(Income, 'income').union(monthly(Expense, 'expense'), all=True):
+            row = months.setdefault(month, {
+                'month': month, 'income': Decimal('0.00'), 'expense': Decimal('0.00')
+            })
+            row[kind] = total or Decimal('0.00')
+            unconverted += count
+        result = []
+        for month in sorted(months):
+            row = months[month]
+            row['balance'] = row['income'] - row['expense']
+            result.append(row)
+
+        warnings = []
+        if unconverted:
+            warnings.append({
+                'type': 'missing_rates',
+                'message': f'{unconverted} операций без курса не учтены',
+                'count': unconverted
+            })
+        return Response({'currency': get_base_currency_id(), 'months': result, 'warnings': warnings})
+
+    def get_summary_queryset(self, scope):
+        """
+        Строки сводки (kind, label, currency, total, count, unlinked) одним запросом.
+        Ветка пассивов без GROUP BY всегда даёт ровно одну строку.
+        """
+        label = models.Value(None, output_field=models.CharField())
+        no_currency = models.Value(None, output_field=models.IntegerField())
+        zero = models.Value(0, output_field=models.IntegerField())
+        columns = ('kind', 'label', 'currency', 'total', 'count', 'unlinked')
+
+        assets = Asset.objects.filter(scope).values('type__name', 'current_currency').annotate(
+            kind=models.Value('asset', output_field=models.CharField()),
+            label=models.F('type__name'),
+            currency=models.F('current_currency'),
+            total=Sum('current_value'),
+            count=Count('id'),
+            unlinked=zero,
+        ).values_list(*columns)
+
+        has_expenses = models.Exists(Expense.objects.filter(liability=models.OuterRef('pk')))
+        liabilities = Liability.objects.filter(scope).annotate(
+            kind=models.Value('liability', output_field=models.CharField()),
+        ).values('kind').annotate(
+            label=label,
+            currency=no_currency,
+            total=models.Value(None, output_field=models.DecimalField()),
+            count=Count('id'),
+            unlinked=Count('id', filter=~has_expenses),
+        ).values_list(*columns)
+
+        return assets.union(liabilities, all=True)
+
     @action(detail=False, methods=['get'])
     def funds_progress(self, request):
         """Получить прогресс по фондам"""
-        user = request.user
-        family_ids = FamilyMembership.objects.filter(user=user, status='active').values_list('family_id', flat=True)
-        
-        funds = Fund.objects.filter(
-            models.Q(owner=user) | models.Q(family__in=family_ids, is_family=True)
-        )
+        funds = Fund.objects.filter(self.get_scope_q())
         
         funds_data = []
         for fund in funds:
@@ -291,22 +1213,27 @@ class DashboardViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['get'])
     def liabilities_summary(self, request):
         """Получить сводку по пассивам"""
-        user = request.user
-        family_ids = FamilyMembership.objects.filter(user=user, status='active').values_list('family_id', flat=True)
-        
-        liabilities = Liability.objects.filter(
-            models.Q(owner=user) | models.Q(family__in=family_ids, is_family=True)
-        )
-        
-        total_initial = liabilities.aggregate(total=Sum('initial_amount'))['total'] or Decimal('0.00')
-        total_current_debt = liabilities.aggregate(total=Sum('current_debt'))['total'] or Decimal('0.00')
-        total_paid = total_initial - total_current_debt
-        
+        currency_id = self.get_target_currency_id()
+        # Суммы платежей хранятся в пассиве, флаг непривязанных расходов — подзапрос
+        liabilities = list(Liability.objects.filter(self.get_scope_q()).with_unlinked_expenses())
+
+        # Итоги в валюте сводки; по строкам суммы остаются в валюте пассива
+        amounts = [(liability.initial_amount, liability.currency_id) for liability in liabilities]
+        amounts += [(liability.current_debt, liability.currency_id) for liability in liabilities]
+        missing = set()
+        if currency_id:
+            amounts, missing = converter.convert_many(amounts, currency_id)
+        else:
+            amounts = [amount for amount, _ in amounts]
+        total_initial = sum(amounts[:len(liabilities)], Decimal('0.00'))
+        total_current_debt = sum(amounts[len(liabilities):], Decimal('0.00'))
+
         liabilities_data = []
         for liability in liabilities:
             liabilities_data.append({
                 'id': liability.id,
                 'name': liability.name,
+                'currency': liability.currency_id,
                 'initial_amount': liability.initial_amount,
                 'current_debt': liability.current_debt,
                 'total_paid': liability.get_total_payments(),
@@ -314,10 +1241,13 @@ class DashboardViewSet(viewsets.ViewSet):
                 'interest_paid': liability.get_total_interest_paid(),
                 'has_unlinked_expenses': liability.has_unlinked_expenses()
             })
-        
+        total_paid = total_initial - total_current_debt
+
         return Response({
+            'currency': currency_id,
             'total_initial_amount': total_initial,
             'total_current_debt': total_current_debt,
             'total_paid': total_paid,
-            'liabilities': liabilities_data
+            'liabilities': liabilities_data,
+            'warnings': [self.get_missing_rates_warning(missing)] if missing else []
         })
@@ -2,12 +2,14 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from .models import NuclearFamily, FamilyMembership
 from django.contrib.auth.hashers import make_password, check_password
+from common.access import get_access_scope
+from common.fieldsets import SparseFieldsMixin
 import secrets
 import string
 
 User = get_user_model()
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для отображения данных пользователя"""
     full_name = serializers.SerializerMethodField()
     
@@ -22,7 +24,7 @@ class UserSerializer(serializers.ModelSerializer):
         return obj.get_full_name()
 
 
-class FamilyMembershipSerializer(serializers.ModelSerializer):
+class FamilyMembershipSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для членства в нуклеарной семье"""
     user = UserSerializer(read_only=True)
     family_name = serializers.CharField(source='family.name', read_only=True)
@@ -34,9 +36,10 @@ class FamilyMembershipSerializer(serializers.ModelSerializer):
             'joined_at', 'left_at', 'can_join_circles', 'can_share_to_circles', 'can_manage_circle_access'
         ]
         read_only_fields = ['id', 'user', 'joined_at', 'left_at']
+        expandable_fields = {'family': 'nucfamily.serializers.NuclearFamilySerializer'}
 
 
-class NuclearFamilySerializer(serializers.ModelSerializer):
+class NuclearFamilySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для нуклеарной семьи"""
     memberships = FamilyMembershipSerializer(many=True, read_only=True)
     members_count = serializers.SerializerMethodField()
@@ -60,25 +63,19 @@ class NuclearFamilySerializer(serializers.ModelSerializer):
     def get_members_count(self, obj):
         return obj.memberships.filter(status='active').count()
     
-    def get_is_admin(self, obj):
+    def get_user_scope(self):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.memberships.filter(
-                user=request.user, 
-                role='admin', 
-                status='active'
-            ).exists()
-        return False
+            return get_access_scope(request.user)
+        return None
+    
+    def get_is_admin(self, obj):
+        scope = self.get_user_scope()
+        return scope.is_family_admin(obj.id) if scope else False
     
     def get_user_role(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            membership = obj.memberships.filter(
-                user=request.user, 
-                status='active'
-            ).first()
-            return membership.role if membership else None
-        return None
+        scope = self.get_user_scope()
+        return scope.get_role(obj.id) if scope else None
     
     def get_circles(self, obj):
         # Получаем круги через CircleFamilyMembership
@@ -90,34 +87,16 @@ class NuclearFamilySerializer(serializers.ModelSerializer):
         return [{'id': membership.circle.id, 'name': membership.circle.name} for membership in memberships]
     
     def get_user_can_join_circles(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            membership = obj.memberships.filter(
-                user=request.user, 
-                status='active'
-            ).first()
-            return membership.can_join_circles if membership else False
-        return False
+        scope = self.get_user_scope()
+        return scope.has_permission(obj.id, 'can_join_circles') if scope else False
     
     def get_user_can_share_to_circles(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            membership = obj.memberships.filter(
-                user=request.user, 
-                status='active'
-            ).first()
-            return membership.can_share_to_circles if membership else False
-        return False
+        scope = self.get_user_scope()
+        return scope.has_permission(obj.id, 'can_share_to_circles') if scope else False
     
     def get_user_can_manage_circle_access(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            membership = obj.memberships.filter(
-                user=request.user, 
-                status='active'
-            ).first()
-            return membership.can_manage_circle_access if membership else False
-        return False
+        scope = self.get_user_scope()
+        return scope.has_permission(obj.id, 'can_manage_circle_access') if scope else False
 
 
 class NuclearFamilyCreateSerializer(serializers.ModelSerializer):
@@ -228,13 +207,11 @@ class FamilyCircleConnectionSerializer(serializers.ModelSerializer):
             circle = FamilyCircle.objects.get(id=circle_id)
             
             # Проверяем права пользователя в семье
-            family_membership = FamilyMembership.objects.get(
-                user=user,
-                family=instance,
-                status='active'
-            )
+            scope = get_access_scope(user)
+            if not scope.is_member(instance.id):
+                raise serializers.ValidationError('Вы не являетесь членом этой семьи')
             
-            if not family_membership.can_join_circles:
+            if not scope.has_permission(instance.id, 'can_join_circles'):
                 raise serializers.ValidationError('У вас нет прав для присоединения семьи к кругам')
             
             # Создаем членство семьи в круге
@@ -248,7 +225,5 @@ class FamilyCircleConnectionSerializer(serializers.ModelSerializer):
             
         except FamilyCircle.DoesNotExist:
             raise serializers.ValidationError('Круг с таким ID не найден')
-        except FamilyMembership.DoesNotExist:
-            raise serializers.ValidationError('Вы не являетесь членом этой семьи')
         
         return instance 
\ No newline at end of file
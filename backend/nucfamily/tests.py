@@ -1,3 +1,48 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase, APIClient
 
-# Create your tests here.
+from .models import NuclearFamily, FamilyMembership
+
+User = get_user_model()
+
+
+class FamilyFieldsTestCase(APITestCase):
+    """Тесты ?fields= и ?expand= для семей и членств"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User',
+            middle_name='Test',
+            birth_date='1990-01-01',
+            phone='+79991234567'
+        )
+        self.client.force_authenticate(user=self.user)
+        for i in range(3):
+            family = NuclearFamily.objects.create(name=f'Семья {i}', join_code=f'FAMILY0{i}', join_password='hashed')
+            FamilyMembership.objects.create(user=self.user, family=family, role='parent', status='active')
+
+    def test_method_fields_skipped(self):
+        """Без выбранных вычисляемых полей их запросы не выполняются"""
+        self.client.get('/api/nucfamily/families/')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/nucfamily/families/', {'fields': 'id,name'})
+        self.assertEqual([set(row) for row in response.data], [{'id', 'name'}] * 3)
+
+    def test_nested_memberships(self):
+        """Вложенные членства и пользователи читаются пачками, с выбором их полей"""
+        self.client.get('/api/nucfamily/families/')
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/nucfamily/families/', {'fields': 'id,memberships.role,memberships.user.username'})
+        self.assertEqual(response.data[0]['memberships'], [{'role': 'parent', 'user': {'username': 'testuser'}}])
+
+    def test_expand_family(self):
+        """Членство со вложенной семьёй по ?expand=family"""
+        response = self.client.get('/api/nucfamily/memberships/', {'expand': 'family', 'fields': 'id,family.name'})
+        self.assertEqual(sorted(row['family']['name'] for row in response.data), ['Семья 0', 'Семья 1', 'Семья 2'])
@@ -4,6 +4,8 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from .models import NuclearFamily, FamilyMembership
+from common.access import get_access_scope
+from common.fieldsets import SparseFieldsViewMixin, select_for_serializer
 from .serializers import (
     NuclearFamilySerializer,
     NuclearFamilyCreateSerializer,
@@ -14,7 +16,7 @@ from .serializers import (
 )
 
 
-class NuclearFamilyViewSet(viewsets.ModelViewSet):
+class NuclearFamilyViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     """ViewSet для управления нуклеарными семьями"""
     permission_classes = [permissions.IsAuthenticated]
     
@@ -25,8 +27,7 @@ class NuclearFamilyViewSet(viewsets.ModelViewSet):
             return NuclearFamily.objects.all()
         
         # Для остальных действий возвращаем только семьи пользователя
-        user = self.request.user
-        return NuclearFamily.objects.filter(memberships__user=user, memberships__status='active').distinct()
+        return NuclearFamily.objects.filter(id__in=get_access_scope(self.request.user).family_ids)
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -93,8 +94,11 @@ class NuclearFamilyViewSet(viewsets.ModelViewSet):
     def members(self, request, pk=None):
         """Получение списка участников семьи"""
         family = self.get_object()
-        memberships = family.memberships.filter(status='active')
-        serializer = FamilyMembershipSerializer(memberships, many=True)
+        selection = self.get_field_selection()
+        memberships = select_for_serializer(
+            family.memberships.filter(status='active'), FamilyMembershipSerializer(**selection)
+        )
+        serializer = FamilyMembershipSerializer(memberships, many=True, **selection)
         return Response(serializer.data)
     
     @action(detail=True, methods=['post'])
@@ -104,7 +108,7 @@ class NuclearFamilyViewSet(viewsets.ModelViewSet):
         user = request.user
         
         # Проверяем, является ли пользователь админом
-        if not family.memberships.filter(user=user, role='admin', status='active').exists():
+        if not get_access_scope(user).is_family_admin(family.id):
             return Response(
                 {'error': 'Только администраторы могут регенерировать учетные данные'},
                 status=status.HTTP_403_FORBIDDEN
@@ -136,7 +140,7 @@ class NuclearFamilyViewSet(viewsets.ModelViewSet):
         user = request.user
         
         # Проверяем, является ли пользователь админом семьи
-        if not family.memberships.filter(user=user, role='admin', status='active').exists():
+        if not get_access_scope(user).is_family_admin(family.id):
             return Response(
                 {'error': 'Только администраторы семьи могут подключать к кругам'},
                 status=status.HTTP_403_FORBIDDEN
@@ -160,7 +164,7 @@ class NuclearFamilyViewSet(viewsets.ModelViewSet):
         circle_id = request.data.get('circle_id')
         
         # Проверяем, является ли пользователь админом семьи
-        if not family.memberships.filter(user=user, role='admin', status='active').exists():
+        if not get_access_scope(user).is_family_admin(family.id):
             return Response(
                 {'error': 'Только администраторы семьи могут отключать от кругов'},
                 status=status.HTTP_403_FORBIDDEN
@@ -184,7 +188,7 @@ class NuclearFamilyViewSet(viewsets.ModelViewSet):
             )
 
 
-class FamilyMembershipViewSet(viewsets.ModelViewSet):
+class FamilyMembershipViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     """ViewSet для управления членством в семьях"""
     serializer_class = FamilyMembershipSerializer
     permission_classes = [permissions.IsAuthenticated]
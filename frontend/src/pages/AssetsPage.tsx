@@ -34,7 +34,9 @@ const API_URL = 'http://localhost:8000/api/finance/assets/';
 const TYPES_URL = 'http://localhost:8000/api/finance/asset-types/';
 const CURRENCIES_URL = 'http://localhost:8000/api/finance/currencies/';
 const CATEGORIES_URL = 'http://localhost:8000/api/finance/categories/';
-const ASSET_HISTORY_URL = 'http://localhost:8000/api/finance/asset-value-history/';
+const ASSET_HISTORY_URL = 'http://localhost:8000/api/finance/asset-value-history/series/';
+// Сколько точек запрашивать для графика: сервер прореживает историю до этого числа
+const HISTORY_POINTS = 200;
 
 const PERIODS = [
   { label: 'Месяц', value: 'month' },
@@ -122,28 +124,42 @@ const AssetsPage: React.FC = () => {
     }
   };
 
-  // Загрузка истории стоимости активов
+  // Начало периода графика
+  const getPeriodStart = (period: string): Date | null => {
+    const now = new Date();
+    switch (period) {
+      case 'month':
+        return new Date(now.getFullYear(), now.getMonth() - 1, now.getDate());
+      case 'halfyear':
+        return new Date(now.getFullYear(), now.getMonth() - 6, now.getDate());
+      case 'year':
+        return new Date(now.getFullYear() - 1, now.getMonth(), now.getDate());
+      case '5years':
+        return new Date(now.getFullYear() - 5, now.getMonth(), now.getDate());
+      default:
+        return null;
+    }
+  };
+
+  // Загрузка истории стоимости активов: сервер отдаёт итоговый ряд за период,
+  // прореженный до HISTORY_POINTS точек
   useEffect(() => {
     const fetchHistory = async () => {
       setLoadingHistory(true);
       try {
         const token = localStorage.getItem('token');
-        const resp = await fetch(ASSET_HISTORY_URL, {
+        const params = new URLSearchParams({ points: String(HISTORY_POINTS) });
+        const fromDate = getPeriodStart(selectedPeriod);
+        if (fromDate) {
+          const pad = (n: number) => String(n).padStart(2, '0');
+          params.set('date_from', `${fromDate.getFullYear()}-${pad(fromDate.getMonth() + 1)}-${pad(fromDate.getDate())}`);
+        }
+        const resp = await fetch(`${ASSET_HISTORY_URL}?${params}`, {
           headers: { 'Authorization': `Token ${token}` }
         });
         if (!resp.ok) throw new Error('Ошибка загрузки истории активов');
         const data = await resp.json();
-        // Агрегируем по дате: сумма value по всем активам
-        const dateMap: Record<string, number> = {};
-        data.forEach((item: any) => {
-          if (!dateMap[item.date]) dateMap[item.date] = 0;
-          dateMap[item.date] += Number(item.value);
-        });
-        // Преобразуем в массив для графика, сортируем по дате
-        const chartData = Object.entries(dateMap)
-          .map(([date, value]) => ({ date, value }))
-          .sort((a, b) => a.date.localeCompare(b.date));
-        setHistoryData(chartData);
+        setHistoryData(data.total.map((item: any) => ({ date: item.date, value: Number(item.value) })));
       } catch (e) {
         setHistoryData([]);
       } finally {
@@ -151,31 +167,10 @@ const AssetsPage: React.FC = () => {
       }
     };
     fetchHistory();
-  }, []);
+  }, [selectedPeriod]);
 
-  // Фильтрация данных по периоду
-  const getFilteredHistory = () => {
-    if (!historyData.length) return [];
-    const now = new Date();
-    let fromDate: Date;
-    switch (selectedPeriod) {
-      case 'month':
-        fromDate = new Date(now.getFullYear(), now.getMonth() - 1, now.getDate());
-        break;
-      case 'halfyear':
-        fromDate = new Date(now.getFullYear(), now.getMonth() - 6, now.getDate());
-        break;
-      case 'year':
-        fromDate = new Date(now.getFullYear() - 1, now.getMonth(), now.getDate());
-        break;
-      case '5years':
-        fromDate = new Date(now.getFullYear() - 5, now.getMonth(), now.getDate());
-        break;
-      default:
-        fromDate = new Date(0);
-    }
-    return historyData.filter(item => new Date(item.date) >= fromDate);
-  };
+  // История уже ограничена выбранным периодом на сервере
+  const getFilteredHistory = () => historyData;
 
   // Автоматический диапазон для оси Y
   const getYDomain = (data: any[]) => {
@@ -25,7 +25,10 @@ interface Expense {
   created_at: string;
   updated_at: string;
   recurrence_type?: 'none' | 'monthly' | 'weekly';
-  payments?: ExpensePayment[];
+  // Поля повтора из /expenses/occurrences/
+  due_date?: string;
+  paid?: boolean;
+  payment?: ExpensePayment | null;
 }
 
 interface Currency {
@@ -51,13 +54,12 @@ const MONTHS = [
 ];
 
 const ExpensesPage: React.FC = () => {
-  const [expenses, setExpenses] = useState<Expense[]>([]);
+  const [occurrences, setOccurrences] = useState<Expense[]>([]);
   const [currencies, setCurrencies] = useState<Currency[]>([]);
   const [categories, setCategories] = useState<Category[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [page, setPage] = useState(1);
-  const [totalCount, setTotalCount] = useState(0);
   const [showForm, setShowForm] = useState(false);
   const [formName, setFormName] = useState('');
   const [formAmount, setFormAmount] = useState('');
@@ -96,25 +98,22 @@ const ExpensesPage: React.FC = () => {
     }
   };
 
-  // Загрузка расходов с backend (с пагинацией)
-  const fetchExpenses = async (pageNum = 1) => {
+  // Повторы расходов за выбранный месяц с отметкой оплаты (считаются на сервере)
+  const fetchOccurrences = async () => {
     setLoading(true);
     setError(null);
     try {
       const token = localStorage.getItem('token');
-      const resp = await fetch(`${API_URL}?limit=${PAGE_SIZE}&offset=${(pageNum-1)*PAGE_SIZE}`, {
+      const pad = (n: number) => String(n).padStart(2, '0');
+      const lastDay = new Date(selectedYear, selectedMonth + 1, 0).getDate();
+      const dateFrom = `${selectedYear}-${pad(selectedMonth + 1)}-01`;
+      const dateTo = `${selectedYear}-${pad(selectedMonth + 1)}-${pad(lastDay)}`;
+      const resp = await fetch(`${API_URL}occurrences/?date_from=${dateFrom}&date_to=${dateTo}`, {
         headers: { 'Authorization': `Token ${token}` }
       });
       if (!resp.ok) throw new Error('Ошибка загрузки расходов');
-      const data = await resp.json();
-      // Если backend не возвращает count/results, fallback к массиву
-      if (Array.isArray(data)) {
-        setExpenses(data.slice(0, PAGE_SIZE));
-        setTotalCount(data.length);
-      } else {
-        setExpenses(data.results || []);
-        setTotalCount(data.count || (data.results ? data.results.length : 0));
-      }
+      const data: Expense[] = await resp.json();
+      setOccurrences(data.map(item => ({ ...item, date: item.due_date || item.date })));
     } catch (e: any) {
       setError(e.message || 'Ошибка');
     } finally {
@@ -124,9 +123,14 @@ const ExpensesPage: React.FC = () => {
 
   useEffect(() => {
     fetchDictionaries();
-    fetchExpenses(page);
     // eslint-disable-next-line
-  }, [page]);
+  }, []);
+
+  useEffect(() => {
+    setPage(1);
+    fetchOccurrences();
+    // eslint-disable-next-line
+  }, [selectedMonth, selectedYear]);
 
   React.useEffect(() => {
     function handleClickOutside(e: MouseEvent) {
@@ -153,35 +157,11 @@ const ExpensesPage: React.FC = () => {
 
   // 3. Функция для определения оплаченности (по paid_date)
   function isExpensePaid(exp: Expense): { paid: boolean, paidDate?: string, paymentId?: number } {
-    if (!exp.payments || exp.payments.length === 0) return { paid: false };
-    if (!exp.recurrence_type || exp.recurrence_type === 'none') {
-      // Разовый: любая оплата
-      return { paid: true, paidDate: exp.payments[0].paid_date, paymentId: exp.payments[0].id };
-    } else if (exp.recurrence_type === 'monthly') {
-      // Ежемесячный: ищем оплату с paid_date в выбранном месяце/году
-      const payment = exp.payments.find(p => {
-        const d = new Date(p.paid_date);
-        return d.getMonth() === selectedMonth && d.getFullYear() === selectedYear;
-      });
-      if (payment) return { paid: true, paidDate: payment.paid_date, paymentId: payment.id };
-      return { paid: false };
-    } else if (exp.recurrence_type === 'weekly') {
-      // Еженедельный: ищем оплату с paid_date в текущей неделе
-      // (упрощённо: неделя — с понедельника)
-      const firstDay = new Date(selectedYear, selectedMonth, 1);
-      const lastDay = new Date(selectedYear, selectedMonth + 1, 0);
-      // Найдём текущую неделю (по today)
-      const today = new Date();
-      let weekStart = new Date(today);
-      weekStart.setDate(today.getDate() - today.getDay() + 1); // Пн
-      let weekEnd = new Date(weekStart);
-      weekEnd.setDate(weekStart.getDate() + 6); // Вс
-      const payment = exp.payments.find(p => {
-        const d = new Date(p.paid_date);
-        return d >= weekStart && d <= weekEnd;
-      });
-      if (payment) return { paid: true, paidDate: payment.paid_date, paymentId: payment.id };
-      return { paid: false };
+    if (exp.paid !== undefined) {
+      // Повтор с сервера: оплата уже сопоставлена с периодом
+      return exp.paid && exp.payment
+        ? { paid: true, paidDate: exp.payment.paid_date, paymentId: exp.payment.id }
+        : { paid: false };
     }
     return { paid: false };
   }
@@ -221,7 +201,7 @@ const ExpensesPage: React.FC = () => {
         console.error('Ошибка оплаты:', data || respText);
         return;
       }
-      await fetchExpenses(page);
+      await fetchOccurrences();
       setPayMenuOpenId(null);
       setPayMenuAnchor(null);
       setPayDate('');
@@ -246,7 +226,7 @@ const ExpensesPage: React.FC = () => {
         const data = await resp.json();
         throw new Error(data.detail || 'Ошибка отмены оплаты');
       }
-      await fetchExpenses(page);
+      await fetchOccurrences();
       setPayMenuOpenId(null);
       setPayMenuAnchor(null);
     } catch (e: any) {
@@ -256,20 +236,22 @@ const ExpensesPage: React.FC = () => {
     }
   };
 
+  // Расходы выбранного месяца: разовые и повторы регулярных (от новых к старым)
+  const filteredExpenses = [...occurrences].sort((a, b) => new Date(b.date).getTime() - new Date(a.date).getTime());
+  // Повторы месяца приходят одним списком, страницы считаются на клиенте
+  const pageCount = Math.max(1, Math.ceil(filteredExpenses.length / PAGE_SIZE));
+  const pageExpenses = filteredExpenses.slice((page - 1) * PAGE_SIZE, page * PAGE_SIZE);
+
+  // После удаления последней строки страницы — на последнюю непустую
+  useEffect(() => {
+    if (page > pageCount) setPage(pageCount);
+  }, [page, pageCount]);
+
   const handlePageChange = (newPage: number) => {
-    if (newPage < 1 || newPage > Math.ceil(totalCount / PAGE_SIZE)) return;
+    if (newPage < 1 || newPage > pageCount) return;
     setPage(newPage);
   };
 
-  // Сортировка расходов по дате (от новых к старым)
-  const sortedExpenses = [...expenses].sort((a, b) => new Date(b.date).getTime() - new Date(a.date).getTime());
-
-  // Фильтрация расходов по выбранному месяцу и году
-  const filteredExpenses = sortedExpenses.filter(exp => {
-    const d = new Date(exp.date);
-    return d.getMonth() === selectedMonth && d.getFullYear() === selectedYear;
-  });
-
   // Для выпадающего списка месяцев текущего года
   const monthsOfYear = Array.from({ length: 12 }, (_, i) => i);
 
@@ -336,7 +318,7 @@ const ExpensesPage: React.FC = () => {
         } catch {}
         throw new Error(message);
       }
-      await fetchExpenses(page);
+      await fetchOccurrences();
       resetForm();
     } catch (e: any) {
       setError(e.message || 'Ошибка добавления');
@@ -355,13 +337,7 @@ const ExpensesPage: React.FC = () => {
         headers: { 'Authorization': `Token ${token}` }
       });
       if (resp.status !== 204 && resp.status !== 200) throw new Error('Ошибка удаления');
-      const prevPage = page;
-      await fetchExpenses(page);
-      setTimeout(() => {
-        if (filteredExpenses.length === 0 && prevPage > 1) {
-          setPage(prevPage - 1);
-        }
-      }, 0);
+      await fetchOccurrences();
     } catch (e: any) {
       setError(e.message || 'Ошибка удаления');
     }
@@ -536,10 +512,10 @@ const ExpensesPage: React.FC = () => {
                 </>
               )}
               {/* Список расходов */}
-              {filteredExpenses.map(exp => {
+              {pageExpenses.map(exp => {
                 const { paid, paidDate } = isExpensePaid(exp);
                 return (
-                  <tr key={exp.id} style={paid ? { background: '#e8fbe8' } : {}}>
+                  <tr key={`${exp.id}-${exp.date}`} style={paid ? { background: '#e8fbe8' } : {}}>
                     <td style={{ textAlign: 'center', position: 'relative' }}>
                       {paid ? (
                         <span
@@ -732,8 +708,8 @@ const ExpensesPage: React.FC = () => {
           </table>
           <div className="pagination">
             <button onClick={() => handlePageChange(page - 1)} disabled={page === 1}>Назад</button>
-            <span>Страница {page} из {Math.max(1, Math.ceil(filteredExpenses.length / PAGE_SIZE))}</span>
-            <button onClick={() => handlePageChange(page + 1)} disabled={page >= Math.ceil(filteredExpenses.length / PAGE_SIZE)}>Вперёд</button>
+            <span>Страница {page} из {pageCount}</span>
+            <button onClick={() => handlePageChange(page + 1)} disabled={page >= pageCount}>Вперёд</button>
           </div>
         </>
       )}